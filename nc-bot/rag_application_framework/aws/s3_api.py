@@ -8,6 +8,8 @@ from rag_application_framework.aws.base_aws_client import (
 
 logger = Logging.get_logger(__name__)
 
+PRESIGNED_URL_EXPIRES_IN = 600
+
 
 class S3Api(BaseAwsClient, metaclass=MetaClass):
     service_name = AwsServiceNameClassProperty("s3")
@@ -52,9 +54,11 @@ class S3Api(BaseAwsClient, metaclass=MetaClass):
             logger.error(f"Error deleting object: {e}")
             raise
 
-    def generate_presigned_url(self, bucket_name: str, fname: str) -> str:
+    def generate_presigned_url(
+        self, bucket_name: str, fname: str, expires_in: int = PRESIGNED_URL_EXPIRES_IN
+    ) -> str:
         return self._client.generate_presigned_url(
             "get_object",
             Params={"Bucket": bucket_name, "Key": fname},
-            ExpiresIn=600,
+            ExpiresIn=expires_in,
         )
@@ -11,3 +11,23 @@ logger = Logging.get_logger(__name__)
 
 class SagemakerRuntimeApi(BaseAwsClient, metaclass=MetaClass):
     service_name = AwsServiceNameClassProperty("sagemaker-runtime")
+
+    def invoke_endpoint_with_response_stream(
+        self,
+        endpoint_name: str,
+        body: bytes,
+        content_type: str = "application/json",
+        accept: str = "application/json",
+    ):
+        """Invokes an endpoint and returns the event stream of its response payload parts."""
+        try:
+            response = self._client.invoke_endpoint_with_response_stream(
+                EndpointName=endpoint_name,
+                Body=body,
+                ContentType=content_type,
+                Accept=accept,
+            )
+            return response["Body"]
+        except Exception as e:
+            logger.error(f"Error invoking endpoint with response stream: {e}")
+            raise
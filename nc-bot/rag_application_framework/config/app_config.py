@@ -1,8 +1,11 @@
-from dataclasses import dataclass
-from typing import Optional, Union, Literal
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Union, Literal
 from rag_application_framework.config.app_enums import InferenceEngine
 from langchain_community.embeddings.bedrock import BedrockEmbeddings
 from langchain_community.embeddings.huggingface import HuggingFaceEmbeddings
+from rag_application_framework.ml.embeddings.caching_embeddings import (
+    CachingEmbeddings,
+)
 from botocore.client import BaseClient
 from datetime import datetime
 
@@ -13,15 +16,28 @@ class DbConfig:
     password: str
     port: int
     host: str
+    pool_min_size: int = 1
+    pool_max_size: int = 10
+    pool_max_lifetime: float = 1800.0
+    pool_borrow_timeout: float = 30.0
 
 
 @dataclass
 class EmbeddingConfig:
     collection_name: str
-    embeddings: Union[BedrockEmbeddings, HuggingFaceEmbeddings]
+    embeddings: Union[BedrockEmbeddings, HuggingFaceEmbeddings, CachingEmbeddings]
     use_bedrock: bool
     bedrock_region: Optional[str] = None
     bedrock_profile: Optional[str] = None
+    ingestion_max_workers: int = 8
+    ingestion_batch_size: int = 64
+    ingestion_queue_size: int = 2
+    ingestion_parse_workers: int = 0
+    ingestion_parse_timeout: float = 600.0
+    ingestion_pdf_pages_per_task: int = 20
+    parsed_document_cache_path: Optional[str] = None
+    parsed_document_cache_max_bytes: int = 1024 * 1024 * 1024
+    chunk_embedding_cache_max_entries: int = 1_000_000
 
 
 @dataclass
@@ -52,6 +68,69 @@ class EvaluationConfig:
     evaluation_engine: str = "bedrock"
     bedrock_client: Optional[BaseClient] = None
     bedrock_model_id: Optional[str] = None
+    worker_count: int = 2
+    max_queue_size: int = 100
+    overflow_policy: Literal["drop", "sample", "persist"] = "persist"
+    overflow_sample_rate: float = 0.1
+    sample_rate: float = 1.0
+    model_sample_rates: Dict[str, float] = field(default_factory=dict)
+    token_budget_per_minute: int = 0
+    low_similarity_threshold: Optional[float] = None
+
+
+@dataclass
+class SemanticCacheConfig:
+    enabled: bool = False
+    similarity_threshold: float = 0.95
+    ttl_seconds: float = 3600.0
+    max_entries_per_collection: int = 500
+
+
+@dataclass
+class IntentRouterConfig:
+    enabled: bool = False
+    similarity_threshold: float = 0.85
+    max_words: int = 8
+
+
+@dataclass
+class ServingConfig:
+    host: str = "0.0.0.0"
+    port: int = 8080
+    max_concurrency: int = 4
+    max_queue_size: int = 32
+    request_timeout: float = 60.0
+
+
+@dataclass
+class VectorIndexConfig:
+    index_type: Literal["hnsw", "ivfflat", "none"] = "hnsw"
+    hnsw_m: int = 16
+    hnsw_ef_construction: int = 64
+    hnsw_ef_search: int = 40
+    ivfflat_lists: int = 100
+    ivfflat_probes: int = 10
+
+
+@dataclass
+class RetrievalConfig:
+    search_type: Literal["mmr", "hybrid"] = "mmr"
+    collection_search_types: Dict[str, str] = field(default_factory=dict)
+    k: int = 5
+    fetch_k: int = 30
+    two_phase_mmr: bool = True
+    min_similarity: Optional[float] = None
+    lexical_k: int = 20
+    rrf_k: int = 60
+    text_search_config: str = "english"
+    rerank_model: Optional[str] = None
+    rerank_candidates: int = 20
+    rerank_batch_size: int = 16
+    rerank_quantize: bool = True
+    context_tokenizer: Optional[str] = None
+    context_token_budgets: Dict[str, int] = field(
+        default_factory=lambda: {"sagemaker": 1900, "bedrock": 3500, "local": 3500}
+    )
 
 
 @dataclass
@@ -95,3 +174,11 @@ class AppConfig:
     openai_config: Optional[OpenAIConfig] = None
     evaluation_config: Optional[EvaluationConfig] = None
     confluence_config: Optional[ConfluenceConfig] = None
+    semantic_cache_config: SemanticCacheConfig = field(
+        default_factory=SemanticCacheConfig
+    )
+    vector_index_config: VectorIndexConfig = field(default_factory=VectorIndexConfig)
+    retrieval_config: RetrievalConfig = field(default_factory=RetrievalConfig)
+    intent_router_config: IntentRouterConfig = field(
+        default_factory=IntentRouterConfig
+    )
@@ -1,5 +1,5 @@
 import os
-from typing import Optional
+from typing import Dict, Optional
 from botocore.config import Config
 from boto3 import Session
 from rag_application_framework.aws.aws_session_factory import AwsSessionFactory
@@ -17,8 +17,13 @@ from rag_application_framework.config.app_config import (
     FileStoreConfig,
     InferenceConfig,
     EvaluationConfig,
+    IntentRouterConfig,
     OpenAIConfig,
     CognitoConfig,
+    RetrievalConfig,
+    SemanticCacheConfig,
+    ServingConfig,
+    VectorIndexConfig,
 )
 from rag_application_framework.ml.embeddings.langchain_embeddings_factory import (
     LangchainEmbeddingsFactory,
@@ -87,6 +92,14 @@ class AppConfigFactory(AppFactorySession):
         inference_config = AppConfigFactory.get_inference_config()
 
         file_store_config = AppConfigFactory.get_file_store_config()
+
+        semantic_cache_config = AppConfigFactory.get_semantic_cache_config()
+
+        vector_index_config = AppConfigFactory.get_vector_index_config()
+
+        retrieval_config = AppConfigFactory.get_retrieval_config()
+
+        intent_router_config = AppConfigFactory.get_intent_router_config()
         # No confluence configuration
         #confluence_config = AppConfigFactory.get_confluence_config()
 
@@ -97,7 +110,11 @@ class AppConfigFactory(AppFactorySession):
             aws_config=AppConfigFactory.aws_config,
             inference_config=inference_config,
             evaluation_config=evaluation_config,
-            file_store_config=file_store_config
+            file_store_config=file_store_config,
+            semantic_cache_config=semantic_cache_config,
+            vector_index_config=vector_index_config,
+            retrieval_config=retrieval_config,
+            intent_router_config=intent_router_config,
             #confluence_config=confluence_config,
         )
 
@@ -118,6 +135,101 @@ class AppConfigFactory(AppFactorySession):
 
         return file_store_config
 
+    @staticmethod
+    def get_semantic_cache_config() -> SemanticCacheConfig:
+        return SemanticCacheConfig(
+            enabled=os.environ.get("SEMANTIC_CACHE_ENABLED", "false").lower() == "true",
+            similarity_threshold=float(
+                os.environ.get("SEMANTIC_CACHE_SIMILARITY_THRESHOLD", 0.95)
+            ),
+            ttl_seconds=float(os.environ.get("SEMANTIC_CACHE_TTL_SECONDS", 3600)),
+            max_entries_per_collection=int(
+                os.environ.get("SEMANTIC_CACHE_MAX_ENTRIES", 500)
+            ),
+        )
+
+    @staticmethod
+    def get_intent_router_config() -> IntentRouterConfig:
+        return IntentRouterConfig(
+            enabled=os.environ.get("INTENT_ROUTER_ENABLED", "false").lower() == "true",
+            similarity_threshold=float(
+                os.environ.get("INTENT_ROUTER_SIMILARITY_THRESHOLD", 0.85)
+            ),
+            max_words=int(os.environ.get("INTENT_ROUTER_MAX_WORDS", 8)),
+        )
+
+    @staticmethod
+    def get_serving_config() -> ServingConfig:
+        return ServingConfig(
+            host=os.environ.get("SERVING_HOST", "0.0.0.0"),
+            port=int(os.environ.get("SERVING_PORT", 8080)),
+            max_concurrency=int(os.environ.get("SERVING_MAX_CONCURRENCY", 4)),
+            max_queue_size=int(os.environ.get("SERVING_MAX_QUEUE_SIZE", 32)),
+            request_timeout=float(os.environ.get("SERVING_REQUEST_TIMEOUT", 60)),
+        )
+
+    @staticmethod
+    def get_vector_index_config() -> VectorIndexConfig:
+        index_type = os.environ.get("VECTOR_INDEX_TYPE", "hnsw").lower()
+        if index_type not in ("hnsw", "ivfflat", "none"):
+            raise ValueError(f"Invalid vector index type: {index_type} specified")
+        return VectorIndexConfig(
+            index_type=index_type,
+            hnsw_m=int(os.environ.get("VECTOR_INDEX_HNSW_M", 16)),
+            hnsw_ef_construction=int(
+                os.environ.get("VECTOR_INDEX_HNSW_EF_CONSTRUCTION", 64)
+            ),
+            hnsw_ef_search=int(os.environ.get("VECTOR_INDEX_HNSW_EF_SEARCH", 40)),
+            ivfflat_lists=int(os.environ.get("VECTOR_INDEX_IVFFLAT_LISTS", 100)),
+            ivfflat_probes=int(os.environ.get("VECTOR_INDEX_IVFFLAT_PROBES", 10)),
+        )
+
+    @staticmethod
+    def get_retrieval_config() -> RetrievalConfig:
+        collection_search_types = AppConfigFactory.parse_mapping(
+            os.environ.get("RETRIEVAL_COLLECTION_SEARCH_TYPES", "")
+        )
+        search_types = [os.environ.get("RETRIEVAL_SEARCH_TYPE", "mmr").lower()]
+        for search_type in search_types + list(collection_search_types.values()):
+            if search_type not in ("mmr", "hybrid"):
+                raise ValueError(f"Invalid retrieval search type: {search_type} specified")
+        return RetrievalConfig(
+            search_type=search_types[0],
+            collection_search_types={
+                collection: search_type.lower()
+                for collection, search_type in collection_search_types.items()
+            },
+            k=int(os.environ.get("RETRIEVAL_K", 5)),
+            fetch_k=int(os.environ.get("RETRIEVAL_FETCH_K", 30)),
+            two_phase_mmr=os.environ.get("RETRIEVAL_TWO_PHASE_MMR", "true").lower()
+            == "true",
+            min_similarity=(
+                float(os.environ["RETRIEVAL_MIN_SIMILARITY"])
+                if os.environ.get("RETRIEVAL_MIN_SIMILARITY")
+                else None
+            ),
+            lexical_k=int(os.environ.get("RETRIEVAL_LEXICAL_K", 20)),
+            rrf_k=int(os.environ.get("RETRIEVAL_RRF_K", 60)),
+            text_search_config=os.environ.get(
+                "RETRIEVAL_TEXT_SEARCH_CONFIG", "english"
+            ),
+            rerank_model=os.environ.get("RERANK_MODEL") or None,
+            rerank_candidates=int(os.environ.get("RERANK_CANDIDATES", 20)),
+            rerank_batch_size=int(os.environ.get("RERANK_BATCH_SIZE", 16)),
+            rerank_quantize=os.environ.get("RERANK_QUANTIZE", "true").lower()
+            == "true",
+            context_tokenizer=AppConfigFactory.get_context_tokenizer(),
+            context_token_budgets={
+                **RetrievalConfig().context_token_budgets,
+                **{
+                    engine.lower(): int(budget)
+                    for engine, budget in AppConfigFactory.parse_mapping(
+                        os.environ.get("CONTEXT_TOKEN_BUDGETS", "")
+                    ).items()
+                },
+            },
+        )
+
     @staticmethod
     def get_inference_config() -> InferenceConfig:
         inference_engine = os.environ.get("INFERENCE_ENGINE", "LOCAL")
@@ -199,12 +311,62 @@ class AppConfigFactory(AppFactorySession):
                 evaluation_engine=evaluation_engine,
                 bedrock_client=bedrock_api.client,
                 bedrock_model_id=bedrock_model_id,
+                worker_count=int(os.environ.get("EVALUATION_WORKER_COUNT", 2)),
+                max_queue_size=int(os.environ.get("EVALUATION_QUEUE_SIZE", 100)),
+                overflow_policy=os.environ.get(
+                    "EVALUATION_OVERFLOW_POLICY", "persist"
+                ).lower(),
+                overflow_sample_rate=float(
+                    os.environ.get("EVALUATION_OVERFLOW_SAMPLE_RATE", 0.1)
+                ),
+                sample_rate=float(os.environ.get("EVALUATION_SAMPLE_RATE", 1.0)),
+                model_sample_rates=AppConfigFactory.parse_float_mapping(
+                    os.environ.get("EVALUATION_MODEL_SAMPLE_RATES", "")
+                ),
+                token_budget_per_minute=int(
+                    os.environ.get("EVALUATION_TOKEN_BUDGET_PER_MINUTE", 0)
+                ),
+                low_similarity_threshold=(
+                    float(os.environ["EVALUATION_LOW_SIMILARITY_THRESHOLD"])
+                    if os.environ.get("EVALUATION_LOW_SIMILARITY_THRESHOLD")
+                    else None
+                ),
             )
         else:
             raise ValueError(f"Invalid inference engine for evaluation: {evaluation_engine} specified")
 
         return evaluation_confg
 
+    @staticmethod
+    def get_context_tokenizer() -> Optional[str]:
+        """CONTEXT_TOKENIZER, unless it is a directory that does not exist, like the
+        one of an image built without a tokenizer."""
+        tokenizer = os.environ.get("CONTEXT_TOKENIZER") or None
+        if tokenizer and os.path.isabs(tokenizer) and not os.path.isdir(tokenizer):
+            return None
+        return tokenizer
+
+    @staticmethod
+    def parse_mapping(value: str) -> Dict[str, str]:
+        """Parses "key=value,other=value" into a dictionary. Keys may contain ':'."""
+        mapping = {}
+        for item in value.split(","):
+            if not item.strip():
+                continue
+            key, _, entry_value = item.rpartition("=")
+            if not key:
+                raise ValueError(f"Invalid mapping entry: {item}, expected key=value")
+            mapping[key.strip()] = entry_value.strip()
+        return mapping
+
+    @staticmethod
+    def parse_float_mapping(value: str) -> Dict[str, float]:
+        """Parses "key=1.0,other=0.5" into a dictionary. Keys may contain ':'."""
+        return {
+            key: float(number)
+            for key, number in AppConfigFactory.parse_mapping(value).items()
+        }
+
     @staticmethod
     def get_embedding_config() -> EmbeddingConfig:
         use_bedrock = os.environ["USE_BEDROCK_EMBEDDINGS"].lower() == "true"
@@ -237,12 +399,43 @@ class AppConfigFactory(AppFactorySession):
             bedrock_region = None
             bedrock_profile = None
 
+        cache_max_entries = int(os.environ.get("EMBEDDINGS_CACHE_MAX_ENTRIES", 10000))
+        if cache_max_entries > 0:
+            embeddings = LangchainEmbeddingsFactory.get_cached_embeddings(
+                embeddings=embeddings,
+                max_entries=cache_max_entries,
+                persist_path=os.environ.get("EMBEDDINGS_CACHE_PATH"),
+            )
+
         return EmbeddingConfig(
             collection_name=collection_name,
             embeddings=embeddings,
             use_bedrock=use_bedrock,
             bedrock_region=bedrock_region,
             bedrock_profile=bedrock_profile,
+            ingestion_max_workers=int(
+                os.environ.get("INGESTION_EMBEDDING_WORKERS", 8)
+            ),
+            ingestion_batch_size=int(
+                os.environ.get("INGESTION_EMBEDDING_BATCH_SIZE", 64)
+            ),
+            ingestion_queue_size=int(os.environ.get("INGESTION_QUEUE_SIZE", 2)),
+            ingestion_parse_workers=int(os.environ.get("INGESTION_PARSE_WORKERS", 0)),
+            ingestion_parse_timeout=float(
+                os.environ.get("INGESTION_PARSE_TIMEOUT", 600)
+            ),
+            ingestion_pdf_pages_per_task=int(
+                os.environ.get("INGESTION_PDF_PAGES_PER_TASK", 20)
+            ),
+            parsed_document_cache_path=os.environ.get("PARSED_DOCUMENT_CACHE_PATH"),
+            parsed_document_cache_max_bytes=int(
+                float(os.environ.get("PARSED_DOCUMENT_CACHE_MAX_MB", 1024))
+                * 1024
+                * 1024
+            ),
+            chunk_embedding_cache_max_entries=int(
+                os.environ.get("CHUNK_EMBEDDING_CACHE_MAX_ENTRIES", 1_000_000)
+            ),
         )
 
     @staticmethod
@@ -277,6 +470,15 @@ class AppConfigFactory(AppFactorySession):
                 host=rds_secret_dict["host"],
             )
 
+        db_config.pool_min_size = int(os.environ.get("PGVECTOR_POOL_MIN_SIZE", 1))
+        db_config.pool_max_size = int(os.environ.get("PGVECTOR_POOL_MAX_SIZE", 10))
+        db_config.pool_max_lifetime = float(
+            os.environ.get("PGVECTOR_POOL_MAX_LIFETIME", 1800)
+        )
+        db_config.pool_borrow_timeout = float(
+            os.environ.get("PGVECTOR_POOL_BORROW_TIMEOUT", 30)
+        )
+
         return db_config
 
     @staticmethod
@@ -0,0 +1,418 @@
+import threading
+from typing import Callable, Dict, Optional, TypeVar, Union
+
+import sqlalchemy
+from boto3.session import Session
+from rag_application_framework.aws.aws_client_factory import AwsClientFactory
+from rag_application_framework.aws.aws_session_factory import AwsSessionFactory
+from rag_application_framework.aws.s3_api import S3Api
+from rag_application_framework.aws.sagemaker_runtime_api import SagemakerRuntimeApi
+from rag_application_framework.config.app_config import AppConfig
+from rag_application_framework.config.app_config_factory import AppConfigFactory
+from rag_application_framework.db.chunk_embedding_cache import ChunkEmbeddingCache
+from rag_application_framework.db.collection_version_store import (
+    CollectionVersionStore,
+)
+from rag_application_framework.db.embeddings_database import EmbeddingsDatabase
+from rag_application_framework.db.models import inititalize
+from rag_application_framework.db.psycopg_connection_factory import (
+    PsycopgConnectionFactory,
+)
+from rag_application_framework.db.vector_index_manager import VectorIndexManager
+from rag_application_framework.logging.logging import Logging
+from rag_application_framework.ml.embeddings.caching_embeddings import (
+    CachingEmbeddings,
+)
+from rag_application_framework.ml.embeddings.ingestion_embedder import (
+    IngestionEmbedder,
+)
+from rag_application_framework.ml.embeddings.langchain_embeddings_factory import (
+    LangchainEmbeddingsFactory,
+)
+from rag_application_framework.modules.chat.bot_rag_pipeline import BotRagPipeline
+from rag_application_framework.modules.chat.intent_router import IntentRouter
+from rag_application_framework.modules.chat.semantic_answer_cache import (
+    SemanticAnswerCache,
+)
+from rag_application_framework.modules.chat.rag_pipeline_runtime import (
+    RagPipelineRuntime,
+)
+from rag_application_framework.modules.file_uploader.file_system_file_uploader import (
+    FileSystemFilesUploader,
+)
+from rag_application_framework.modules.file_uploader.parsed_document_cache import (
+    ParsedDocumentCache,
+)
+from rag_application_framework.modules.file_uploader.process_pool_document_parser import (
+    ProcessPoolDocumentParser,
+)
+from rag_application_framework.modules.file_uploader.s3_file_uploader import (
+    S3FilesUploader,
+)
+from rag_application_framework.rag_evaluation.evaluation_sampling_policy import (
+    EvaluationSamplingPolicy,
+    EvaluationSamplingPolicyFactory,
+)
+from rag_application_framework.rag_evaluation.evaluation_worker import (
+    EvaluationWorker,
+    OverflowPolicy,
+)
+from rag_application_framework.rag_evaluation.rag_score_writer import RagScoreWriter
+from sqlalchemy import text
+
+logger = Logging.get_logger(__name__)
+
+_T = TypeVar("_T")
+
+
+class AppContext:
+    """Application wide resources shared by every Streamlit page and session.
+
+    Everything is created lazily on first access and kept for the lifetime of the
+    process, so reruns of a page only pay for a health check of the database
+    instead of rebuilding config, clients, engines and the pipeline.
+    """
+
+    _instance: Optional["AppContext"] = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, app_config: Optional[AppConfig] = None) -> None:
+        self._resources: Dict[str, object] = {}
+        self._lock = threading.RLock()
+        if app_config:
+            self._resources["app_config"] = app_config
+
+    @classmethod
+    def get_instance(cls) -> "AppContext":
+        """Returns the process wide context, creating it on first use."""
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    cls._instance = AppContext()
+        return cls._instance
+
+    @classmethod
+    def reset(cls) -> None:
+        """Disposes the process wide context so the next access rebuilds it."""
+        with cls._instance_lock:
+            if cls._instance is not None:
+                cls._instance.close()
+            cls._instance = None
+
+    def _get_or_create(self, name: str, builder: Callable[[], _T]) -> _T:
+        if name not in self._resources:
+            with self._lock:
+                if name not in self._resources:
+                    logger.info("Initialising application resource: %s", name)
+                    self._resources[name] = builder()
+        return self._resources[name]  # type: ignore[return-value]
+
+    @property
+    def app_config(self) -> AppConfig:
+        return self._get_or_create("app_config", AppConfigFactory.build_from_env)
+
+    @property
+    def db_connection_factory(self) -> PsycopgConnectionFactory:
+        def build() -> PsycopgConnectionFactory:
+            db_config = self.app_config.db_config
+            return PsycopgConnectionFactory(
+                host=db_config.host,
+                port=db_config.port,
+                username=db_config.user,
+                password=db_config.password,
+                database_name=db_config.database,
+                pool_min_size=db_config.pool_min_size,
+                pool_max_size=db_config.pool_max_size,
+                pool_max_lifetime=db_config.pool_max_lifetime,
+                pool_borrow_timeout=db_config.pool_borrow_timeout,
+                session_options=VectorIndexManager.session_options(
+                    self.app_config.vector_index_config
+                ),
+            )
+
+        return self._get_or_create("db_connection_factory", build)
+
+    @property
+    def engine(self) -> sqlalchemy.engine.Engine:
+        def build() -> sqlalchemy.engine.Engine:
+            engine = sqlalchemy.create_engine(
+                self.db_connection_factory.get_connection_str(), pool_pre_ping=True
+            )
+            inititalize(engine)
+            return engine
+
+        return self._get_or_create("engine", build)
+
+    @property
+    def boto3_session(self) -> Session:
+        return self._get_or_create(
+            "boto3_session",
+            lambda: AwsSessionFactory.create_session_from_config(
+                self.app_config.aws_config
+            ),
+        )
+
+    @property
+    def sagemaker_runtime_api(self) -> Optional[SagemakerRuntimeApi]:
+        def build() -> Optional[SagemakerRuntimeApi]:
+            inference_engine = self.app_config.inference_config.inference_engine
+            if inference_engine.name.lower() != "sagemaker":
+                return None
+            return AwsClientFactory.build_from_boto_session(
+                self.boto3_session,
+                SagemakerRuntimeApi,
+            )
+
+        return self._get_or_create("sagemaker_runtime_api", build)
+
+    @property
+    def s3_api(self) -> Optional[S3Api]:
+        def build() -> Optional[S3Api]:
+            if not self.app_config.file_store_config.is_s3:
+                return None
+            return AwsClientFactory.build_from_boto_session(
+                self.boto3_session,
+                S3Api,
+            )
+
+        return self._get_or_create("s3_api", build)
+
+    @property
+    def embeddings_database(self) -> EmbeddingsDatabase:
+        def build() -> EmbeddingsDatabase:
+            embedding_config = self.app_config.embedding_config
+            embeddings_database = EmbeddingsDatabase(
+                vector_db=self.db_connection_factory,
+                collection_name=embedding_config.collection_name,
+                embeddings=embedding_config.embeddings,
+                ingestion_embedder=IngestionEmbedder(
+                    embeddings=embedding_config.embeddings,
+                    max_workers=embedding_config.ingestion_max_workers,
+                    batch_size=embedding_config.ingestion_batch_size,
+                ),
+                index_manager=VectorIndexManager(
+                    connection_factory=self.db_connection_factory,
+                    collection_name=embedding_config.collection_name,
+                    index_config=self.app_config.vector_index_config,
+                ),
+                chunk_embedding_cache=ChunkEmbeddingCache(
+                    connection_factory=self.db_connection_factory,
+                    namespace=LangchainEmbeddingsFactory.get_namespace(
+                        embedding_config.embeddings
+                    ),
+                    max_entries=embedding_config.chunk_embedding_cache_max_entries,
+                ),
+            )
+            # Tells the answer caches of other processes the documents changed
+            embeddings_database.add_collection_change_listener(
+                self.collection_version_store.bump
+            )
+            return embeddings_database
+
+        return self._get_or_create("embeddings_database", build)
+
+    @property
+    def collection_version_store(self) -> CollectionVersionStore:
+        return self._get_or_create(
+            "collection_version_store",
+            lambda: CollectionVersionStore(self.db_connection_factory),
+        )
+
+    @property
+    def bot_rag_pipeline(self) -> BotRagPipeline:
+        def build() -> BotRagPipeline:
+            app_config = self.app_config
+            bot_rag_pipeline = BotRagPipeline(
+                evaluation_config=app_config.evaluation_config,
+                embeddings_config=app_config.embedding_config,
+                engine=self.engine,
+                file_store_config=app_config.file_store_config,
+                inference_config=app_config.inference_config,
+                db_factory=self.db_connection_factory,
+                sagemaker_runtime_api=self.sagemaker_runtime_api,
+                s3_api=self.s3_api,
+                evaluation_worker=self.evaluation_worker,
+                evaluation_sampling_policy=self.evaluation_sampling_policy,
+                semantic_answer_cache=self.semantic_answer_cache,
+                retrieval_config=app_config.retrieval_config,
+                intent_router=self.intent_router,
+            )
+            if bot_rag_pipeline.search_type == "hybrid":
+                index_manager = self.embeddings_database.index_manager
+                try:
+                    index_manager.ensure_text_search_index(
+                        app_config.retrieval_config.text_search_config
+                    )
+                except Exception as e:
+                    logger.error("Failed to ensure the text search index: %s", e)
+            return bot_rag_pipeline
+
+        return self._get_or_create("bot_rag_pipeline", build)
+
+    @property
+    def intent_router(self) -> Optional[IntentRouter]:
+        def build() -> Optional[IntentRouter]:
+            router_config = self.app_config.intent_router_config
+            if not router_config.enabled:
+                return None
+            return IntentRouter(
+                embeddings=self.app_config.embedding_config.embeddings,
+                similarity_threshold=router_config.similarity_threshold,
+                max_words=router_config.max_words,
+            )
+
+        return self._get_or_create("intent_router", build)
+
+    @property
+    def semantic_answer_cache(self) -> Optional[SemanticAnswerCache]:
+        def build() -> Optional[SemanticAnswerCache]:
+            cache_config = self.app_config.semantic_cache_config
+            if not cache_config.enabled:
+                return None
+            semantic_answer_cache = SemanticAnswerCache(
+                similarity_threshold=cache_config.similarity_threshold,
+                ttl_seconds=cache_config.ttl_seconds,
+                max_entries_per_collection=cache_config.max_entries_per_collection,
+                version_reader=self.collection_version_store.get,
+            )
+            self.embeddings_database.add_collection_change_listener(
+                semantic_answer_cache.invalidate
+            )
+            return semantic_answer_cache
+
+        return self._get_or_create("semantic_answer_cache", build)
+
+    @property
+    def evaluation_sampling_policy(self) -> Optional[EvaluationSamplingPolicy]:
+        def build() -> Optional[EvaluationSamplingPolicy]:
+            evaluation_config = self.app_config.evaluation_config
+            if not evaluation_config:
+                return None
+            return EvaluationSamplingPolicyFactory.build_from_config(evaluation_config)
+
+        return self._get_or_create("evaluation_sampling_policy", build)
+
+    @property
+    def evaluation_worker(self) -> Optional[EvaluationWorker]:
+        def build() -> Optional[EvaluationWorker]:
+            evaluation_config = self.app_config.evaluation_config
+            if not evaluation_config:
+                return None
+            evaluation_worker = EvaluationWorker(
+                score_writer=RagScoreWriter(
+                    evaluation_config=evaluation_config,
+                    embeddings=self.app_config.embedding_config.embeddings,
+                    engine=self.engine,
+                ),
+                engine=self.engine,
+                num_workers=evaluation_config.worker_count,
+                max_queue_size=evaluation_config.max_queue_size,
+                overflow_policy=OverflowPolicy(evaluation_config.overflow_policy),
+                overflow_sample_rate=evaluation_config.overflow_sample_rate,
+            )
+            evaluation_worker.start()
+            return evaluation_worker
+
+        return self._get_or_create("evaluation_worker", build)
+
+    @property
+    def document_parser(self) -> ProcessPoolDocumentParser:
+        def build() -> ProcessPoolDocumentParser:
+            embedding_config = self.app_config.embedding_config
+            return ProcessPoolDocumentParser(
+                # 0 uses every CPU of the container
+                max_workers=embedding_config.ingestion_parse_workers or None,
+                timeout=embedding_config.ingestion_parse_timeout,
+                pdf_pages_per_task=embedding_config.ingestion_pdf_pages_per_task,
+            )
+
+        return self._get_or_create("document_parser", build)
+
+    @property
+    def parsed_document_cache(self) -> Optional[ParsedDocumentCache]:
+        def build() -> Optional[ParsedDocumentCache]:
+            embedding_config = self.app_config.embedding_config
+            if not embedding_config.parsed_document_cache_path:
+                return None
+            return ParsedDocumentCache(
+                cache_dir=embedding_config.parsed_document_cache_path,
+                max_bytes=embedding_config.parsed_document_cache_max_bytes,
+            )
+
+        return self._get_or_create("parsed_document_cache", build)
+
+    @property
+    def file_uploader(self) -> Union[S3FilesUploader, FileSystemFilesUploader]:
+        def build() -> Union[S3FilesUploader, FileSystemFilesUploader]:
+            app_config = self.app_config
+            if app_config.file_store_config.is_s3:
+                return S3FilesUploader(
+                    embeddings=app_config.embedding_config.embeddings,
+                    embeddings_database=self.embeddings_database,
+                    bucket_name=str(app_config.file_store_config.storage_bucket_name),
+                    boto3_session=self.boto3_session,
+                    queue_size=app_config.embedding_config.ingestion_queue_size,
+                    document_parser=self.document_parser,
+                    parsed_document_cache=self.parsed_document_cache,
+                )
+            return FileSystemFilesUploader(
+                embeddings=app_config.embedding_config.embeddings,
+                embeddings_database=self.embeddings_database,
+                folder_path=str(app_config.file_store_config.storage_path),
+                queue_size=app_config.embedding_config.ingestion_queue_size,
+                document_parser=self.document_parser,
+                parsed_document_cache=self.parsed_document_cache,
+            )
+
+        return self._get_or_create("file_uploader", build)
+
+    def health_check(self) -> bool:
+        """Checks that the database is reachable through the shared engine.
+
+        A failed check disposes the engine's pool so stale connections are replaced
+        on the next use, without re-initialising the rest of the context.
+        """
+        try:
+            with self.engine.connect() as connection:
+                connection.execute(text("SELECT 1"))
+            return True
+        except Exception as e:
+            logger.error("Application health check failed: %s", e)
+            engine = self._resources.get("engine")
+            if isinstance(engine, sqlalchemy.engine.Engine):
+                engine.dispose()
+            return False
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Hits of the question embedding cache and questions per intent router
+        route, since the process started."""
+        stats = {}
+        embeddings = self.app_config.embedding_config.embeddings
+        if isinstance(embeddings, CachingEmbeddings):
+            stats["embedding_cache"] = embeddings.stats
+        if self.intent_router is not None:
+            stats["intent_routes"] = self.intent_router.stats
+        return stats
+
+    def close(self) -> None:
+        with self._lock:
+            file_uploader = self._resources.get("file_uploader")
+            if isinstance(file_uploader, (S3FilesUploader, FileSystemFilesUploader)):
+                file_uploader.close()
+            document_parser = self._resources.get("document_parser")
+            if isinstance(document_parser, ProcessPoolDocumentParser):
+                document_parser.close()
+            bot_rag_pipeline = self._resources.get("bot_rag_pipeline")
+            if isinstance(bot_rag_pipeline, BotRagPipeline):
+                bot_rag_pipeline.close()
+            evaluation_worker = self._resources.get("evaluation_worker")
+            if isinstance(evaluation_worker, EvaluationWorker):
+                evaluation_worker.stop(timeout=5)
+            engine = self._resources.get("engine")
+            if isinstance(engine, sqlalchemy.engine.Engine):
+                engine.dispose()
+            db_connection_factory = self._resources.get("db_connection_factory")
+            if isinstance(db_connection_factory, PsycopgConnectionFactory):
+                db_connection_factory.close()
+            self._resources.clear()
+        RagPipelineRuntime.invalidate()
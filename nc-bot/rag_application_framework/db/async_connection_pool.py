@@ -0,0 +1,89 @@
+import asyncio
+import shlex
+from typing import Dict, Optional
+
+import asyncpg
+
+
+def parse_session_options(options: Optional[str]) -> Dict[str, str]:
+    """Turns libpq options like "-c hnsw.ef_search=40" into asyncpg server settings."""
+    settings = {}
+    arguments = shlex.split(options or "")
+    for flag, setting in zip(arguments[::2], arguments[1::2]):
+        if flag != "-c" or "=" not in setting:
+            raise ValueError(f"Unsupported session option: {flag} {setting}")
+        name, _, value = setting.partition("=")
+        settings[name] = value
+    return settings
+
+
+class AsyncPgConnectionPool:
+    """asyncpg pool for the coroutines of the application.
+
+    An asyncpg pool belongs to the event loop it was created in, so a new pool is
+    created when it is used from another loop (for example one asyncio.run per
+    request) and the old one is terminated.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        database_name: str,
+        username: str,
+        password: str,
+        min_size: int = 1,
+        max_size: int = 10,
+        max_inactive_lifetime: float = 300.0,
+        session_options: Optional[str] = None,
+    ) -> None:
+        self.host = host
+        self.port = port
+        self.database_name = database_name
+        self.username = username
+        self.password = password
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_inactive_lifetime = max_inactive_lifetime
+        self.server_settings = parse_session_options(session_options)
+        self._pool: Optional[asyncpg.Pool] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock: Optional[asyncio.Lock] = None
+
+    async def get_pool(self) -> asyncpg.Pool:
+        loop = asyncio.get_running_loop()
+        if self._pool is not None and self._loop is loop:
+            return self._pool
+
+        if self._lock is None or self._loop is not loop:
+            self._lock = asyncio.Lock()
+            if self._pool is not None:
+                self._pool.terminate()
+            self._pool = None
+            self._loop = loop
+
+        async with self._lock:
+            if self._pool is None:
+                self._pool = await asyncpg.create_pool(
+                    host=self.host,
+                    port=self.port,
+                    database=self.database_name,
+                    user=self.username,
+                    password=self.password,
+                    min_size=self.min_size,
+                    max_size=self.max_size,
+                    max_inactive_connection_lifetime=self.max_inactive_lifetime,
+                    server_settings=self.server_settings,
+                )
+        return self._pool
+
+    async def close(self):
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+
+    def terminate(self):
+        """Closes the connections without waiting, for shutdown outside a loop."""
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool = None
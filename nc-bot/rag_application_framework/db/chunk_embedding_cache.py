@@ -0,0 +1,167 @@
+import hashlib
+import json
+from typing import Dict, Iterable, List
+
+import numpy as np
+from psycopg2.extras import execute_values
+from rag_application_framework.db.psycopg_connection_factory import (
+    PsycopgConnectionFactory,
+)
+from rag_application_framework.logging.logging import Logging
+
+logger = Logging.get_logger(__name__)
+
+CHUNK_EMBEDDING_CACHE_TABLE = "chunk_embedding_cache"
+
+
+def content_hash(text: str) -> str:
+    """Hash of the whitespace normalized text of a chunk, the key of its vector."""
+    normalized = " ".join(text.split())
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def chunk_id(text: str, metadata: dict) -> str:
+    """Stable id of a chunk, stored as the custom_id of its row.
+
+    It changes whenever the text or the metadata of the chunk changes, so a row
+    whose id is still produced by a re-ingested source can be kept as it is.
+    """
+    canonical_metadata = json.dumps(metadata, sort_keys=True, default=str)
+    return hashlib.sha256(
+        f"{content_hash(text)}\x00{canonical_metadata}".encode("utf-8")
+    ).hexdigest()
+
+
+class ChunkEmbeddingCache:
+    """Persistent content hash to vector cache of the ingested chunks.
+
+    Vectors are kept in Postgres next to the collections, keyed by the content hash
+    of the chunk and the embedding model (`namespace`). They outlive the rows of
+    the collection, so a chunk that is deleted and ingested again, moved to another
+    file or only changed its metadata is never embedded twice. Once a namespace
+    holds more than `max_entries` vectors, the least recently used are evicted.
+    """
+
+    def __init__(
+        self,
+        connection_factory: PsycopgConnectionFactory,
+        namespace: str,
+        max_entries: int = 1_000_000,
+    ) -> None:
+        self.connection_factory = connection_factory
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self._table_ensured = False
+
+    def _ensure_table(self, cursor):
+        if self._table_ensured:
+            return
+        cursor.execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS {CHUNK_EMBEDDING_CACHE_TABLE} (
+                content_hash VARCHAR(64) NOT NULL,
+                namespace VARCHAR(255) NOT NULL,
+                embedding BYTEA NOT NULL,
+                created_at TIMESTAMP NOT NULL DEFAULT now(),
+                last_used_at TIMESTAMP NOT NULL DEFAULT now(),
+                PRIMARY KEY (namespace, content_hash)
+            )
+            """
+        )
+        # Tables created before eviction have no last_used_at
+        cursor.execute(
+            f"""
+            ALTER TABLE {CHUNK_EMBEDDING_CACHE_TABLE}
+            ADD COLUMN IF NOT EXISTS last_used_at TIMESTAMP NOT NULL DEFAULT now()
+            """
+        )
+        cursor.execute(
+            f"""
+            CREATE INDEX IF NOT EXISTS ix_{CHUNK_EMBEDDING_CACHE_TABLE}_last_used
+            ON {CHUNK_EMBEDDING_CACHE_TABLE} (namespace, last_used_at)
+            """
+        )
+        cursor.connection.commit()
+        self._table_ensured = True
+
+    def get_many(self, hashes: Iterable[str]) -> Dict[str, List[float]]:
+        hashes = sorted(set(hashes))
+        if not hashes:
+            return {}
+        with self.connection_factory.connection() as conn:
+            with conn.cursor() as cursor:
+                self._ensure_table(cursor)
+                cursor.execute(
+                    f"""
+                    SELECT content_hash, embedding FROM {CHUNK_EMBEDDING_CACHE_TABLE}
+                    WHERE namespace = %s AND content_hash = ANY(%s)
+                    """,
+                    (self.namespace, hashes),
+                )
+                rows = cursor.fetchall()
+                if rows:
+                    cursor.execute(
+                        f"""
+                        UPDATE {CHUNK_EMBEDDING_CACHE_TABLE} SET last_used_at = now()
+                        WHERE namespace = %s AND content_hash = ANY(%s)
+                        """,
+                        (self.namespace, [row[0] for row in rows]),
+                    )
+            conn.commit()
+        return {
+            key: np.frombuffer(bytes(data), dtype=np.float32).tolist()
+            for key, data in rows
+        }
+
+    def put_many(self, vectors: Dict[str, List[float]]):
+        if not vectors:
+            return
+        with self.connection_factory.connection() as conn:
+            with conn.cursor() as cursor:
+                self._ensure_table(cursor)
+                execute_values(
+                    cursor,
+                    f"""
+                    INSERT INTO {CHUNK_EMBEDDING_CACHE_TABLE}
+                        (content_hash, namespace, embedding)
+                    VALUES %s
+                    ON CONFLICT (namespace, content_hash)
+                    DO UPDATE SET last_used_at = now()
+                    """,
+                    [
+                        (
+                            key,
+                            self.namespace,
+                            np.asarray(vector, dtype=np.float32).tobytes(),
+                        )
+                        for key, vector in vectors.items()
+                    ],
+                )
+            conn.commit()
+        if self.max_entries > 0:
+            self._evict()
+
+    def _evict(self):
+        """Deletes the least recently used vectors beyond `max_entries`."""
+        with self.connection_factory.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    f"""
+                    DELETE FROM {CHUNK_EMBEDDING_CACHE_TABLE}
+                    WHERE namespace = %(namespace)s AND content_hash IN (
+                        SELECT content_hash FROM {CHUNK_EMBEDDING_CACHE_TABLE}
+                        WHERE namespace = %(namespace)s
+                        ORDER BY last_used_at DESC
+                        OFFSET %(max_entries)s
+                    )
+                    """,
+                    {"namespace": self.namespace, "max_entries": self.max_entries},
+                )
+                evicted = cursor.rowcount
+            conn.commit()
+        if evicted:
+            logger.info(
+                "Evicted %s vectors of %s from the chunk embedding cache",
+                evicted,
+                self.namespace,
+            )
@@ -0,0 +1,84 @@
+from typing import Optional
+
+from rag_application_framework.db.pgvector_bulk_writer import COLLECTION_TABLE
+from rag_application_framework.db.psycopg_connection_factory import (
+    PsycopgConnectionFactory,
+)
+from rag_application_framework.logging.logging import Logging
+
+logger = Logging.get_logger(__name__)
+
+COLLECTION_VERSION_TABLE = "rag_collection_version"
+
+
+class CollectionVersionStore:
+    """Version of the documents of every collection, kept in Postgres.
+
+    The version of a collection is bumped whenever its documents are written or
+    deleted, so processes that did not make the change, like the HTTP serving
+    front-end next to the Streamlit dashboard, can tell that the answers they
+    cached are stale. Collections never changed have version 0.
+    """
+
+    def __init__(self, connection_factory: PsycopgConnectionFactory) -> None:
+        self.connection_factory = connection_factory
+        self._table_ensured = False
+
+    def _ensure_table(self, cursor):
+        if self._table_ensured:
+            return
+        cursor.execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS {COLLECTION_VERSION_TABLE} (
+                collection_name VARCHAR NOT NULL PRIMARY KEY,
+                version BIGINT NOT NULL
+            )
+            """
+        )
+        cursor.connection.commit()
+        self._table_ensured = True
+
+    def get(self, collection_name: str) -> int:
+        with self.connection_factory.connection() as conn:
+            with conn.cursor() as cursor:
+                self._ensure_table(cursor)
+                cursor.execute(
+                    f"""
+                    SELECT version FROM {COLLECTION_VERSION_TABLE}
+                    WHERE collection_name = %s
+                    """,
+                    (collection_name,),
+                )
+                row = cursor.fetchone()
+        return row[0] if row else 0
+
+    def bump(self, collection_name: Optional[str] = None):
+        """Bumps the version of a collection, or of all collections when None."""
+        with self.connection_factory.connection() as conn:
+            with conn.cursor() as cursor:
+                self._ensure_table(cursor)
+                if collection_name is not None:
+                    cursor.execute(
+                        f"""
+                        INSERT INTO {COLLECTION_VERSION_TABLE} (collection_name, version)
+                        VALUES (%s, 1)
+                        ON CONFLICT (collection_name)
+                        DO UPDATE SET version = {COLLECTION_VERSION_TABLE}.version + 1
+                        """,
+                        (collection_name,),
+                    )
+                else:
+                    cursor.execute(
+                        f"UPDATE {COLLECTION_VERSION_TABLE} SET version = version + 1"
+                    )
+                    cursor.execute(
+                        f"""
+                        INSERT INTO {COLLECTION_VERSION_TABLE} (collection_name, version)
+                        SELECT name, 1 FROM {COLLECTION_TABLE}
+                        ON CONFLICT (collection_name) DO NOTHING
+                        """
+                    )
+            conn.commit()
+        logger.info(
+            "Bumped the document version of %s", collection_name or "all collections"
+        )
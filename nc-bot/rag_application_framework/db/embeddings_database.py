@@ -1,13 +1,66 @@
-from typing import Union
+import threading
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple, Union
 
 from langchain_community.embeddings.bedrock import BedrockEmbeddings
 from langchain_community.embeddings.huggingface import HuggingFaceEmbeddings
 from langchain.schema import Document
 from langchain_community.vectorstores.pgvector import PGVector
 from psycopg2.extensions import cursor as Cursor
+from rag_application_framework.db.chunk_embedding_cache import (
+    ChunkEmbeddingCache,
+    chunk_id,
+    content_hash,
+)
+from rag_application_framework.db.pgvector_bulk_writer import (
+    PgVectorBulkWriter,
+    SkippedChunksDeletedError,
+)
 from rag_application_framework.db.psycopg_connection_factory import (
     PsycopgConnectionFactory,
 )
+from rag_application_framework.db.vector_index_manager import VectorIndexManager
+from rag_application_framework.logging.logging import Logging
+from rag_application_framework.ml.embeddings.ingestion_embedder import (
+    IngestionEmbedder,
+)
+
+logger = Logging.get_logger(__name__)
+
+
+@dataclass
+class IngestionReport:
+    """Outcome of an ingestion: chunks left as they were, rows inserted and
+    deleted, and how many chunks had to be embedded (not in the vector cache)."""
+
+    skipped: int = 0
+    inserted: int = 0
+    deleted: int = 0
+    embedded: int = 0
+
+    def __add__(self, other: "IngestionReport") -> "IngestionReport":
+        return IngestionReport(
+            skipped=self.skipped + other.skipped,
+            inserted=self.inserted + other.inserted,
+            deleted=self.deleted + other.deleted,
+            embedded=self.embedded + other.embedded,
+        )
+
+
+@dataclass
+class EmbeddedChunks:
+    """Chunks of some sources, embedded but not written yet. `chunk_ids` are the
+    ids of every chunk of the sources, the other lists only hold the new ones.
+    `skipped` holds the chunks left out as already stored."""
+
+    sources: List[str]
+    chunk_ids: List[str]
+    ids: List[str]
+    texts: List[str]
+    metadatas: List[dict]
+    vectors: List[List[float]]
+    embedded: int
+    skipped: Dict[str, Document] = field(default_factory=dict)
 
 
 class EmbeddingsDatabase:
@@ -18,28 +71,62 @@ class EmbeddingsDatabase:
         vector_db: PsycopgConnectionFactory,
         collection_name: str,
         embeddings: Union[HuggingFaceEmbeddings, BedrockEmbeddings],
+        ingestion_embedder: Optional[IngestionEmbedder] = None,
+        index_manager: Optional[VectorIndexManager] = None,
+        chunk_embedding_cache: Optional[ChunkEmbeddingCache] = None,
     ):
         self.vector_db = vector_db
         self.collection_name = collection_name
         self.embeddings = embeddings
+        self.ingestion_embedder = ingestion_embedder or IngestionEmbedder(embeddings)
+        self.bulk_writer = PgVectorBulkWriter(
+            connection_factory=vector_db, collection_name=collection_name
+        )
+        self.index_manager = index_manager
+        self.chunk_embedding_cache = chunk_embedding_cache
+        self._ingestion_indexes_ensured = False
+        self._vector_store: Optional[PGVector] = None
+        self._vector_store_lock = threading.Lock()
+        self._change_listeners: List[Callable[[Optional[str]], None]] = []
 
-    @property
-    def cursor(self):
-        return self.vector_db.make_connection().cursor()
+    def add_collection_change_listener(
+        self, listener: Callable[[Optional[str]], None]
+    ):
+        """Registers a callback run after documents are written or deleted. It gets
+        the changed collection name, or None when every collection was cleared."""
+        self._change_listeners.append(listener)
 
-    def execute_query_fetch_one(self, query: str, cursor: Union[Cursor, None] = None):
-        if not cursor:
-            _cursor = self.cursor
-        else:
-            _cursor = cursor
+    def _notify_collection_changed(self, collection_name: Optional[str]):
+        for listener in self._change_listeners:
+            try:
+                listener(collection_name)
+            except Exception as e:
+                logger.error("Collection change listener failed: %s", e)
 
-        _cursor.execute(query)
-        result = _cursor.fetchone()
+    @property
+    def vector_store(self) -> PGVector:
+        """PGVector store of the collection, created once. Creating it ensures the
+        langchain tables and the collection exist."""
+        if self._vector_store is None:
+            with self._vector_store_lock:
+                if self._vector_store is None:
+                    self._vector_store = PGVector(
+                        collection_name=self.collection_name,
+                        connection_string=self.vector_db.get_connection_str(),
+                        embedding_function=self.embeddings,
+                        engine_args=self.vector_db.get_engine_args(),
+                    )
+        return self._vector_store
 
-        if not cursor:
-            _cursor.connection.close()
+    def execute_query_fetch_one(self, query: str, cursor: Union[Cursor, None] = None):
+        if cursor:
+            cursor.execute(query)
+            return cursor.fetchone()
 
-        return result
+        with self.vector_db.connection() as conn:
+            with conn.cursor() as _cursor:
+                _cursor.execute(query)
+                return _cursor.fetchone()
 
     def is_existing_table(
         self,
@@ -60,66 +147,172 @@ class EmbeddingsDatabase:
             raise ValueError(f"Invalid result returned from database: {result}")
 
     def clear_table(self):
-        with self.cursor as cursor:
-            if self.is_existing_table(cursor=cursor):
-                """Truncates the embeddings table in the database."""
-                query = f"TRUNCATE TABLE langchain_pg_embedding;"
-                cursor.execute(query)
-                cursor.connection.commit()
+        with self.vector_db.connection() as conn:
+            with conn.cursor() as cursor:
+                if self.is_existing_table(cursor=cursor):
+                    """Truncates the embeddings table in the database."""
+                    query = f"TRUNCATE TABLE langchain_pg_embedding;"
+                    cursor.execute(query)
+                    conn.commit()
+        self._notify_collection_changed(None)
 
     def delete_documents_with_sources(self, sources: list[str], cursor=None):
         if not cursor:
-            _cursor = self.cursor
-        else:
-            _cursor = cursor
+            with self.vector_db.connection() as conn:
+                with conn.cursor() as _cursor:
+                    self.delete_documents_with_sources(sources, cursor=_cursor)
+            return
 
-        if self.is_existing_table(cursor=_cursor):
+        if self.is_existing_table(cursor=cursor):
             id_placeholders = ','.join(['%s'] * len(sources))
-            print(sources)
+            logger.info("Deleting documents with sources: %s", sources)
             query = f"""
             DELETE FROM langchain_pg_embedding as embed 
             WHERE embed.cmetadata ->> 'source' IN ({id_placeholders})
             """
-            _cursor.execute(query, sources)
-            _cursor.connection.commit()
+            cursor.execute(query, sources)
+            cursor.connection.commit()
+            self._notify_collection_changed(self.collection_name)
 
-        if not cursor:
-            _cursor.connection.close()
+    def _embed(self, texts: List[str]) -> Tuple[List[List[float]], int]:
+        """Embeds the texts, reusing the vectors of the chunk embedding cache.
+        Returns the vectors and how many texts were sent to the model."""
+        hashes = [content_hash(text) for text in texts]
+        cached: Dict[str, List[float]] = {}
+        if self.chunk_embedding_cache:
+            try:
+                cached = self.chunk_embedding_cache.get_many(hashes)
+            except Exception as e:
+                logger.error("Failed to read the chunk embedding cache: %s", e)
 
-    def save_as_embedding(
-        self,
-        documents: list[Document],
-    ):
-        """This function performs the required processing of the data for the given input
-        file and puts that into the database.
+        missing = [i for i, key in enumerate(hashes) if key not in cached]
+        if missing:
+            embedded = self.ingestion_embedder.embed_documents(
+                [texts[i] for i in missing]
+            )
+            new_vectors = {hashes[i]: vector for i, vector in zip(missing, embedded)}
+            cached.update(new_vectors)
+            if self.chunk_embedding_cache:
+                try:
+                    self.chunk_embedding_cache.put_many(new_vectors)
+                except Exception as e:
+                    logger.error("Failed to write the chunk embedding cache: %s", e)
+        return [cached[key] for key in hashes], len(missing)
 
-        Args:
-            fname (str): File name store in S3
-            test_delete (bool, optional): _description_. Defaults to False.
+    def _ensure_ingestion_indexes(self):
+        if not self.index_manager or self._ingestion_indexes_ensured:
+            return
+        try:
+            self.index_manager.ensure_ingestion_indexes()
+            self._ingestion_indexes_ensured = True
+        except Exception as e:
+            logger.error("Failed to ensure the ingestion indexes: %s", e)
 
-        Returns:
-            bool: Success or Failure of the process
+    def embed_chunks(
+        self, documents: list[Document], sources: Optional[List[str]] = None
+    ) -> EmbeddedChunks:
+        """Embeds the new or changed chunks of the sources, without writing them.
+
+        Every chunk gets a content hash id (stored as custom_id). Chunks whose id
+        is already stored are left out, only the others are embedded. `sources`
+        adds sources that may have no chunk left, so writing deletes their rows.
         """
+        # Creating the store ensures the tables and the collection exist
+        _ = self.vector_store
+        self._ensure_ingestion_indexes()
 
-        # Short vs Long chunk
+        chunks: Dict[str, Document] = {}
+        for doc in documents:
+            # Identical chunks of a source are stored once
+            chunks.setdefault(chunk_id(doc.page_content, doc.metadata), doc)
+        sources = sorted(
+            {doc.metadata["source"] for doc in documents} | set(sources or [])
+        )
 
-        document_unique_sources = list(
-            set([doc.metadata["source"] for doc in documents])
+        existing_ids = self.bulk_writer.get_existing_ids(sources)
+        new_chunks = {
+            key: doc for key, doc in chunks.items() if key not in existing_ids
+        }
+        texts = [doc.page_content for doc in new_chunks.values()]
+        vectors, embedded = self._embed(texts) if texts else ([], 0)
+        return EmbeddedChunks(
+            sources=sources,
+            chunk_ids=list(chunks),
+            ids=list(new_chunks),
+            texts=texts,
+            metadatas=[doc.metadata for doc in new_chunks.values()],
+            vectors=vectors,
+            embedded=embedded,
+            skipped={
+                key: doc for key, doc in chunks.items() if key not in new_chunks
+            },
         )
 
-        with self.cursor as cursor:
-            if self.is_existing_table(cursor):
-                self.delete_documents_with_sources(sources=document_unique_sources)
-                store = PGVector(
-                    collection_name=self.collection_name,
-                    connection_string=self.vector_db.get_connection_str(),
-                    embedding_function=self.embeddings,
+    def write_chunks(self, chunks: EmbeddedChunks) -> IngestionReport:
+        """Writes the embedded chunks and deletes the chunks the sources no longer
+        have, in a single transaction. Skipped chunks that another ingestion
+        deleted in the meantime are embedded and written too."""
+        while True:
+            try:
+                inserted, deleted, kept = self.bulk_writer.sync_sources(
+                    sources=chunks.sources,
+                    chunk_ids=chunks.chunk_ids,
+                    texts=chunks.texts,
+                    embeddings=chunks.vectors,
+                    metadatas=chunks.metadatas,
+                    ids=chunks.ids,
                 )
-                store.add_documents(documents)
-            else:
-                PGVector.from_documents(
-                    documents=documents,
-                    embedding=self.embeddings,
-                    collection_name=self.collection_name,
-                    connection_string=self.vector_db.get_connection_str(),
+                break
+            except SkippedChunksDeletedError as e:
+                logger.info("Embedding skipped chunks deleted meanwhile: %s", e)
+                documents = [chunks.skipped.pop(key) for key in e.chunk_ids]
+                vectors, embedded = self._embed(
+                    [doc.page_content for doc in documents]
                 )
+                chunks.ids.extend(e.chunk_ids)
+                chunks.texts.extend(doc.page_content for doc in documents)
+                chunks.metadatas.extend(doc.metadata for doc in documents)
+                chunks.vectors.extend(vectors)
+                chunks.embedded += embedded
+        report = IngestionReport(
+            skipped=kept,
+            inserted=inserted,
+            deleted=deleted,
+            embedded=chunks.embedded,
+        )
+        logger.info(
+            "Ingested %s sources into %s: %s",
+            len(chunks.sources),
+            self.collection_name,
+            report,
+        )
+        if not inserted and not deleted:
+            return report
+        self._notify_collection_changed(self.collection_name)
+
+        if self.index_manager and chunks.vectors:
+            try:
+                self.index_manager.ensure_index(dimension=len(chunks.vectors[0]))
+            except Exception as e:
+                # The chunks are written, queries fall back to exact search
+                logger.error("Failed to ensure the vector index: %s", e)
+        return report
+
+    def save_as_embedding(
+        self,
+        documents: list[Document],
+    ) -> IngestionReport:
+        """Puts the chunks of the given sources into the database, incrementally.
+
+        Only the new or changed chunks are embedded and written, the chunks the
+        sources no longer have are deleted and the others are left as they are.
+
+        Args:
+            documents (list[Document]): Every chunk of the sources being ingested.
+
+        Returns:
+            IngestionReport: The skipped, inserted, deleted and embedded counts.
+        """
+        if not documents:
+            return IngestionReport()
+        return self.write_chunks(self.embed_chunks(documents))
@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, DateTime, Double, Integer, Numeric, String
+from sqlalchemy import Boolean, DateTime, Double, Integer, Numeric, String, Text
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.ext.mutable import MutableDict
 from sqlalchemy.orm import DeclarativeBase, mapped_column
@@ -23,3 +23,20 @@ class RagScore(Base):
 
     def __repr__(self):
         return f"RagScore(score_id={self.score_id}, chain_info={self.chain_info}, total_duration={self.total_duration}, model_type={self.model_type}, faithfulness={self.faithfulness}, context_precision={self.context_precision}, qa_status={self.qa_status}, time_stamp={self.time_stamp}, correctness={self.correctness}, answer_relevancy={self.answer_relevancy})"
+
+
+class RagEvaluationJob(Base):
+    """Durable queue of RAG runs waiting for evaluation, used when the in-process
+    evaluation queue is full."""
+
+    __tablename__ = "rag_evaluation_job"
+    job_id = mapped_column(Integer, primary_key=True)
+    run_data = mapped_column(JSONB)
+    status = mapped_column(String(32), default="pending", index=True)
+    attempts = mapped_column(Integer, default=0)
+    last_error = mapped_column(Text, nullable=True)
+    created_at = mapped_column(DateTime)
+    updated_at = mapped_column(DateTime)
+
+    def __repr__(self):
+        return f"RagEvaluationJob(job_id={self.job_id}, status={self.status}, attempts={self.attempts}, created_at={self.created_at}, updated_at={self.updated_at})"
@@ -0,0 +1,269 @@
+import io
+import json
+import struct
+import uuid
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+import numpy as np
+from psycopg2.extensions import cursor as Cursor
+from rag_application_framework.db.psycopg_connection_factory import (
+    PsycopgConnectionFactory,
+)
+from rag_application_framework.logging.logging import Logging
+
+logger = Logging.get_logger(__name__)
+
+EMBEDDING_TABLE = "langchain_pg_embedding"
+COLLECTION_TABLE = "langchain_pg_collection"
+COPY_COLUMNS = (
+    "uuid",
+    "collection_id",
+    "embedding",
+    "document",
+    "cmetadata",
+    "custom_id",
+)
+
+_BINARY_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack("!ii", 0, 0)
+_BINARY_TRAILER = struct.pack("!h", -1)
+_BINARY_NULL = struct.pack("!i", -1)
+
+
+class SkippedChunksDeletedError(Exception):
+    """Chunks left out of a write as already stored were deleted in the meantime,
+    by another ingestion of the same sources. They must be written too."""
+
+    def __init__(self, chunk_ids: List[str]) -> None:
+        super().__init__(f"{len(chunk_ids)} skipped chunks are no longer stored")
+        self.chunk_ids = chunk_ids
+
+
+class _IteratorReader(io.RawIOBase):
+    """File like object over an iterator of bytes, so COPY reads the rows while
+    they are encoded instead of from one big buffer."""
+
+    def __init__(self, chunks: Iterator[bytes]) -> None:
+        self._chunks = chunks
+        self._buffer = b""
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, size: int = -1) -> bytes:
+        while size < 0 or len(self._buffer) < size:
+            try:
+                self._buffer += next(self._chunks)
+            except StopIteration:
+                break
+        if size < 0:
+            data, self._buffer = self._buffer, b""
+        else:
+            data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+
+def _binary_field(value: Optional[bytes]) -> bytes:
+    if value is None:
+        return _BINARY_NULL
+    return struct.pack("!i", len(value)) + value
+
+
+def _text_field(value: Optional[str]) -> str:
+    if value is None:
+        return "\\N"
+    return (
+        value.replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+class PgVectorBulkWriter:
+    """Writes chunks and their vectors into the langchain pgvector tables with COPY.
+
+    The chunks the given sources no longer have are deleted and the new rows are
+    streamed with `COPY ... FROM STDIN` in a single transaction, so readers never
+    see a half written source. The binary COPY format is used whenever the column types are
+    known, avoiding the text round trip of every vector component.
+    """
+
+    def __init__(
+        self,
+        connection_factory: PsycopgConnectionFactory,
+        collection_name: str,
+        binary: bool = True,
+    ) -> None:
+        self.connection_factory = connection_factory
+        self.collection_name = collection_name
+        self.binary = binary
+
+    def _get_collection_id(self, cursor: Cursor) -> uuid.UUID:
+        cursor.execute(
+            f"SELECT uuid FROM {COLLECTION_TABLE} WHERE name = %s",
+            (self.collection_name,),
+        )
+        row = cursor.fetchone()
+        if not row:
+            raise ValueError(f"Collection {self.collection_name} does not exist")
+        return uuid.UUID(str(row[0]))
+
+    @staticmethod
+    def _get_column_types(cursor: Cursor) -> Dict[str, str]:
+        cursor.execute(
+            """
+            SELECT column_name, udt_name FROM information_schema.columns
+            WHERE table_name = %s
+            """,
+            (EMBEDDING_TABLE,),
+        )
+        return {name: udt_name for name, udt_name in cursor.fetchall()}
+
+    def _copy_rows(
+        self,
+        cursor: Cursor,
+        collection_id: uuid.UUID,
+        column_types: Dict[str, str],
+        rows: Iterable,
+    ):
+        columns = ", ".join(COPY_COLUMNS)
+        if self.binary and column_types.get("cmetadata") in ("json", "jsonb"):
+            reader = _IteratorReader(
+                self._encode_binary(
+                    rows, collection_id, column_types["cmetadata"] == "jsonb"
+                )
+            )
+            cursor.copy_expert(
+                f"COPY {EMBEDDING_TABLE} ({columns}) FROM STDIN WITH (FORMAT binary)",
+                reader,
+            )
+        else:
+            reader = _IteratorReader(self._encode_text(rows, collection_id))
+            cursor.copy_expert(f"COPY {EMBEDDING_TABLE} ({columns}) FROM STDIN", reader)
+
+    def get_existing_ids(self, sources: List[str]) -> Set[str]:
+        """custom_ids of the chunks of the given sources in the collection.
+
+        Read without lock, so only a hint of the chunks that need no embedding:
+        sync_sources checks again that they are still stored.
+        """
+        with self.connection_factory.connection() as conn:
+            with conn.cursor() as cursor:
+                try:
+                    collection_id = self._get_collection_id(cursor)
+                except ValueError:
+                    return set()
+                cursor.execute(
+                    f"""
+                    SELECT custom_id FROM {EMBEDDING_TABLE}
+                    WHERE collection_id = %s AND cmetadata ->> 'source' = ANY(%s)
+                        AND custom_id IS NOT NULL
+                    """,
+                    (str(collection_id), sources),
+                )
+                return {row[0] for row in cursor.fetchall()}
+
+    def sync_sources(
+        self,
+        sources: List[str],
+        chunk_ids: List[str],
+        texts: List[str],
+        embeddings: List[List[float]],
+        metadatas: List[dict],
+        ids: List[str],
+    ) -> Tuple[int, int, int]:
+        """Makes the chunks of the sources in the collection match `chunk_ids`.
+
+        `chunk_ids` are the custom_ids of every chunk the sources have now, while
+        texts, embeddings, metadatas and ids are the chunks that may be missing.
+        Rows of the sources with another custom_id, or none, are deleted and the
+        missing rows are copied, in a single transaction. Returns the inserted, the
+        deleted and the kept row counts, rows of `chunk_ids` already stored being
+        kept.
+
+        Raises:
+            SkippedChunksDeletedError: When chunks of `chunk_ids` that are not
+                in `ids` are no longer stored. Nothing is written then.
+        """
+        with self.connection_factory.connection() as conn:
+            with conn.cursor() as cursor:
+                collection_id = self._get_collection_id(cursor)
+                column_types = self._get_column_types(cursor)
+                # Serializes concurrent ingestions into the collection
+                cursor.execute(
+                    "SELECT pg_advisory_xact_lock(hashtext(%s))", (str(collection_id),)
+                )
+                cursor.execute(
+                    f"""
+                    DELETE FROM {EMBEDDING_TABLE}
+                    WHERE collection_id = %s AND cmetadata ->> 'source' = ANY(%s)
+                        AND (custom_id IS NULL OR NOT custom_id = ANY(%s))
+                    """,
+                    (str(collection_id), sources, chunk_ids),
+                )
+                deleted = cursor.rowcount
+                # Read under the lock: another ingestion of the same sources may
+                # have written some of the new chunks, or deleted skipped ones
+                cursor.execute(
+                    f"""
+                    SELECT custom_id FROM {EMBEDDING_TABLE}
+                    WHERE collection_id = %s AND custom_id = ANY(%s)
+                    """,
+                    (str(collection_id), chunk_ids),
+                )
+                existing = {row[0] for row in cursor.fetchall()}
+                new_ids = set(ids)
+                deleted_skipped = [
+                    key
+                    for key in chunk_ids
+                    if key not in existing and key not in new_ids
+                ]
+                if deleted_skipped:
+                    raise SkippedChunksDeletedError(deleted_skipped)
+                rows = [
+                    row
+                    for row in zip(texts, embeddings, metadatas, ids)
+                    if row[3] not in existing
+                ]
+                if rows:
+                    self._copy_rows(cursor, collection_id, column_types, rows)
+            conn.commit()
+        return len(rows), deleted, len(existing)
+
+    @staticmethod
+    def _encode_binary(
+        rows: Iterable, collection_id: uuid.UUID, jsonb: bool
+    ) -> Iterator[bytes]:
+        yield _BINARY_HEADER
+        field_count = struct.pack("!h", len(COPY_COLUMNS))
+        for text, embedding, metadata, custom_id in rows:
+            vector = np.asarray(embedding, dtype=">f4")
+            metadata_json = json.dumps(metadata).encode("utf-8")
+            yield b"".join(
+                [
+                    field_count,
+                    _binary_field(uuid.uuid4().bytes),
+                    _binary_field(collection_id.bytes),
+                    # pgvector's binary format: dimensions, unused, float4 values
+                    _binary_field(struct.pack("!hh", len(vector), 0) + vector.tobytes()),
+                    _binary_field(text.replace("\x00", "").encode("utf-8")),
+                    _binary_field((b"\x01" if jsonb else b"") + metadata_json),
+                    _binary_field(custom_id.encode("utf-8") if custom_id else None),
+                ]
+            )
+        yield _BINARY_TRAILER
+
+    @staticmethod
+    def _encode_text(rows: Iterable, collection_id: uuid.UUID) -> Iterator[bytes]:
+        for text, embedding, metadata, custom_id in rows:
+            fields = [
+                str(uuid.uuid4()),
+                str(collection_id),
+                "[" + ",".join(str(float(value)) for value in embedding) + "]",
+                text.replace("\x00", ""),
+                json.dumps(metadata),
+                custom_id,
+            ]
+            yield ("\t".join(_text_field(field) for field in fields) + "\n").encode(
+                "utf-8"
+            )
@@ -1,19 +1,45 @@
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
 import psycopg2
 from langchain_community.vectorstores.pgvector import PGVector
 from psycopg2.extensions import connection
+from rag_application_framework.db.async_connection_pool import AsyncPgConnectionPool
+from rag_application_framework.db.psycopg_connection_pool import (
+    PsycopgConnectionPool,
+)
 
 
 class PsycopgConnectionFactory:
     """Uploads the unstructured pdf data into vectordb"""
 
     def __init__(
-        self, host: str, port: int, database_name: str, username: str, password: str
+        self,
+        host: str,
+        port: int,
+        database_name: str,
+        username: str,
+        password: str,
+        pool_min_size: int = 1,
+        pool_max_size: int = 10,
+        pool_max_lifetime: float = 1800.0,
+        pool_borrow_timeout: float = 30.0,
+        session_options: Optional[str] = None,
     ):
         self.host = host
         self.port = port
         self.database_name = database_name
         self.username = username
         self.password = password
+        self.pool_min_size = pool_min_size
+        self.pool_max_size = pool_max_size
+        self.pool_max_lifetime = pool_max_lifetime
+        self.pool_borrow_timeout = pool_borrow_timeout
+        self.session_options = session_options
+        self._pool: Optional[PsycopgConnectionPool] = None
+        self._async_pool: Optional[AsyncPgConnectionPool] = None
+        self._pool_lock = threading.Lock()
 
     def get_connection_str(self) -> str:
         """Generates the Connection String required to connect to the Database
@@ -32,6 +58,12 @@ class PsycopgConnectionFactory:
         )
         return CONNECTION_STRING
 
+    def get_engine_args(self) -> Dict[str, Any]:
+        """SQLAlchemy engine arguments applying the session options of the factory."""
+        if not self.session_options:
+            return {}
+        return {"connect_args": {"options": self.session_options}}
+
     def make_connection(self) -> connection:
         conn = psycopg2.connect(
             host=self.host,
@@ -39,5 +71,65 @@ class PsycopgConnectionFactory:
             dbname=self.database_name,
             user=self.username,
             password=self.password,
+            options=self.session_options,
         )
         return conn
+
+    @property
+    def pool(self) -> PsycopgConnectionPool:
+        """The connection pool of this factory, created on first use."""
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = PsycopgConnectionPool(
+                        connect=self.make_connection,
+                        min_size=self.pool_min_size,
+                        max_size=self.pool_max_size,
+                        max_lifetime=self.pool_max_lifetime,
+                        borrow_timeout=self.pool_borrow_timeout,
+                    )
+        return self._pool
+
+    @property
+    def async_pool(self) -> AsyncPgConnectionPool:
+        """The asyncpg pool of this factory for coroutines, created on first use."""
+        if self._async_pool is None:
+            with self._pool_lock:
+                if self._async_pool is None:
+                    self._async_pool = AsyncPgConnectionPool(
+                        host=self.host,
+                        port=self.port,
+                        database_name=self.database_name,
+                        username=self.username,
+                        password=self.password,
+                        min_size=self.pool_min_size,
+                        max_size=self.pool_max_size,
+                        session_options=self.session_options,
+                    )
+        return self._async_pool
+
+    @contextmanager
+    def connection(self) -> Iterator[connection]:
+        """Borrows a pooled connection for the duration of the with block.
+
+        Uncommitted work is rolled back when the connection is given back, and the
+        connection is discarded if it was lost while the block was running.
+        """
+        conn = self.pool.borrow()
+        discard = False
+        try:
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            discard = True
+            raise
+        finally:
+            self.pool.give_back(conn, discard=discard)
+
+    def close(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.close()
+                self._pool = None
+            if self._async_pool is not None:
+                self._async_pool.terminate()
+                self._async_pool = None
@@ -0,0 +1,167 @@
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, Optional
+
+from psycopg2.extensions import TRANSACTION_STATUS_UNKNOWN, connection
+from rag_application_framework.logging.logging import Logging
+
+logger = Logging.get_logger(__name__)
+
+
+class PoolTimeoutError(Exception):
+    pass
+
+
+class PsycopgConnectionPool:
+    """Bounded, thread safe pool of psycopg2 connections.
+
+    Connections are borrowed with `borrow` and handed back with `give_back`. At most
+    `max_size` connections are open at any time, borrowers wait up to
+    `borrow_timeout` seconds for one to become free, and connections older than
+    `max_lifetime` seconds are closed and replaced when they are returned.
+    """
+
+    def __init__(
+        self,
+        connect: Callable[[], connection],
+        min_size: int = 1,
+        max_size: int = 10,
+        max_lifetime: float = 1800.0,
+        borrow_timeout: float = 30.0,
+    ):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError(
+                f"Invalid pool size: min_size={min_size}, max_size={max_size}"
+            )
+        self._connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_lifetime = max_lifetime
+        self.borrow_timeout = borrow_timeout
+
+        self._idle: Deque[connection] = deque()
+        self._created_at: Dict[int, float] = {}
+        self._size = 0
+        self._closed = False
+        self._condition = threading.Condition()
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def _open_connection(self) -> connection:
+        conn = self._connect()
+        self._created_at[id(conn)] = time.monotonic()
+        return conn
+
+    def _discard(self, conn: connection):
+        self._created_at.pop(id(conn), None)
+        try:
+            if not conn.closed:
+                conn.close()
+        except Exception as e:
+            logger.warning("Error closing pooled connection: %s", e)
+
+    def _is_expired(self, conn: connection) -> bool:
+        created_at = self._created_at.get(id(conn), 0.0)
+        return time.monotonic() - created_at > self.max_lifetime
+
+    def _fill_to_min_size(self):
+        # Slots are reserved under the lock and connected outside of it, like in
+        # borrow, so a slow database does not block the other borrowers
+        with self._condition:
+            missing = self.min_size - self._size
+            if missing <= 0:
+                return
+            self._size += missing
+
+        opened = 0
+        try:
+            for _ in range(missing):
+                conn = self._open_connection()
+                with self._condition:
+                    opened += 1
+                    if self._closed:
+                        self._discard(conn)
+                        self._size -= 1
+                    else:
+                        self._idle.append(conn)
+                    self._condition.notify()
+        finally:
+            if opened < missing:
+                with self._condition:
+                    self._size -= missing - opened
+                    self._condition.notify_all()
+
+    def borrow(self, timeout: Optional[float] = None) -> connection:
+        """Takes a connection out of the pool, opening one if the pool is below
+        max_size, otherwise waiting until another borrower gives one back."""
+        timeout = self.borrow_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+
+        if self._closed:
+            raise PoolTimeoutError("Connection pool is closed")
+        self._fill_to_min_size()
+
+        with self._condition:
+            if self._closed:
+                raise PoolTimeoutError("Connection pool is closed")
+
+            while True:
+                while self._idle:
+                    conn = self._idle.popleft()
+                    if conn.closed or self._is_expired(conn):
+                        self._discard(conn)
+                        self._size -= 1
+                        continue
+                    return conn
+
+                if self._size < self.max_size:
+                    # Reserve the slot before connecting outside of the lock
+                    self._size += 1
+                    break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._condition.wait(remaining):
+                    raise PoolTimeoutError(
+                        f"No database connection available after {timeout}s "
+                        f"(max_size={self.max_size})"
+                    )
+
+        try:
+            return self._open_connection()
+        except Exception:
+            with self._condition:
+                self._size -= 1
+                self._condition.notify()
+            raise
+
+    def give_back(self, conn: connection, discard: bool = False):
+        """Returns a borrowed connection. Open transactions are rolled back, and
+        broken or expired connections are closed instead of being reused."""
+        if not discard and not conn.closed:
+            try:
+                if conn.get_transaction_status() == TRANSACTION_STATUS_UNKNOWN:
+                    discard = True
+                else:
+                    conn.rollback()
+            except Exception as e:
+                logger.warning("Discarding pooled connection after error: %s", e)
+                discard = True
+
+        with self._condition:
+            if discard or conn.closed or self._closed or self._is_expired(conn):
+                self._discard(conn)
+                self._size -= 1
+            else:
+                self._idle.append(conn)
+            self._condition.notify()
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            while self._idle:
+                self._discard(self._idle.popleft())
+                self._size -= 1
+            self._condition.notify_all()
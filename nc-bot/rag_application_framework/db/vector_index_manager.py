@@ -0,0 +1,225 @@
+import uuid
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from psycopg2.extensions import cursor as Cursor
+from rag_application_framework.config.app_config import VectorIndexConfig
+from rag_application_framework.db.pgvector_bulk_writer import (
+    COLLECTION_TABLE,
+    EMBEDDING_TABLE,
+)
+from rag_application_framework.db.psycopg_connection_factory import (
+    PsycopgConnectionFactory,
+)
+from rag_application_framework.logging.logging import Logging
+
+logger = Logging.get_logger(__name__)
+
+
+def embedding_expression(dimension: int) -> str:
+    """SQL expression of the embedding column at a fixed dimension.
+
+    The embedding column is shared by every collection, whatever the dimension of
+    its model, so it is never typed. Vector indexes are built on this expression
+    instead, and queries must order by the same expression to use them.
+    """
+    return f"embedding::vector({int(dimension)})"
+
+
+def collection_predicate(collection_id: uuid.UUID) -> str:
+    """Filter on a collection, written as the predicate of its partial indexes.
+
+    The planner only uses a partial index when the query predicate implies the
+    index predicate, which it cannot prove for a subquery or a parameter, so the
+    id is written into the statement as a literal.
+    """
+    return f"collection_id = '{uuid.UUID(str(collection_id))}'"
+
+
+class VectorIndexManager:
+    """Creates and maintains an approximate nearest neighbour index per collection.
+
+    pgvector can only index vectors of a fixed dimension, while the embeddings
+    table is shared by collections of models with different dimensions. Each
+    collection therefore gets an index on the expression
+    `embedding::vector(dimension)`, partial on the collection, which the SQL
+    retrievers query. Indexes are created and rebuilt CONCURRENTLY so queries are
+    never blocked, and indexes left invalid by a failed build are rebuilt.
+    """
+
+    def __init__(
+        self,
+        connection_factory: PsycopgConnectionFactory,
+        collection_name: str,
+        index_config: VectorIndexConfig,
+    ) -> None:
+        self.connection_factory = connection_factory
+        self.collection_name = collection_name
+        self.index_config = index_config
+        self._ensured_dimension: Optional[int] = None
+        self._rows_at_build: Optional[int] = None
+
+    @staticmethod
+    def session_options(index_config: VectorIndexConfig) -> str:
+        """libpq options setting the query time search parameters of the indexes."""
+        return (
+            f"-c hnsw.ef_search={int(index_config.hnsw_ef_search)} "
+            f"-c ivfflat.probes={int(index_config.ivfflat_probes)}"
+        )
+
+    @contextmanager
+    def _autocommit_cursor(self) -> Iterator[Cursor]:
+        # CREATE/REINDEX ... CONCURRENTLY cannot run inside a transaction
+        with self.connection_factory.connection() as conn:
+            conn.autocommit = True
+            try:
+                with conn.cursor() as cursor:
+                    yield cursor
+            finally:
+                conn.autocommit = False
+
+    def _get_collection_id(self, cursor: Cursor) -> Optional[uuid.UUID]:
+        cursor.execute(
+            f"SELECT uuid FROM {COLLECTION_TABLE} WHERE name = %s",
+            (self.collection_name,),
+        )
+        row = cursor.fetchone()
+        return uuid.UUID(str(row[0])) if row else None
+
+    def _index_name(self, collection_id: uuid.UUID) -> str:
+        return f"ix_{EMBEDDING_TABLE}_{self.index_config.index_type}_{collection_id.hex[:12]}"
+
+    @staticmethod
+    def _drop_invalid_indexes(cursor: Cursor, index_name: str) -> bool:
+        """Drops the index, and the leftovers of a failed REINDEX CONCURRENTLY, if a
+        failed or cancelled concurrent build left them invalid. IF NOT EXISTS
+        would otherwise take an invalid index as done, and queries would never
+        use it. Returns False while another session is still building it."""
+        cursor.execute(
+            """
+            SELECT c.relname,
+                   EXISTS (
+                       SELECT 1 FROM pg_stat_progress_create_index p
+                       WHERE p.index_relid = i.indexrelid
+                   )
+            FROM pg_index i
+            JOIN pg_class c ON c.oid = i.indexrelid
+            WHERE NOT i.indisvalid
+              AND (c.relname = %s OR c.relname LIKE %s)
+            """,
+            (index_name, index_name + "\\_ccnew%"),
+        )
+        for name, building in cursor.fetchall():
+            if building:
+                logger.info("Index %s is being built by another session", name)
+                return False
+            logger.warning("Dropping invalid index %s", name)
+            cursor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+        return True
+
+    def _create_index(self, cursor: Cursor, index_name: str, definition: str) -> bool:
+        """Creates the index if it does not exist or is invalid. Returns False when
+        it is left to the session already building it."""
+        if not self._drop_invalid_indexes(cursor, index_name):
+            return False
+        logger.info("Ensuring index %s", index_name)
+        cursor.execute(
+            f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {index_name} {definition}"
+        )
+        return True
+
+    def _count_rows(self, cursor: Cursor, collection_id: uuid.UUID) -> int:
+        cursor.execute(
+            f"SELECT count(*) FROM {EMBEDDING_TABLE} WHERE collection_id = %s",
+            (str(collection_id),),
+        )
+        return cursor.fetchone()[0]
+
+    def ensure_index(self, dimension: int):
+        """Creates the index of the collection if it does not exist yet. IVFFlat
+        indexes are rebuilt once the collection has doubled since they were built,
+        since their clusters are computed from the rows present at build time."""
+        index_type = self.index_config.index_type
+        if index_type == "none":
+            return
+
+        with self._autocommit_cursor() as cursor:
+            collection_id = self._get_collection_id(cursor)
+            if collection_id is None:
+                return
+            index_name = self._index_name(collection_id)
+
+            if self._ensured_dimension != dimension:
+                if index_type == "hnsw":
+                    method = "hnsw"
+                    parameters = (
+                        f"m = {int(self.index_config.hnsw_m)}, "
+                        f"ef_construction = {int(self.index_config.hnsw_ef_construction)}"
+                    )
+                elif index_type == "ivfflat":
+                    method = "ivfflat"
+                    parameters = f"lists = {int(self.index_config.ivfflat_lists)}"
+                else:
+                    raise ValueError(f"Invalid vector index type: {index_type}")
+
+                column = f"({embedding_expression(dimension)})"
+                created = self._create_index(
+                    cursor,
+                    index_name,
+                    f"""
+                    ON {EMBEDDING_TABLE}
+                    USING {method} ({column} vector_cosine_ops)
+                    WITH ({parameters})
+                    WHERE {collection_predicate(collection_id)}
+                    """,
+                )
+                if created:
+                    self._ensured_dimension = dimension
+                    self._rows_at_build = self._count_rows(cursor, collection_id)
+                return
+
+            if index_type == "ivfflat" and self._rows_at_build is not None:
+                rows = self._count_rows(cursor, collection_id)
+                if rows > 2 * max(self._rows_at_build, 1):
+                    self._reindex(cursor, index_name)
+                    self._rows_at_build = rows
+
+    def ensure_text_search_index(self, text_search_config: str = "english"):
+        """Creates the GIN index used by the full text search of hybrid retrieval."""
+        config = "".join(c for c in text_search_config if c.isalnum() or c == "_")
+        index_name = f"ix_{EMBEDDING_TABLE}_fts_{config}"
+        with self._autocommit_cursor() as cursor:
+            self._create_index(
+                cursor,
+                index_name,
+                f"""
+                ON {EMBEDDING_TABLE}
+                USING gin (to_tsvector('{config}'::regconfig, document))
+                """,
+            )
+
+    def ensure_ingestion_indexes(self):
+        """Creates the indexes on the chunk ids and on the sources of the chunks,
+        used by incremental ingestion."""
+        with self._autocommit_cursor() as cursor:
+            self._create_index(
+                cursor,
+                f"ix_{EMBEDDING_TABLE}_custom_id",
+                f"ON {EMBEDDING_TABLE} (collection_id, custom_id)",
+            )
+            self._create_index(
+                cursor,
+                f"ix_{EMBEDDING_TABLE}_source",
+                f"ON {EMBEDDING_TABLE} (collection_id, (cmetadata ->> 'source'))",
+            )
+
+    def _reindex(self, cursor: Cursor, index_name: str):
+        if not self._drop_invalid_indexes(cursor, index_name):
+            return
+        cursor.execute("SELECT to_regclass(%s)", (index_name,))
+        if cursor.fetchone()[0] is None:
+            # Dropped as invalid, the next ensure_index builds it again
+            self._ensured_dimension = None
+            return
+        logger.info("Rebuilding vector index %s", index_name)
+        cursor.execute(f"REINDEX INDEX CONCURRENTLY {index_name}")
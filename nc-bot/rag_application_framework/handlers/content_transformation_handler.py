@@ -1,4 +1,4 @@
-from typing import Dict
+from typing import Any, Dict, Iterable, Iterator
 import json
 from langchain_community.llms.sagemaker_endpoint import LLMContentHandler
 
@@ -15,3 +15,45 @@ class ContentTransformationHandler(LLMContentHandler):
         response_json = json.loads(output.read().decode("utf-8"))
         print("output: ", response_json[0])
         return response_json[0]["generated_text"]
+
+    def transform_stream_input(self, prompt: str, model_kwargs: Dict) -> bytes:
+        """Request body for TGI's server sent events mode used by
+        invoke_endpoint_with_response_stream."""
+        input_dict = {"inputs": prompt, "parameters": model_kwargs, "stream": True}
+        return json.dumps(input_dict).encode("utf-8")
+
+    def transform_stream_output(
+        self, event_stream: Iterable[Dict[str, Any]]
+    ) -> Iterator[str]:
+        """Yields the generated tokens from a TGI response stream.
+
+        TGI sends `data:{...}` lines, and SageMaker may split a line over several
+        PayloadPart events, so bytes are buffered until a full line is available.
+        Special tokens such as `</s>` are skipped.
+        """
+        buffer = b""
+        for event in event_stream:
+            payload_part = event.get("PayloadPart")
+            if not payload_part:
+                continue
+            buffer += payload_part["Bytes"]
+            while b"\n" in buffer:
+                line, buffer = buffer.split(b"\n", 1)
+                token = self._parse_stream_line(line)
+                if token:
+                    yield token
+
+        token = self._parse_stream_line(buffer)
+        if token:
+            yield token
+
+    @staticmethod
+    def _parse_stream_line(line: bytes) -> str:
+        line = line.strip()
+        if not line.startswith(b"data:"):
+            return ""
+        response_json = json.loads(line[len(b"data:"):].decode("utf-8"))
+        token = response_json.get("token") or {}
+        if token.get("special"):
+            return ""
+        return token.get("text", "")
@@ -1,15 +1,18 @@
 from collections import defaultdict
-from datetime import datetime
 from time import time
-from typing import Any, DefaultDict, Dict, List
-import numpy as np
+from typing import Any, DefaultDict, Dict, List, Optional
 import sqlalchemy
 from langchain.callbacks.base import BaseCallbackHandler
 from rag_application_framework.config.app_config import EmbeddingConfig, OpenAIConfig, EvaluationConfig
-from rag_application_framework.db.models.models import RagScore
 from rag_application_framework.logging.logging import Logging
-from rag_application_framework.rag_evaluation.ragas_evaluator import RagasEvaluator
-from sqlalchemy.orm import Session
+from rag_application_framework.modules.retrieval.scored_mmr_retriever import (
+    SIMILARITY_SCORE_KEY,
+)
+from rag_application_framework.rag_evaluation.evaluation_sampling_policy import (
+    EvaluationSamplingPolicy,
+)
+from rag_application_framework.rag_evaluation.evaluation_worker import EvaluationWorker
+from rag_application_framework.rag_evaluation.rag_score_writer import RagScoreWriter
 from langchain.schema import LLMResult
 
 logger = Logging.get_logger(__name__)
@@ -24,6 +27,10 @@ class RagasEvaluationAndDbLoggingCallbackHandler(BaseCallbackHandler):
         embeddings_config: EmbeddingConfig,
         evaluation_config: EvaluationConfig,
         engine: sqlalchemy.engine.Engine,
+        evaluation_worker: Optional[EvaluationWorker] = None,
+        sampling_policy: Optional[EvaluationSamplingPolicy] = None,
+        model_id: Optional[str] = None,
+        prompt_tokens: Optional[int] = None,
     ) -> None:
         self.run_data_llm: DefaultDict[str, Any] = defaultdict(dict)
         self.run_data_chain: DefaultDict[str, Any] = defaultdict(dict)
@@ -32,42 +39,35 @@ class RagasEvaluationAndDbLoggingCallbackHandler(BaseCallbackHandler):
         self.embeddings_config = embeddings_config
         self.evaluation_config = evaluation_config
         self.engine = engine
+        self.evaluation_worker = evaluation_worker
+        self.sampling_policy = sampling_policy
+        self.model_id = model_id
+        # Counted by the pipeline from the prompt it sends to the model
+        self.prompt_tokens = prompt_tokens
+        self.score_writer = RagScoreWriter(
+            evaluation_config=evaluation_config,
+            embeddings=embeddings_config.embeddings,
+            engine=engine,
+        )
 
     def evaluate(self, response_data: dict) -> dict:
-        evaluation_helper = RagasEvaluator(
-            #openai_config=self.openai_config,″
-            evaluation_config=self.evaluation_config,
-            embeddings=self.embeddings_config.embeddings,
-        )
-        logger.info("Evaluation Started.")
-        result = evaluation_helper.evaluate(run_data=response_data)
-        logger.info("Evaluation Complete. Result of the evaluation: \n %s", result)
-        return result
+        return self.score_writer.evaluate(response_data)
 
     def write_score(self, response_data: dict):
-        result = self.evaluate(response_data)
-        if len(result) == 0:
-            logger.error("The evaluation of the result was not successful")
-        with Session(self.engine) as session:
-            rag_score = RagScore(
-                chain_info={
-                    "question": response_data["question"],
-                    "contexts": response_data["contexts"],
-                    "answer": response_data["output_text"],
-                },
-                model_type=response_data["model_type"],
-                qa_status=response_data["qa_status"],
-                total_duration=response_data["total_duration"],
-                faithfulness=result["faithfulness"] if not np.isnan(result["faithfulness"]) else 0,
-                context_precision=result["context_utilization"] if not np.isnan(result["context_utilization"]) else 0,
-                answer_relevancy=result["answer_relevancy"] if not np.isnan(result["answer_relevancy"]) else 0,
-                correctness=result["correctness"] if not np.isnan(result["correctness"]) else 0,
-                time_stamp=datetime.utcnow(),
-            )
-            session.add(rag_score)
-            session.commit()
-            logger.info("Score written to the database: %s", rag_score)
-            session.close()
+        """Hands the run to the background evaluation worker when there is one,
+        otherwise evaluates it and writes the score before returning. Runs the
+        sampling policy rejects are not evaluated."""
+        if self.model_id:
+            response_data["model_id"] = self.model_id
+        if self.sampling_policy and not self.sampling_policy.should_evaluate(
+            response_data
+        ):
+            logger.info("Evaluation of the run skipped by the sampling policy.")
+            return
+        if self.evaluation_worker:
+            self.evaluation_worker.submit(response_data)
+        else:
+            self.score_writer.write_score(response_data)
 
     def on_llm_start(
         self, serialized: Dict[str, Any], prompts: List[str], **kwargs: Any
@@ -79,6 +79,8 @@ class RagasEvaluationAndDbLoggingCallbackHandler(BaseCallbackHandler):
         self.run_data_llm[run_id]["prompts"] = prompts
         self.run_data_llm[run_id]["start_time"] = time()
         self.run_data_llm[run_id]["name"] = serialized["name"]
+        if self.prompt_tokens is not None:
+            self.run_data_llm[run_id]["prompt_tokens"] = self.prompt_tokens
         logger.info("on_llm_start Prompt -- %s", str(prompts))
         logger.info("on_llm_start Seralized -- %s", str(serialized))
 
@@ -120,12 +122,19 @@ class RagasEvaluationAndDbLoggingCallbackHandler(BaseCallbackHandler):
         logger.info("Chain Started: %s", run_id)
         if isinstance(inputs, dict) and "input_documents" in inputs:
             contexts = []
+            similarities = []
             for document in inputs["input_documents"]:
                 if isinstance(document, dict):
                     contexts.append(document["page_content"])
+                    metadata = document.get("metadata", {})
                 else:
                     contexts.append(document.page_content)
+                    metadata = document.metadata
+                if metadata.get(SIMILARITY_SCORE_KEY) is not None:
+                    similarities.append(metadata[SIMILARITY_SCORE_KEY])
             self.run_data_chain[run_id]["contexts"] = contexts
+            if similarities:
+                self.run_data_chain[run_id]["retrieval_similarity"] = max(similarities)
             self.run_data_chain[run_id]["question"] = inputs["question"]
 
     def on_chain_end(self, outputs: Dict[str, Any], **kwargs: Any) -> None:
@@ -0,0 +1,121 @@
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain.schema.embeddings import Embeddings
+from rag_application_framework.logging.logging import Logging
+
+logger = Logging.get_logger(__name__)
+
+
+class CachingEmbeddings(Embeddings):
+    """Embeddings wrapper that memoises vectors by a hash of the normalized text.
+
+    Retrieval, the semantic answer cache and the ragas evaluation all embed the same
+    question, so only the first of them calls the embedding model. At most
+    `max_entries` vectors are kept in memory (least recently used are evicted).
+    With `persist_path` the vectors are also written to a sqlite file and survive
+    restarts of the process.
+    """
+
+    def __init__(
+        self,
+        underlying_embeddings: Embeddings,
+        namespace: str = "",
+        max_entries: int = 10000,
+        persist_path: Optional[str] = None,
+    ) -> None:
+        self.underlying_embeddings = underlying_embeddings
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.persist_path = persist_path
+        self.hits = 0
+        self.misses = 0
+
+        self._memory: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        if persist_path:
+            self._db = sqlite3.connect(persist_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB)"
+            )
+            self._db.commit()
+
+    @property
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "size": len(self._memory),
+        }
+
+    def _key(self, text: str) -> str:
+        normalized = " ".join(text.split())
+        return hashlib.sha256(
+            f"{self.namespace}\x00{normalized}".encode("utf-8")
+        ).hexdigest()
+
+    def _get(self, key: str) -> Optional[List[float]]:
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                return vector
+            if self._db is None:
+                return None
+            row = self._db.execute(
+                "SELECT vector FROM embeddings WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        vector = np.frombuffer(row[0], dtype=np.float32).tolist()
+        self._put(key, vector, persist=False)
+        return vector
+
+    def _put(self, key: str, vector: List[float], persist: bool = True):
+        with self._lock:
+            self._memory[key] = vector
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+            if persist and self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                    (key, np.asarray(vector, dtype=np.float32).tobytes()),
+                )
+                self._db.commit()
+
+    def embed_query(self, text: str) -> List[float]:
+        key = self._key(text)
+        vector = self._get(key)
+        if vector is not None:
+            self.hits += 1
+            return vector
+
+        self.misses += 1
+        vector = self.underlying_embeddings.embed_query(text)
+        self._put(key, vector)
+        return vector
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self._key(text) for text in texts]
+        vectors: List[Optional[List[float]]] = [self._get(key) for key in keys]
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+
+        if missing:
+            embedded = self.underlying_embeddings.embed_documents(
+                [texts[i] for i in missing]
+            )
+            for i, vector in zip(missing, embedded):
+                vectors[i] = vector
+                self._put(keys[i], vector)
+
+        return vectors  # type: ignore[return-value]
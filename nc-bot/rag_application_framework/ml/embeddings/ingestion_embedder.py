@@ -0,0 +1,171 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from botocore.exceptions import ClientError
+from langchain.schema.embeddings import Embeddings
+from langchain_community.embeddings.bedrock import BedrockEmbeddings
+from langchain_community.embeddings.huggingface import HuggingFaceEmbeddings
+from rag_application_framework.logging.logging import Logging
+
+logger = Logging.get_logger(__name__)
+
+
+def _is_throttling_error(error: Exception) -> bool:
+    if isinstance(error, ClientError):
+        return error.response.get("Error", {}).get("Code") in (
+            "ThrottlingException",
+            "TooManyRequestsException",
+            "ServiceQuotaExceededException",
+        )
+    # BedrockEmbeddings re-raises client errors as ValueError with the message only
+    return "ThrottlingException" in str(error) or "Too many requests" in str(error)
+
+
+class AdaptiveConcurrencyLimiter:
+    """Limits the calls in flight, halving the limit whenever the service throttles
+    and raising it by one after `increase_after` successful calls in a row."""
+
+    def __init__(self, max_limit: int, increase_after: int = 20) -> None:
+        self.max_limit = max_limit
+        self.limit = max_limit
+        self.increase_after = increase_after
+        self._in_flight = 0
+        self._successes = 0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        with self._condition:
+            while self._in_flight >= self.limit:
+                self._condition.wait()
+            self._in_flight += 1
+
+    def release(self, throttled: bool):
+        with self._condition:
+            self._in_flight -= 1
+            if throttled:
+                self.limit = max(1, self.limit // 2)
+                self._successes = 0
+            else:
+                self._successes += 1
+                if self._successes >= self.increase_after and self.limit < self.max_limit:
+                    self.limit += 1
+                    self._successes = 0
+            self._condition.notify_all()
+
+
+@dataclass
+class EmbeddingRunStats:
+    chunks: int
+    seconds: float
+    throttled: int = 0
+
+    @property
+    def chunks_per_second(self) -> float:
+        return self.chunks / self.seconds if self.seconds else float(self.chunks)
+
+
+class IngestionEmbedder:
+    """Embeds the chunks of an ingestion run as fast as the embedding model allows.
+
+    Bedrock Titan embeds a single text per request, so texts are sent concurrently
+    from a bounded thread pool whose concurrency adapts to throttling. HuggingFace
+    sentence transformers encode whole batches in one forward pass. Vectors are
+    returned in the order of the texts.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        max_workers: int = 8,
+        batch_size: int = 64,
+        max_retries: int = 8,
+    ) -> None:
+        # Ingestion bypasses the query cache, chunks would only evict questions
+        self.embeddings = getattr(embeddings, "underlying_embeddings", embeddings)
+        self.max_workers = max_workers
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.last_run_stats: Optional[EmbeddingRunStats] = None
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        start_time = time.monotonic()
+        throttled = 0
+        if isinstance(self.embeddings, BedrockEmbeddings):
+            vectors, throttled = self._embed_concurrently(texts)
+        elif isinstance(self.embeddings, HuggingFaceEmbeddings):
+            vectors = self._embed_huggingface_batches(texts)
+        else:
+            vectors = self._embed_batches(texts)
+
+        self.last_run_stats = EmbeddingRunStats(
+            chunks=len(texts),
+            seconds=time.monotonic() - start_time,
+            throttled=throttled,
+        )
+        logger.info(
+            "Embedded %s chunks in %.1fs (%.1f chunks/sec, %s throttled calls)",
+            self.last_run_stats.chunks,
+            self.last_run_stats.seconds,
+            self.last_run_stats.chunks_per_second,
+            self.last_run_stats.throttled,
+        )
+        return vectors
+
+    def _embed_batches(self, texts: List[str]) -> List[List[float]]:
+        vectors: List[List[float]] = []
+        for i in range(0, len(texts), self.batch_size):
+            vectors.extend(
+                self.embeddings.embed_documents(texts[i : i + self.batch_size])
+            )
+        return vectors
+
+    def _embed_huggingface_batches(self, texts: List[str]) -> List[List[float]]:
+        embeddings: HuggingFaceEmbeddings = self.embeddings  # type: ignore[assignment]
+        texts = [text.replace("\n", " ") for text in texts]
+        encoded = embeddings.client.encode(
+            texts,
+            **{
+                **embeddings.encode_kwargs,
+                "batch_size": self.batch_size,
+                "show_progress_bar": False,
+            },
+        )
+        return encoded.tolist()
+
+    def _embed_concurrently(self, texts: List[str]) -> Tuple[List[List[float]], int]:
+        limiter = AdaptiveConcurrencyLimiter(self.max_workers)
+        throttled_lock = threading.Lock()
+        throttled_calls = [0]
+
+        def embed(text: str) -> List[float]:
+            last_error: Optional[Exception] = None
+            for attempt in range(self.max_retries + 1):
+                if attempt:
+                    # Backs off before retrying a throttled call
+                    time.sleep(
+                        min(20.0, 0.5 * 2 ** (attempt - 1)) * random.uniform(0.5, 1.0)
+                    )
+                limiter.acquire()
+                try:
+                    vector = self.embeddings.embed_documents([text])[0]
+                except Exception as e:
+                    throttled = _is_throttling_error(e)
+                    limiter.release(throttled=throttled)
+                    if not throttled:
+                        raise
+                    with throttled_lock:
+                        throttled_calls[0] += 1
+                    last_error = e
+                    continue
+                limiter.release(throttled=False)
+                return vector
+            else:
+                raise last_error
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            vectors = list(executor.map(embed, texts))
+        return vectors, throttled_calls[0]
@@ -1,10 +1,14 @@
 import re
 import boto3
-from typing import Union
+from typing import Optional, Union
 from botocore.client import BaseClient
+from langchain.schema.embeddings import Embeddings
 from langchain_community.embeddings.bedrock import BedrockEmbeddings
 from langchain_community.embeddings.huggingface import HuggingFaceEmbeddings
 from rag_application_framework.aws.bedrock_api import BedrockApi
+from rag_application_framework.ml.embeddings.caching_embeddings import (
+    CachingEmbeddings,
+)
 
 
 class LangchainEmbeddingsFactory:
@@ -21,6 +25,28 @@ class LangchainEmbeddingsFactory:
     def get_huggingface_embeddings() -> HuggingFaceEmbeddings:
         return HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
 
+    @staticmethod
+    def get_namespace(embeddings: Embeddings) -> str:
+        """Name of the embedding model, so vectors of different models are never
+        mixed up in the caches."""
+        embeddings = getattr(embeddings, "underlying_embeddings", embeddings)
+        return getattr(embeddings, "model_id", None) or getattr(
+            embeddings, "model_name", ""
+        )
+
+    @staticmethod
+    def get_cached_embeddings(
+        embeddings: Union[BedrockEmbeddings, HuggingFaceEmbeddings],
+        max_entries: int = 10000,
+        persist_path: Optional[str] = None,
+    ) -> CachingEmbeddings:
+        return CachingEmbeddings(
+            underlying_embeddings=embeddings,
+            namespace=LangchainEmbeddingsFactory.get_namespace(embeddings),
+            max_entries=max_entries,
+            persist_path=persist_path,
+        )
+
     @staticmethod
     def get_embeddings(
         use_bedrock: bool,
@@ -1,5 +1,18 @@
-from typing import List, Optional, Union
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from time import time
+from typing import (
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Iterator,
+    List,
+    Optional,
+    Union,
+)
 from langchain.chains.retrieval_qa.base import RetrievalQA
+from langchain.retrievers.contextual_compression import ContextualCompressionRetriever
+from langchain.retrievers.document_compressors.base import DocumentCompressorPipeline
 from langchain_community.llms.ollama import Ollama
 from langchain_community.llms.sagemaker_endpoint import SagemakerEndpoint
 from langchain_community.vectorstores.pgvector import PGVector
@@ -8,7 +21,8 @@ from rag_application_framework.aws.sagemaker_runtime_api import SagemakerRuntime
 from rag_application_framework.config.app_config import (
     EmbeddingConfig,
     InferenceConfig,
-    EvaluationConfig
+    EvaluationConfig,
+    RetrievalConfig,
 )
 from rag_application_framework.db.psycopg_connection_factory import (
     PsycopgConnectionFactory,
@@ -20,8 +34,43 @@ from rag_application_framework.handlers.content_transformation_handler import (
     ContentTransformationHandler,
 )
 from rag_application_framework.logging.logging import Logging
+from rag_application_framework.modules.chat.context_packer import (
+    ContextPacker,
+    TokenCounter,
+)
+from rag_application_framework.modules.chat.intent_router import IntentRouter
+from rag_application_framework.modules.chat.presigned_url_cache import (
+    PresignedUrlCache,
+)
+from rag_application_framework.modules.chat.semantic_answer_cache import (
+    AnswerCacheKey,
+    SemanticAnswerCache,
+)
+from rag_application_framework.modules.retrieval.cross_encoder_reranker import (
+    CrossEncoderReranker,
+)
+from rag_application_framework.modules.retrieval.hybrid_rrf_retriever import (
+    HybridRrfRetriever,
+)
+from rag_application_framework.modules.retrieval.scored_mmr_retriever import (
+    SIMILARITY_SCORE_KEY,
+    ScoredMmrRetriever,
+)
+from rag_application_framework.modules.retrieval.two_phase_mmr_retriever import (
+    TwoPhaseMmrRetriever,
+)
+from rag_application_framework.rag_evaluation.evaluation_sampling_policy import (
+    EvaluationSamplingPolicy,
+)
+from rag_application_framework.rag_evaluation.evaluation_worker import EvaluationWorker
+from rag_application_framework.modules.chat.rag_pipeline_runtime import (
+    RagPipelineComponents,
+    RagPipelineKey,
+    RagPipelineRuntime,
+)
 from sqlalchemy.engine import Engine
 from langchain.schema import Document
+from langchain_core.retrievers import BaseRetriever
 from rag_application_framework.aws.s3_api import S3Api
 from rag_application_framework.config.app_config import FileStoreConfig
 from dataclasses import dataclass
@@ -45,6 +94,88 @@ class SourceDocument:
     confluence_source_info: Optional[ConfluenceSourceInfo] = None
 
 
+class RagStreamResponse:
+    """
+    Iterable over the tokens of a streamed answer. Once the tokens are consumed,
+    `result` holds the same dictionary that `BotRagPipeline.infer` returns.
+    """
+
+    def __init__(self, tokens: Iterator[str], finalize: Callable[[str], dict]):
+        self._tokens = tokens
+        self._finalize = finalize
+        self._result: Optional[dict] = None
+
+    def __iter__(self) -> Iterator[str]:
+        answer_parts = []
+        for token in self._tokens:
+            answer_parts.append(token)
+            yield token
+        self._result = self._finalize("".join(answer_parts))
+
+    @property
+    def result(self) -> dict:
+        if self._result is None:
+            raise RuntimeError("The stream must be consumed before reading the result")
+        return self._result
+
+
+class AsyncRagStreamResponse:
+    """
+    Async iterable over the tokens of a streamed answer, the counterpart of
+    `RagStreamResponse` returned by `BotRagPipeline.astream`.
+    """
+
+    def __init__(
+        self,
+        tokens: AsyncIterator[str],
+        finalize: Callable[[str], Awaitable[dict]],
+    ):
+        self._tokens = tokens
+        self._finalize = finalize
+        self._result: Optional[dict] = None
+
+    async def __aiter__(self) -> AsyncIterator[str]:
+        answer_parts = []
+        async for token in self._tokens:
+            answer_parts.append(token)
+            yield token
+        self._result = await self._finalize("".join(answer_parts))
+
+    @property
+    def result(self) -> dict:
+        if self._result is None:
+            raise RuntimeError("The stream must be consumed before reading the result")
+        return self._result
+
+
+async def _iterate_in_thread(iterator: Iterator[str]) -> AsyncIterator[str]:
+    """Consumes a blocking iterator from a worker thread, one item at a time."""
+    done = object()
+    while True:
+        item = await asyncio.to_thread(next, iterator, done)
+        if item is done:
+            return
+        yield item
+
+
+NO_RELEVANT_CONTEXT_ANSWER = (
+    "I am trained on the uploaded document information and could not find anything "
+    "relevant to your question. The closest sources are listed below."
+)
+
+SAGEMAKER_MODEL_KWARGS = {
+    "do_sample": True,
+    "temperature": 0.5,
+    "top_k": 30,
+    "top_p": 0.9,
+    "repetition_penalty": 1.3,
+    "repeat_last_n": 0,
+    "max_new_tokens": 512,
+    "stop": ["</s>"],
+    "return_full_text": False,
+}
+
+
 class BotRagPipeline:
     """
     A class to perform inference using the Bedrock Model LLM.
@@ -61,6 +192,11 @@ class BotRagPipeline:
         evaluation_config: Union[EvaluationConfig, None],
         sagemaker_runtime_api: Optional[SagemakerRuntimeApi] = None,
         s3_api: Optional[S3Api] = None,
+        evaluation_worker: Optional[EvaluationWorker] = None,
+        evaluation_sampling_policy: Optional[EvaluationSamplingPolicy] = None,
+        semantic_answer_cache: Optional[SemanticAnswerCache] = None,
+        retrieval_config: Optional[RetrievalConfig] = None,
+        intent_router: Optional[IntentRouter] = None,
     ) -> None:
         if (
             inference_config.inference_engine.name.lower() == "sagemaker"
@@ -92,32 +228,72 @@ class BotRagPipeline:
         self.sagemaker_runtime_api = sagemaker_runtime_api
         self.s3_api = s3_api
         self.file_store_config = file_store_config
+        self.evaluation_worker = evaluation_worker
+        self.evaluation_sampling_policy = evaluation_sampling_policy
+        self.semantic_answer_cache = semantic_answer_cache
+        self.retrieval_config = retrieval_config or RetrievalConfig()
+        self.token_counter = TokenCounter(self.retrieval_config.context_tokenizer)
+        self.intent_router = intent_router
+        self.presigned_url_cache = PresignedUrlCache(s3_api) if s3_api else None
+        self._source_executor = ThreadPoolExecutor(
+            max_workers=4, thread_name_prefix="source-documents"
+        )
 
-    def infer(self, query):
+    @property
+    def runtime_key(self) -> RagPipelineKey:
+        inference_engine = self.inference_config.inference_engine.name.lower()
+        if inference_engine == "sagemaker":
+            model_id = self.inference_config.sagemaker_endpoint
+        elif inference_engine == "bedrock":
+            model_id = self.inference_config.bedrock_model_id
+        else:
+            model_id = None
+
+        return RagPipelineKey(
+            collection_name=self.embeddings_config.collection_name,
+            inference_engine=inference_engine,
+            model_id=model_id,
+        )
+
+    def get_components(self) -> RagPipelineComponents:
         """
-        Perform inference using the LLM using the query and the vectordb
+        Returns the process wide vector store, retriever, llm and chain for this pipeline
         """
+        return RagPipelineRuntime.get_or_create(
+            self.runtime_key, self._build_components
+        )
+
+    def close(self):
+        """
+        Stops the threads resolving source documents, without waiting for them
+        """
+        self._source_executor.shutdown(wait=False)
+
+    def _get_evaluation_handler(
+        self, prompt_tokens: Optional[int] = None
+    ) -> Optional[RagasEvaluationAndDbLoggingCallbackHandler]:
+        if not self.evaluation_config:
+            return None
+        return RagasEvaluationAndDbLoggingCallbackHandler(
+            #openai_config=self.openai_config,
+            evaluation_config=self.evaluation_config,
+            embeddings_config=self.embeddings_config,
+            engine=self.engine,
+            evaluation_worker=self.evaluation_worker,
+            sampling_policy=self.evaluation_sampling_policy,
+            model_id=self.runtime_key.model_id,
+            prompt_tokens=prompt_tokens,
+        )
+
+    def _build_components(self) -> RagPipelineComponents:
         vector_store = PGVector(
             collection_name=self.embeddings_config.collection_name,
             connection_string=self.db_factory.get_connection_str(),
             embedding_function=self.embeddings_config.embeddings,
+            engine_args=self.db_factory.get_engine_args(),
         )
 
-        callback_handlers = []
-
-        if self.evaluation_config:
-            callback_handlers.append(
-                RagasEvaluationAndDbLoggingCallbackHandler(
-                    #openai_config=self.openai_config,
-                    evaluation_config=self.evaluation_config,
-                    embeddings_config=self.embeddings_config,
-                    engine=self.engine,
-                )
-            )
-
-        retriever = vector_store.as_retriever(
-            search_type="mmr", search_kwargs={"k": 5, "fetch_k": 30}
-        )
+        retriever = self._get_retriever(vector_store)
 
         llm = self._get_llm()
 
@@ -130,19 +306,515 @@ class BotRagPipeline:
             return_source_documents=True,
         )
 
-        result = qa_chain({"question": query}, callbacks=callback_handlers)
+        return RagPipelineComponents(
+            vector_store=vector_store,
+            retriever=retriever,
+            llm=llm,
+            qa_chain=qa_chain,
+        )
 
-        logger.info(f"Result: {result}")
+    def _route_intent(self, query: str) -> Optional[str]:
+        """
+        Returns the canned answer of an identity or small talk question, if any
+        """
+        if not self.intent_router:
+            return None
+        match = self.intent_router.route(query)
+        return match.intent.answer if match else None
 
-        if self.file_store_config.is_s3:
-            result["source_documents"] = self._prepare_source_documents_s3(
-                result["source_documents"]
+    def _lookup_cached_answer(self, query: str):
+        """
+        Returns the answer cache key and the cached answer of a similar question, if any
+        """
+        if not self.semantic_answer_cache:
+            return None, None
+        collection_name = self.embeddings_config.collection_name
+        cache_key = AnswerCacheKey(
+            query_embedding=self.embeddings_config.embeddings.embed_query(query),
+            collection_version=self.semantic_answer_cache.collection_version(
+                collection_name
+            ),
+        )
+        cached_answer = self.semantic_answer_cache.lookup(
+            collection_name, cache_key.query_embedding, cache_key.collection_version
+        )
+        return cache_key, cached_answer
+
+    def _store_cached_answer(
+        self,
+        query: str,
+        cache_key: Optional[AnswerCacheKey],
+        answer: str,
+        source_docs: List[Document],
+    ):
+        if self.semantic_answer_cache and cache_key is not None and answer:
+            self.semantic_answer_cache.store(
+                collection_name=self.embeddings_config.collection_name,
+                question=query,
+                query_embedding=cache_key.query_embedding,
+                answer=answer,
+                source_documents=source_docs,
+                collection_version=cache_key.collection_version,
             )
+
+    def infer(self, query):
+        """
+        Perform inference using the LLM using the query and the vectordb
+        """
+        canned_answer = self._route_intent(query)
+        if canned_answer is not None:
+            return {"question": query, "result": canned_answer, "source_documents": []}
+
+        cache_key, cached_answer = self._lookup_cached_answer(query)
+        if cached_answer:
+            return {
+                "question": query,
+                "result": cached_answer.answer,
+                "source_documents": self._prepare_source_documents(
+                    cached_answer.source_documents
+                ),
+            }
+
+        source_docs = self.retrieve(query)
+        if not self._has_relevant_context(source_docs):
+            return self._no_relevant_context_result(query, source_docs)
+
+        # The sources are known now, prepare them while the answer is generated
+        source_documents = self._source_executor.submit(
+            self._prepare_source_documents, source_docs
+        )
+        answer = self.generate(query, source_docs)
+
+        logger.info(f"Result: {answer}")
+
+        self._store_cached_answer(query, cache_key, answer, source_docs)
+        return {
+            "question": query,
+            "result": answer,
+            "source_documents": source_documents.result(),
+        }
+
+    def retrieve(self, query: str) -> List[Document]:
+        """
+        Retrieval stage, returns the chunks passed to the model for the query
+        """
+        return self.get_components().retriever.invoke(query)
+
+    def generate(self, query: str, source_docs: List[Document]) -> str:
+        """
+        Generation stage, answers the query from the retrieved chunks
+        """
+        # The chain formats the same prompt, counted here whether evaluated or not
+        _, _, prompt_tokens = self._build_prompt(query, source_docs)
+        # Same as running qa_chain, with the retrieved chunks already at hand
+        output = self.get_components().qa_chain.combine_documents_chain.invoke(
+            {"input_documents": source_docs, "question": query},
+            config={"callbacks": self._get_callback_handlers(prompt_tokens)},
+        )
+        return output["output_text"]
+
+    def _get_callback_handlers(self, prompt_tokens: Optional[int] = None) -> list:
+        callback_handlers = []
+
+        evaluation_handler = self._get_evaluation_handler(prompt_tokens)
+        if evaluation_handler:
+            callback_handlers.append(evaluation_handler)
+        return callback_handlers
+
+    async def ainfer(self, query) -> dict:
+        """
+        Coroutine version of `infer`. Retrieval runs on the asyncpg pool and the
+        model is called asynchronously where LangChain supports it, blocking calls
+        run in worker threads, so one event loop can serve many questions at once
+        """
+        canned_answer = await asyncio.to_thread(self._route_intent, query)
+        if canned_answer is not None:
+            return {"question": query, "result": canned_answer, "source_documents": []}
+
+        cache_key, cached_answer = await asyncio.to_thread(
+            self._lookup_cached_answer, query
+        )
+        if cached_answer:
+            return {
+                "question": query,
+                "result": cached_answer.answer,
+                "source_documents": await asyncio.to_thread(
+                    self._prepare_source_documents, cached_answer.source_documents
+                ),
+            }
+
+        source_docs = await self.aretrieve(query)
+        if not self._has_relevant_context(source_docs):
+            return await asyncio.to_thread(
+                self._no_relevant_context_result, query, source_docs
+            )
+
+        source_documents = asyncio.ensure_future(
+            asyncio.to_thread(self._prepare_source_documents, source_docs)
+        )
+        answer = await self.agenerate(query, source_docs)
+
+        logger.info(f"Result: {answer}")
+
+        self._store_cached_answer(query, cache_key, answer, source_docs)
+        return {
+            "question": query,
+            "result": answer,
+            "source_documents": await source_documents,
+        }
+
+    async def aretrieve(self, query: str) -> List[Document]:
+        """
+        Coroutine version of `retrieve`
+        """
+        components = await asyncio.to_thread(self.get_components)
+        return await components.retriever.ainvoke(query)
+
+    async def agenerate(self, query: str, source_docs: List[Document]) -> str:
+        """
+        Coroutine version of `generate`
+        """
+        components = await asyncio.to_thread(self.get_components)
+        _, _, prompt_tokens = self._build_prompt(query, source_docs)
+        output = await components.qa_chain.combine_documents_chain.ainvoke(
+            {"input_documents": source_docs, "question": query},
+            config={"callbacks": self._get_callback_handlers(prompt_tokens)},
+        )
+        return output["output_text"]
+
+    def _has_relevant_context(self, source_docs: List[Document]) -> bool:
+        """
+        False when the best similarity of the retrieved chunks is below the
+        configured minimum, in which case the model could only answer that it does
+        not know
+        """
+        min_similarity = self.retrieval_config.min_similarity
+        if min_similarity is None:
+            return True
+        similarities = [
+            doc.metadata[SIMILARITY_SCORE_KEY]
+            for doc in source_docs
+            if doc.metadata.get(SIMILARITY_SCORE_KEY) is not None
+        ]
+        if source_docs and not similarities:
+            return True
+        best_similarity = max(similarities, default=0.0)
+        if best_similarity < min_similarity:
+            logger.info(
+                "Skipping generation, best similarity %.3f is below %.3f",
+                best_similarity,
+                min_similarity,
+            )
+            return False
+        return True
+
+    def _no_relevant_context_result(
+        self, query: str, source_docs: List[Document]
+    ) -> dict:
+        return {
+            "question": query,
+            "result": NO_RELEVANT_CONTEXT_ANSWER,
+            "source_documents": self._prepare_source_documents(source_docs),
+        }
+
+    def stream(self, query) -> RagStreamResponse:
+        """
+        Perform inference like `infer` but yield the answer token by token as the LLM
+        generates it. The sources are available from the response once it is consumed.
+        """
+        canned_answer = self._route_intent(query)
+        if canned_answer is not None:
+            return RagStreamResponse(
+                tokens=iter([canned_answer]),
+                finalize=lambda answer: {
+                    "question": query,
+                    "result": answer,
+                    "source_documents": [],
+                },
+            )
+
+        cache_key, cached_answer = self._lookup_cached_answer(query)
+        if cached_answer:
+            return RagStreamResponse(
+                tokens=iter([cached_answer.answer]),
+                finalize=lambda answer: {
+                    "question": query,
+                    "result": answer,
+                    "source_documents": self._prepare_source_documents(
+                        cached_answer.source_documents
+                    ),
+                },
+            )
+
+        components = self.get_components()
+        source_docs = self.retrieve(query)
+        if not self._has_relevant_context(source_docs):
+            return RagStreamResponse(
+                tokens=iter([NO_RELEVANT_CONTEXT_ANSWER]),
+                finalize=lambda answer: self._no_relevant_context_result(
+                    query, source_docs
+                ),
+            )
+        source_documents = self._source_executor.submit(
+            self._prepare_source_documents, source_docs
+        )
+        contexts, prompt, prompt_tokens = self._build_prompt(query, source_docs)
+        start_time = time()
+
+        def finalize(answer: str) -> dict:
+            self._finish_stream(
+                query,
+                cache_key,
+                components,
+                source_docs,
+                contexts,
+                prompt_tokens,
+                time() - start_time,
+                answer,
+            )
+            return {
+                "question": query,
+                "result": answer,
+                "source_documents": source_documents.result(),
+            }
+
+        return RagStreamResponse(
+            tokens=self._stream_tokens(components, prompt), finalize=finalize
+        )
+
+    async def astream(self, query) -> AsyncRagStreamResponse:
+        """
+        Coroutine version of `stream`, the tokens are consumed with `async for`
+        """
+        canned_answer = await asyncio.to_thread(self._route_intent, query)
+        if canned_answer is not None:
+            return self._async_ready_response(query, canned_answer, [])
+
+        cache_key, cached_answer = await asyncio.to_thread(
+            self._lookup_cached_answer, query
+        )
+        if cached_answer:
+            return self._async_ready_response(
+                query, cached_answer.answer, cached_answer.source_documents
+            )
+
+        components = await asyncio.to_thread(self.get_components)
+        source_docs = await self.aretrieve(query)
+        if not self._has_relevant_context(source_docs):
+            return self._async_ready_response(
+                query, NO_RELEVANT_CONTEXT_ANSWER, source_docs
+            )
+        source_documents = asyncio.ensure_future(
+            asyncio.to_thread(self._prepare_source_documents, source_docs)
+        )
+
+        contexts, prompt, prompt_tokens = self._build_prompt(query, source_docs)
+        start_time = time()
+
+        async def finalize(answer: str) -> dict:
+            await asyncio.to_thread(
+                self._finish_stream,
+                query,
+                cache_key,
+                components,
+                source_docs,
+                contexts,
+                prompt_tokens,
+                time() - start_time,
+                answer,
+            )
+            return {
+                "question": query,
+                "result": answer,
+                "source_documents": await source_documents,
+            }
+
+        return AsyncRagStreamResponse(
+            tokens=self._astream_tokens(components, prompt), finalize=finalize
+        )
+
+    def _async_ready_response(
+        self, query: str, answer: str, source_docs: List[Document]
+    ) -> AsyncRagStreamResponse:
+        async def tokens() -> AsyncIterator[str]:
+            yield answer
+
+        async def finalize(answer: str) -> dict:
+            return {
+                "question": query,
+                "result": answer,
+                "source_documents": await asyncio.to_thread(
+                    self._prepare_source_documents, source_docs
+                ),
+            }
+
+        return AsyncRagStreamResponse(tokens=tokens(), finalize=finalize)
+
+    def _build_prompt(self, query: str, source_docs: List[Document]):
+        """
+        Returns the contexts, the prompt and the number of prompt tokens
+        """
+        contexts = [doc.page_content for doc in source_docs]
+        prompt = self.prompt.format_prompt(
+            question=query, context="\n\n".join(contexts)
+        ).to_string()
+        prompt_tokens = self.token_counter.count(prompt)
+        logger.info("Prompt of %s tokens sent to the model", prompt_tokens)
+        return contexts, prompt, prompt_tokens
+
+    def _finish_stream(
+        self,
+        query: str,
+        cache_key: Optional[AnswerCacheKey],
+        components: RagPipelineComponents,
+        source_docs: List[Document],
+        contexts: List[str],
+        prompt_tokens: int,
+        total_duration: float,
+        answer: str,
+    ):
+        """
+        Hands a streamed answer to the evaluation and the semantic answer cache
+        """
+        logger.info(f"Streamed answer: {answer}")
+        evaluation_handler = self._get_evaluation_handler()
+        if evaluation_handler:
+            run_data = {
+                "question": query,
+                "contexts": contexts,
+                "output_text": answer,
+                "model_type": type(components.llm).__name__,
+                "qa_status": len(answer) > 0,
+                "total_duration": total_duration,
+                "prompt_tokens": prompt_tokens,
+            }
+            similarities = [
+                doc.metadata[SIMILARITY_SCORE_KEY]
+                for doc in source_docs
+                if doc.metadata.get(SIMILARITY_SCORE_KEY) is not None
+            ]
+            if similarities:
+                run_data["retrieval_similarity"] = max(similarities)
+            evaluation_handler.write_score(run_data)
+        self._store_cached_answer(query, cache_key, answer, source_docs)
+
+    def _stream_tokens(
+        self, components: RagPipelineComponents, prompt: str
+    ) -> Iterator[str]:
+        if self.inference_config.inference_engine.name.lower() == "sagemaker":
+            yield from self._stream_sagemaker_tokens(prompt)
+        else:
+            for chunk in components.llm.stream(prompt):
+                yield chunk
+
+    async def _astream_tokens(
+        self, components: RagPipelineComponents, prompt: str
+    ) -> AsyncIterator[str]:
+        if self.inference_config.inference_engine.name.lower() == "sagemaker":
+            # boto3 has no async client, the event stream is read from a thread
+            tokens = _iterate_in_thread(self._stream_sagemaker_tokens(prompt))
+            async for token in tokens:
+                yield token
         else:
-            result["source_documents"] = self._prepare_source_documents_local(
-                result["source_documents"]
+            async for chunk in components.llm.astream(prompt):
+                yield chunk
+
+    def _stream_sagemaker_tokens(self, prompt: str) -> Iterator[str]:
+        """
+        Streams tokens from a TGI Sagemaker Endpoint with invoke_endpoint_with_response_stream
+        """
+        if not self.sagemaker_runtime_api:
+            raise ValueError("Sagemaker Api must be present.")
+
+        content_handler = ContentTransformationHandler()
+        event_stream = self.sagemaker_runtime_api.invoke_endpoint_with_response_stream(
+            endpoint_name=str(self.inference_config.sagemaker_endpoint),
+            body=content_handler.transform_stream_input(prompt, SAGEMAKER_MODEL_KWARGS),
+            content_type=content_handler.content_type,
+            accept=content_handler.accepts,
+        )
+        yield from content_handler.transform_stream_output(event_stream)
+
+    def _prepare_source_documents(
+        self, source_docs: List[Document]
+    ) -> list[SourceDocument]:
+        if self.file_store_config.is_s3:
+            return self._prepare_source_documents_s3(source_docs)
+        return self._prepare_source_documents_local(source_docs)
+
+    @property
+    def search_type(self) -> str:
+        """Search type of the collection, falling back to the default search type."""
+        return self.retrieval_config.collection_search_types.get(
+            self.embeddings_config.collection_name, self.retrieval_config.search_type
+        )
+
+    def _get_retriever(self, vector_store: PGVector) -> BaseRetriever:
+        retrieval_config = self.retrieval_config
+        compressors = []
+        candidates = retrieval_config.k
+        if retrieval_config.rerank_model:
+            # The reranker picks the chunks for the prompt out of a larger candidate set
+            candidates = max(retrieval_config.rerank_candidates, retrieval_config.k)
+            compressors.append(
+                CrossEncoderReranker(
+                    model_name=retrieval_config.rerank_model,
+                    top_n=retrieval_config.k,
+                    batch_size=retrieval_config.rerank_batch_size,
+                    quantize=retrieval_config.rerank_quantize,
+                )
             )
-        return result
+
+        inference_engine = self.inference_config.inference_engine.name.lower()
+        max_prompt_tokens = retrieval_config.context_token_budgets.get(inference_engine)
+        if max_prompt_tokens:
+            compressors.append(
+                ContextPacker(
+                    token_counter=self.token_counter,
+                    max_prompt_tokens=max_prompt_tokens,
+                    prompt_overhead_tokens=self.token_counter.count(
+                        self.prompt.format_prompt(question="", context="").to_string()
+                    ),
+                )
+            )
+
+        base_retriever = self._get_base_retriever(vector_store, candidates)
+        if not compressors:
+            return base_retriever
+        return ContextualCompressionRetriever(
+            base_compressor=(
+                compressors[0]
+                if len(compressors) == 1
+                else DocumentCompressorPipeline(transformers=compressors)
+            ),
+            base_retriever=base_retriever,
+        )
+
+    def _get_base_retriever(self, vector_store: PGVector, k: int) -> BaseRetriever:
+        if self.search_type == "hybrid":
+            return HybridRrfRetriever(
+                connection_factory=self.db_factory,
+                embeddings=self.embeddings_config.embeddings,
+                collection_name=self.embeddings_config.collection_name,
+                k=k,
+                vector_k=self.retrieval_config.fetch_k,
+                lexical_k=self.retrieval_config.lexical_k,
+                rrf_k=self.retrieval_config.rrf_k,
+                text_search_config=self.retrieval_config.text_search_config,
+            )
+        if self.retrieval_config.two_phase_mmr:
+            return TwoPhaseMmrRetriever(
+                connection_factory=self.db_factory,
+                embeddings=self.embeddings_config.embeddings,
+                collection_name=self.embeddings_config.collection_name,
+                k=k,
+                fetch_k=self.retrieval_config.fetch_k,
+            )
+        return ScoredMmrRetriever(
+            vector_store=vector_store,
+            k=k,
+            fetch_k=self.retrieval_config.fetch_k,
+        )
 
     def _get_local_llm(self) -> Ollama:
         """
@@ -195,17 +867,7 @@ class BotRagPipeline:
 
         llm = SagemakerEndpoint(
             endpoint_name=str(self.inference_config.sagemaker_endpoint),
-            model_kwargs={
-                "do_sample": True,
-                "temperature": 0.5,
-                "top_k": 30,
-                "top_p": 0.9,
-                "repetition_penalty": 1.3,
-                "repeat_last_n": 0,
-                "max_new_tokens": 512,
-                "stop": ["</s>"],
-                "return_full_text": False,
-            },
+            model_kwargs=SAGEMAKER_MODEL_KWARGS,
             content_handler=content_handler,
             client=self.sagemaker_runtime_api.client,
         )
@@ -229,17 +891,22 @@ class BotRagPipeline:
     ) -> list[SourceDocument]:
         source_doc_uris: List[SourceDocument] = []
 
-        if not self.s3_api:
+        if not self.presigned_url_cache:
             raise ValueError("S3Api must be present.")
 
+        source_uris = set()
         for doc in source_docs:
             if hasattr(doc, "metadata"):
                 source_uri = doc.metadata["source"]
+                # One source document and url per file, chunks often share a file
+                if source_uri in source_uris:
+                    continue
+                source_uris.add(source_uri)
                 bucket_name = source_uri.split("/")[2]
                 full_file_key = "/".join(source_uri.split("/")[3:])
-                url = self.s3_api.generate_presigned_url(
+                url = self.presigned_url_cache.get_url(
                     bucket_name=bucket_name,
-                    fname=full_file_key,
+                    object_key=full_file_key,
                 )
                 source_doc = SourceDocument(
                     file_store_url=url,
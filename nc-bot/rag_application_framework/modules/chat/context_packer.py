@@ -0,0 +1,156 @@
+import threading
+from typing import Any, Dict, List, Optional, Sequence
+
+from langchain_core.callbacks import Callbacks
+from langchain_core.documents import Document
+from langchain_core.documents.compressor import BaseDocumentCompressor
+from rag_application_framework.logging.logging import Logging
+
+logger = Logging.get_logger(__name__)
+
+CONTEXT_TOKENS_KEY = "context_tokens"
+# Low on purpose: Llama tokenizers often take less than four characters per token
+CHARS_PER_TOKEN = 3
+
+
+class TokenCounter:
+    """Counts tokens with a HuggingFace tokenizer loaded once per process.
+
+    The tokenizer is read from local files only, a directory saved with
+    `save_pretrained` (the Docker image ships the one of the deployed model) or a
+    model already in the HuggingFace cache, so inference never downloads it. Falls
+    back to a conservative estimate of three characters per token when the
+    tokenizer is not set or cannot be loaded, so a missing tokenizer never breaks
+    inference nor overflows the context window of the model.
+    """
+
+    _tokenizers: Dict[str, Any] = {}
+    _lock = threading.Lock()
+
+    def __init__(self, tokenizer_name: Optional[str]) -> None:
+        self.tokenizer_name = tokenizer_name
+
+    @property
+    def tokenizer(self) -> Optional[Any]:
+        if not self.tokenizer_name:
+            return None
+        if self.tokenizer_name not in self._tokenizers:
+            with self._lock:
+                if self.tokenizer_name not in self._tokenizers:
+                    self._tokenizers[self.tokenizer_name] = self._load(
+                        self.tokenizer_name
+                    )
+        return self._tokenizers[self.tokenizer_name]
+
+    @staticmethod
+    def _load(tokenizer_name: str) -> Optional[Any]:
+        try:
+            from transformers import AutoTokenizer
+
+            return AutoTokenizer.from_pretrained(tokenizer_name, local_files_only=True)
+        except Exception as e:
+            logger.warning(
+                "Could not load tokenizer %s, estimating tokens from characters: %s",
+                tokenizer_name,
+                e,
+            )
+            return None
+
+    def count(self, text: str) -> int:
+        tokenizer = self.tokenizer
+        if tokenizer is None:
+            return len(text) // CHARS_PER_TOKEN + 1
+        return len(tokenizer.encode(text, add_special_tokens=False))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        tokenizer = self.tokenizer
+        if tokenizer is None:
+            return text[: max_tokens * CHARS_PER_TOKEN]
+        token_ids = tokenizer.encode(text, add_special_tokens=False)[:max_tokens]
+        return tokenizer.decode(token_ids, skip_special_tokens=True)
+
+
+def _overlap(left: str, right: str, min_overlap: int, max_overlap: int) -> int:
+    """Length of the longest end of `left` that is also the start of `right`."""
+    for length in range(min(max_overlap, len(left), len(right)), min_overlap - 1, -1):
+        if left.endswith(right[:length]):
+            return length
+    return 0
+
+
+class ContextPacker(BaseDocumentCompressor):
+    """Fits the retrieved chunks into the prompt token budget of the model.
+
+    Neighbouring chunks of a source share the text overlap of the splitter, which is
+    removed so it is only sent once. Chunks are then added in retrieval order until
+    the budget is used, the last one truncated if enough room is left. The budget
+    covers the whole prompt, so the question and `prompt_overhead_tokens` (the
+    template) are subtracted first. Each chunk gets its token count under
+    `context_tokens`.
+    """
+
+    token_counter: TokenCounter
+    max_prompt_tokens: int
+    prompt_overhead_tokens: int = 0
+    min_overlap: int = 10
+    max_overlap: int = 200
+    min_chunk_tokens: int = 32
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    def _deduplicate(self, documents: Sequence[Document]) -> List[Document]:
+        kept: List[Document] = []
+        for document in documents:
+            text = document.page_content
+            source = document.metadata.get("source")
+            for other in kept:
+                if other.metadata.get("source") != source:
+                    continue
+                if text in other.page_content:
+                    text = ""
+                    break
+                text = text[
+                    _overlap(other.page_content, text, self.min_overlap, self.max_overlap) :
+                ]
+                suffix = _overlap(text, other.page_content, self.min_overlap, self.max_overlap)
+                if suffix:
+                    text = text[:-suffix]
+            if text.strip():
+                kept.append(Document(page_content=text, metadata=dict(document.metadata)))
+        return kept
+
+    def compress_documents(
+        self,
+        documents: Sequence[Document],
+        query: str,
+        callbacks: Optional[Callbacks] = None,
+    ) -> Sequence[Document]:
+        budget = (
+            self.max_prompt_tokens
+            - self.prompt_overhead_tokens
+            - self.token_counter.count(query)
+        )
+
+        packed = []
+        for document in self._deduplicate(documents):
+            tokens = self.token_counter.count(document.page_content)
+            if tokens > budget:
+                if budget < self.min_chunk_tokens:
+                    break
+                document.page_content = self.token_counter.truncate(
+                    document.page_content, budget
+                )
+                tokens = budget
+            document.metadata[CONTEXT_TOKENS_KEY] = tokens
+            packed.append(document)
+            budget -= tokens
+
+        if len(packed) < len(documents):
+            logger.info(
+                "Packed %s of %s chunks into the prompt budget of %s tokens",
+                len(packed),
+                len(documents),
+                self.max_prompt_tokens,
+            )
+        return packed
@@ -0,0 +1,167 @@
+import re
+import threading
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain.schema.embeddings import Embeddings
+from rag_application_framework.logging.logging import Logging
+
+logger = Logging.get_logger(__name__)
+
+RETRIEVAL_ROUTE = "retrieval"
+
+
+@dataclass
+class CannedIntent:
+    name: str
+    answer: str
+    patterns: List[str] = field(default_factory=list)
+    examples: List[str] = field(default_factory=list)
+
+
+@dataclass
+class IntentMatch:
+    intent: CannedIntent
+    method: str
+    similarity: Optional[float] = None
+
+
+DEFAULT_INTENTS = [
+    CannedIntent(
+        name="identity",
+        answer="I am QA Bot",
+        patterns=[
+            r"who are you",
+            r"what are you",
+            r"what is your name",
+            r"what'?s your name",
+            r"introduce yourself",
+        ],
+        examples=[
+            "who are you?",
+            "what is your name?",
+            "tell me about yourself",
+            "are you a bot?",
+            "what kind of assistant are you?",
+        ],
+    ),
+    CannedIntent(
+        name="greeting",
+        answer="Hello! Ask me anything about the uploaded documents.",
+        patterns=[r"(hi|hello|hey|good (morning|afternoon|evening))( there)?"],
+        examples=["hi", "hello there", "hey, how are you?", "good morning"],
+    ),
+    CannedIntent(
+        name="thanks",
+        answer="You are welcome! Let me know if you have more questions.",
+        patterns=[r"(thanks|thank you|thx|cheers)( (a lot|so much|very much))?"],
+        examples=["thank you", "thanks a lot", "great, thanks for the help"],
+    ),
+    CannedIntent(
+        name="goodbye",
+        answer="Goodbye!",
+        patterns=[r"(bye|goodbye|see you|see ya)( later)?"],
+        examples=["bye", "goodbye", "see you later"],
+    ),
+]
+
+
+class IntentRouter:
+    """Answers identity and small talk questions without retrieval or inference.
+
+    A question is first matched against the regular expressions of the intents,
+    then short questions are compared with the embedded examples of every intent.
+    Anything else is routed to retrieval. The number of questions per route is kept
+    in `hits`.
+    """
+
+    def __init__(
+        self,
+        embeddings: Optional[Embeddings] = None,
+        intents: Optional[List[CannedIntent]] = None,
+        similarity_threshold: float = 0.85,
+        max_words: int = 8,
+    ) -> None:
+        self.embeddings = embeddings
+        self.intents = intents or DEFAULT_INTENTS
+        self.similarity_threshold = similarity_threshold
+        self.max_words = max_words
+        self.hits: Counter = Counter()
+        self._patterns = [
+            (intent, re.compile(pattern))
+            for intent in self.intents
+            for pattern in intent.patterns
+        ]
+        self._example_matrix: Optional[np.ndarray] = None
+        self._example_intents: List[CannedIntent] = []
+        self._lock = threading.Lock()
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        return dict(self.hits)
+
+    @staticmethod
+    def _normalize_text(query: str) -> str:
+        return " ".join(re.sub(r"[^\w\s']", " ", query.lower()).split())
+
+    def _examples(self) -> np.ndarray:
+        if self._example_matrix is None:
+            with self._lock:
+                if self._example_matrix is None:
+                    intents = [
+                        intent for intent in self.intents for _ in intent.examples
+                    ]
+                    examples = [
+                        example for intent in self.intents for example in intent.examples
+                    ]
+                    matrix = np.asarray(
+                        self.embeddings.embed_documents(examples), dtype=np.float32
+                    )
+                    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+                    self._example_intents = intents
+                    self._example_matrix = matrix / np.where(norms == 0, 1, norms)
+        return self._example_matrix
+
+    def _classify(self, query: str) -> Optional[IntentMatch]:
+        if self.embeddings is None or not any(i.examples for i in self.intents):
+            return None
+        matrix = self._examples()
+        query_vector = np.asarray(self.embeddings.embed_query(query), dtype=np.float32)
+        norm = np.linalg.norm(query_vector)
+        similarities = matrix @ (query_vector / norm if norm else query_vector)
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.similarity_threshold:
+            return None
+        return IntentMatch(
+            intent=self._example_intents[best],
+            method="embedding",
+            similarity=float(similarities[best]),
+        )
+
+    def route(self, query: str) -> Optional[IntentMatch]:
+        """Returns the matched canned intent, or None to answer with retrieval."""
+        text = self._normalize_text(query)
+        match = next(
+            (
+                IntentMatch(intent=intent, method="rule")
+                for intent, pattern in self._patterns
+                if pattern.fullmatch(text)
+            ),
+            None,
+        )
+        if match is None and 0 < len(text.split()) <= self.max_words:
+            try:
+                match = self._classify(query)
+            except Exception as e:
+                logger.error("Intent classification failed: %s", e)
+
+        route = match.intent.name if match else RETRIEVAL_ROUTE
+        with self._lock:
+            self.hits[route] += 1
+        if match:
+            logger.info(
+                "Question routed to intent %s by %s: %s", route, match.method, query
+            )
+        return match
@@ -0,0 +1,45 @@
+import threading
+from time import monotonic
+from typing import Dict, Tuple
+
+from rag_application_framework.aws.s3_api import PRESIGNED_URL_EXPIRES_IN, S3Api
+
+
+class PresignedUrlCache:
+    """Presigned S3 urls reused until shortly before they expire.
+
+    A url is handed out for at most `expires_in - safety_margin` seconds after it
+    was generated, so a user always has at least `safety_margin` seconds to open it.
+    """
+
+    def __init__(
+        self,
+        s3_api: S3Api,
+        expires_in: int = PRESIGNED_URL_EXPIRES_IN,
+        safety_margin: int = 120,
+    ) -> None:
+        if safety_margin >= expires_in:
+            raise ValueError("The safety margin must be shorter than the url expiry")
+        self.s3_api = s3_api
+        self.expires_in = expires_in
+        self.ttl_seconds = expires_in - safety_margin
+        self._urls: Dict[Tuple[str, str], Tuple[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def get_url(self, bucket_name: str, object_key: str) -> str:
+        key = (bucket_name, object_key)
+        now = monotonic()
+        with self._lock:
+            cached = self._urls.get(key)
+            if cached and cached[1] > now:
+                return cached[0]
+
+        url = self.s3_api.generate_presigned_url(
+            bucket_name=bucket_name, fname=object_key, expires_in=self.expires_in
+        )
+        with self._lock:
+            self._urls[key] = (url, now + self.ttl_seconds)
+            # Drop expired urls so the cache only holds recently cited files
+            for expired_key in [k for k, (_, t) in self._urls.items() if t <= now]:
+                del self._urls[expired_key]
+        return url
@@ -0,0 +1,81 @@
+import threading
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional, Union
+
+from langchain.chains.retrieval_qa.base import RetrievalQA
+from langchain_community.llms.bedrock import Bedrock
+from langchain_community.llms.ollama import Ollama
+from langchain_community.llms.sagemaker_endpoint import SagemakerEndpoint
+from langchain_community.vectorstores.pgvector import PGVector
+from langchain_core.retrievers import BaseRetriever
+from rag_application_framework.logging.logging import Logging
+
+logger = Logging.get_logger(__name__)
+
+
+@dataclass(frozen=True)
+class RagPipelineKey:
+    collection_name: str
+    inference_engine: str
+    model_id: Optional[str] = None
+
+
+@dataclass
+class RagPipelineComponents:
+    vector_store: PGVector
+    retriever: BaseRetriever
+    llm: Union[Ollama, Bedrock, SagemakerEndpoint]
+    qa_chain: RetrievalQA
+
+
+class RagPipelineRuntime:
+    """Process wide registry of the objects a RAG pipeline needs to answer a question.
+
+    The vector store, retriever, LLM client and RetrievalQA chain are built once per
+    (collection, inference engine, model id) and shared by every request and Streamlit
+    session of the process. Callbacks are passed per call, so the shared objects hold
+    no request state. Documents written to or deleted from a collection need no
+    rebuild, the retrievers look the collection up again when it changed.
+    """
+
+    _components: Dict[RagPipelineKey, RagPipelineComponents] = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def get_or_create(
+        cls,
+        key: RagPipelineKey,
+        builder: Callable[[], RagPipelineComponents],
+    ) -> RagPipelineComponents:
+        components = cls._components.get(key)
+        if components is not None:
+            return components
+
+        with cls._lock:
+            components = cls._components.get(key)
+            if components is None:
+                logger.info("Building RAG pipeline components for %s", key)
+                components = builder()
+                cls._components[key] = components
+        return components
+
+    @classmethod
+    def invalidate(cls, collection_name: Optional[str] = None) -> None:
+        """Drops the cached components for a collection, or all of them when no
+        collection is given. AppContext.close() drops them all, so a context built
+        again, possibly from another config, builds its own.
+        """
+        with cls._lock:
+            if collection_name is None:
+                cls._components.clear()
+            else:
+                for key in [
+                    key
+                    for key in cls._components
+                    if key.collection_name == collection_name
+                ]:
+                    del cls._components[key]
+        logger.info(
+            "Invalidated RAG pipeline components for %s",
+            collection_name or "all collections",
+        )
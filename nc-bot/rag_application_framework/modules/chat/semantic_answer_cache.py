@@ -0,0 +1,199 @@
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from itertools import count
+from time import monotonic
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+from langchain.schema import Document
+from rag_application_framework.logging.logging import Logging
+
+logger = Logging.get_logger(__name__)
+
+
+@dataclass
+class CachedAnswer:
+    question: str
+    answer: str
+    source_documents: List[Document]
+    embedding: np.ndarray
+    created_at: float
+
+
+@dataclass
+class AnswerCacheKey:
+    """What an answer is stored under: the question embedding and the version of
+    the collection's documents read before the answer was generated."""
+
+    query_embedding: List[float]
+    collection_version: Optional[int]
+
+
+class _CollectionCache:
+    def __init__(self) -> None:
+        self.entries: "OrderedDict[int, CachedAnswer]" = OrderedDict()
+        self.version = 0
+        self._matrix: Optional[np.ndarray] = None
+        self._matrix_ids: List[int] = []
+
+    def invalidate_matrix(self):
+        self._matrix = None
+
+    def matrix(self):
+        if self._matrix is None:
+            self._matrix_ids = list(self.entries.keys())
+            self._matrix = np.vstack(
+                [self.entries[entry_id].embedding for entry_id in self._matrix_ids]
+            )
+        return self._matrix, self._matrix_ids
+
+
+class SemanticAnswerCache:
+    """Answers of earlier questions, looked up by the similarity of the question
+    embeddings instead of the exact text.
+
+    Entries are scoped per collection, expire after `ttl_seconds` and the least
+    recently used entries are evicted once a collection holds
+    `max_entries_per_collection` answers. A collection must be invalidated whenever
+    its documents change, since the stored answers may no longer be right.
+
+    Invalidation only reaches the process that changed the documents. With a
+    `version_reader`, returning the version of a collection's documents shared by
+    every process, answers cached under an older version are dropped on lookup and
+    answers generated from an older version are not stored.
+    """
+
+    def __init__(
+        self,
+        similarity_threshold: float = 0.95,
+        ttl_seconds: float = 3600.0,
+        max_entries_per_collection: int = 500,
+        version_reader: Optional[Callable[[str], int]] = None,
+    ) -> None:
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries_per_collection = max_entries_per_collection
+        self.version_reader = version_reader
+        self._collections: Dict[str, _CollectionCache] = {}
+        self._ids = count()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _evict_expired(self, collection: _CollectionCache):
+        now = monotonic()
+        expired = [
+            entry_id
+            for entry_id, entry in collection.entries.items()
+            if now - entry.created_at > self.ttl_seconds
+        ]
+        for entry_id in expired:
+            del collection.entries[entry_id]
+        if expired:
+            collection.invalidate_matrix()
+
+    def collection_version(self, collection_name: str) -> Optional[int]:
+        """Current version of the collection's documents, None when it cannot be
+        read, in which case the cache is not used."""
+        if self.version_reader is None:
+            return 0
+        try:
+            return self.version_reader(collection_name)
+        except Exception as e:
+            logger.error("Failed to read the version of %s: %s", collection_name, e)
+            return None
+
+    @staticmethod
+    def _is_current(collection: _CollectionCache, version: Optional[int]) -> bool:
+        """Drops the entries of an older version. False when `version` is older than
+        the entries, or unknown."""
+        if version is None or version < collection.version:
+            return False
+        if version > collection.version:
+            collection.entries.clear()
+            collection.invalidate_matrix()
+            collection.version = version
+        return True
+
+    def lookup(
+        self,
+        collection_name: str,
+        query_embedding: List[float],
+        collection_version: Optional[int] = 0,
+    ) -> Optional[CachedAnswer]:
+        """Returns the cached answer of the most similar question above the threshold."""
+        query_vector = self._normalize(query_embedding)
+        with self._lock:
+            collection = self._collections.get(collection_name)
+            if collection is not None:
+                if not self._is_current(collection, collection_version):
+                    self.misses += 1
+                    return None
+                self._evict_expired(collection)
+            if not collection or not collection.entries:
+                self.misses += 1
+                return None
+
+            matrix, entry_ids = collection.matrix()
+            similarities = matrix @ query_vector
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.similarity_threshold:
+                self.misses += 1
+                return None
+
+            entry_id = entry_ids[best]
+            collection.entries.move_to_end(entry_id)
+            self.hits += 1
+            entry = collection.entries[entry_id]
+            logger.info(
+                "Semantic cache hit (similarity %.3f) for question: %s",
+                similarities[best],
+                entry.question,
+            )
+            return entry
+
+    def store(
+        self,
+        collection_name: str,
+        question: str,
+        query_embedding: List[float],
+        answer: str,
+        source_documents: List[Document],
+        collection_version: Optional[int] = 0,
+    ):
+        entry = CachedAnswer(
+            question=question,
+            answer=answer,
+            source_documents=source_documents,
+            embedding=self._normalize(query_embedding),
+            created_at=monotonic(),
+        )
+        with self._lock:
+            collection = self._collections.setdefault(
+                collection_name, _CollectionCache()
+            )
+            if not self._is_current(collection, collection_version):
+                # Generated from documents that changed since
+                return
+            collection.entries[next(self._ids)] = entry
+            while len(collection.entries) > self.max_entries_per_collection:
+                collection.entries.popitem(last=False)
+            collection.invalidate_matrix()
+
+    def invalidate(self, collection_name: Optional[str] = None):
+        """Drops the answers of a collection, or of all collections when None."""
+        with self._lock:
+            if collection_name is None:
+                self._collections.clear()
+            else:
+                self._collections.pop(collection_name, None)
+        logger.info(
+            "Semantic cache invalidated for %s", collection_name or "all collections"
+        )
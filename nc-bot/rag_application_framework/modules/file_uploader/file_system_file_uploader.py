@@ -6,10 +6,16 @@ from rag_application_framework.db.embeddings_database import EmbeddingsDatabase
 from rag_application_framework.modules.file_uploader.file_uploader import (
     FilesUploaderBase,
 )
+from rag_application_framework.modules.file_uploader.parsed_document_cache import (
+    ParsedDocumentCache,
+)
+from rag_application_framework.modules.file_uploader.process_pool_document_parser import (
+    ProcessPoolDocumentParser,
+)
 
 
 import os
-from typing import Union
+from typing import Optional, Union
 
 
 class FileSystemFilesUploader(FilesUploaderBase):
@@ -18,10 +24,16 @@ class FileSystemFilesUploader(FilesUploaderBase):
         embeddings: Union[BedrockEmbeddings, HuggingFaceEmbeddings],
         embeddings_database: EmbeddingsDatabase,
         folder_path: str,
+        queue_size: int = 2,
+        document_parser: Optional[ProcessPoolDocumentParser] = None,
+        parsed_document_cache: Optional[ParsedDocumentCache] = None,
     ) -> None:
         super().__init__(
             embeddings=embeddings,
             embeddings_database=embeddings_database,
+            queue_size=queue_size,
+            document_parser=document_parser,
+            parsed_document_cache=parsed_document_cache,
         )
         self.folder_path = folder_path
 
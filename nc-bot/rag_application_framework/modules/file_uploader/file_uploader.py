@@ -1,16 +1,29 @@
 from abc import abstractmethod
-from typing import Optional, Union
+from typing import Iterable, Iterator, List, Optional, Union
 from attr import dataclass
 from langchain_community.embeddings.bedrock import BedrockEmbeddings
 from langchain_community.embeddings.huggingface import HuggingFaceEmbeddings
+from langchain_community.document_loaders.base import BaseLoader
 from langchain_community.document_loaders.s3_file import S3FileLoader
 from langchain_community.document_loaders.unstructured import UnstructuredFileLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from rag_application_framework.db.embeddings_database import (
+    EmbeddedChunks,
     EmbeddingsDatabase,
+    IngestionReport,
 )
 from langchain.schema.document import Document
 from rag_application_framework.logging.logging import Logging
+from rag_application_framework.modules.file_uploader.parsed_document_cache import (
+    ParsedDocumentCache,
+)
+from rag_application_framework.modules.file_uploader.process_pool_document_parser import (
+    ParseJob,
+    ProcessPoolDocumentParser,
+)
+from rag_application_framework.modules.file_uploader.staged_ingestion_pipeline import (
+    StagedIngestionPipeline,
+)
 
 logger = Logging.get_logger(__name__)
 
@@ -27,6 +40,24 @@ class UploadedFile:
     file_name: str
     url: Optional[str] = None
     error: Optional[Exception] = None
+    ingestion_report: Optional[IngestionReport] = None
+
+
+@dataclass
+class StoredFile:
+    """A file going through the ingestion stages after it was stored."""
+
+    file_name: str
+    custom_metadata: dict
+    file_loader: BaseLoader
+    cache_key: Optional[str] = None
+    documents: Optional[Union[List[Document], ParseJob]] = None
+
+
+def _get_source(file_loader: BaseLoader) -> Optional[str]:
+    # The source the loader gives its documents, without loading them
+    get_metadata = getattr(file_loader, "_get_metadata", None)
+    return get_metadata().get("source") if get_metadata else None
 
 
 class FilesUploaderBase:
@@ -34,61 +65,157 @@ class FilesUploaderBase:
         self,
         embeddings: Union[BedrockEmbeddings, HuggingFaceEmbeddings],
         embeddings_database: EmbeddingsDatabase,
+        queue_size: int = 2,
+        document_parser: Optional[ProcessPoolDocumentParser] = None,
+        parsed_document_cache: Optional[ParsedDocumentCache] = None,
     ) -> None:
         self.embeddings = embeddings
         self.embeddings_database = embeddings_database
+        self.queue_size = queue_size
+        self.document_parser = document_parser
+        self.parsed_document_cache = parsed_document_cache
+        self.last_ingestion_report: Optional[IngestionReport] = None
+
+    def _get_parsed_document_cache_key(
+        self, file_content: bytes, file_loader: BaseLoader
+    ) -> Optional[str]:
+        if self.parsed_document_cache is None:
+            return None
+        version = ParsedDocumentCache.version_key(
+            file_loader,
+            # Page ranges are merged into the text of single mode documents
+            pdf_pages_per_task=(
+                self.document_parser.pdf_pages_per_task
+                if self.document_parser
+                else None
+            ),
+        )
+        return ParsedDocumentCache.key(file_content, version)
 
-    def upload_and_get_url(
-        self,
-        list_of_files: list[FileUpload],
-    ) -> list[UploadedFile]:
-        text_splitter = RecursiveCharacterTextSplitter(
+    def _get_text_splitter(self) -> RecursiveCharacterTextSplitter:
+        return RecursiveCharacterTextSplitter(
             separators=["\n"], chunk_size=1024, chunk_overlap=50
         )
 
-        all_documents: list[Document] = []
-        result: list[UploadedFile] = []
-
-        for file in list_of_files:
+    def iter_upload(self, files: Iterable[FileUpload]) -> Iterator[UploadedFile]:
+        """Stores, parses, splits, embeds and writes the files one by one, yielding
+        the result of every file as soon as its chunks are committed.
+
+        The stages run concurrently on consecutive files, connected by bounded
+        queues, so memory does not grow with the number of files and the files
+        written before a failure stay ingested.
+        """
+        text_splitter = self._get_text_splitter()
+
+        def store(file: FileUpload) -> StoredFile:
+            file_loader = self.store_file_and_get_loader(
+                file_content=file.file_content,
+                file_name=file.file_name,
+            )
+            # The file content is not needed past this stage
+            return StoredFile(
+                file_name=file.file_name,
+                custom_metadata=file.custom_metadata or {},
+                file_loader=file_loader,
+                cache_key=self._get_parsed_document_cache_key(
+                    file.file_content, file_loader
+                ),
+            )
+
+        def parse(stored: StoredFile) -> StoredFile:
             try:
-                file_content = file.file_content
-                file_name = file.file_name
-                custom_metadata = file.custom_metadata or {}
-
-                file_loader = self.store_file_and_get_loader(
-                    file_content=file_content,
-                    file_name=file_name,
-                )
-
-                documents = file_loader.load_and_split(
-                    text_splitter=text_splitter,
-                )
-
-                for document in documents:
-                    document.metadata = {
-                        **document.metadata,
-                        **custom_metadata,
-                    }
-                all_documents.extend(documents)
-                result.append(
-                    UploadedFile(
-                        file_name=file.file_name,
-                        url=self.get_url(file_name),
+                if stored.cache_key:
+                    stored.documents = self.parsed_document_cache.get(
+                        stored.cache_key, source=_get_source(stored.file_loader)
                     )
-                )
-            except Exception as e:
-                logger.error(e)
-                result.append(
-                    UploadedFile(
-                        file_name=file.file_name,
-                        error=e,
+                    if stored.documents is not None:
+                        stored.cache_key = None
+                        return stored
+                if self.document_parser is None:
+                    stored.documents = stored.file_loader.load()
+                else:
+                    # Only submitted here, so the next files are parsed in parallel
+                    stored.documents = self.document_parser.submit(
+                        stored.file_name, stored.file_loader
                     )
-                )
+                return stored
+            except Exception:
+                self._finish_store_after_error(stored)
+                raise
 
-        self.embeddings_database.save_as_embedding(
-            documents=all_documents,
+        def split(stored: StoredFile) -> StoredFile:
+            documents = stored.documents
+            try:
+                if isinstance(documents, ParseJob):
+                    documents = self.document_parser.result(documents)
+            except Exception:
+                self._finish_store_after_error(stored)
+                raise
+            self.finish_store(stored.file_loader)
+            if stored.cache_key:
+                try:
+                    self.parsed_document_cache.put(stored.cache_key, documents)
+                except Exception as e:
+                    logger.error("Failed to cache the parsed documents: %s", e)
+
+            chunks = text_splitter.split_documents(documents)
+            for chunk in chunks:
+                chunk.metadata = {
+                    **chunk.metadata,
+                    **stored.custom_metadata,
+                }
+            stored.documents = chunks
+            return stored
+
+        def embed(stored: StoredFile) -> Optional[EmbeddedChunks]:
+            # A file without text any more still has its previous chunks deleted
+            source = _get_source(stored.file_loader)
+            if not stored.documents and source is None:
+                return None
+            return self.embeddings_database.embed_chunks(
+                stored.documents, sources=[source] if source else None
+            )
+
+        def write(embedded: Optional[EmbeddedChunks]) -> IngestionReport:
+            if embedded is None:
+                return IngestionReport()
+            return self.embeddings_database.write_chunks(embedded)
+
+        pipeline = StagedIngestionPipeline(
+            stages=[
+                ("store", store),
+                ("parse", parse),
+                ("split", split),
+                ("embed", embed),
+                ("write", write),
+            ],
+            queue_size=self.queue_size,
+            queue_sizes=(
+                {"parse": self.document_parser.max_workers}
+                if self.document_parser
+                else None
+            ),
         )
+        for item in pipeline.run((file.file_name, file) for file in files):
+            if item.error is not None:
+                yield UploadedFile(file_name=item.file_name, error=item.error)
+                continue
+            yield UploadedFile(
+                file_name=item.file_name,
+                url=self.get_url(item.file_name),
+                ingestion_report=item.payload,
+            )
+
+    def upload_and_get_url(
+        self,
+        list_of_files: Iterable[FileUpload],
+    ) -> list[UploadedFile]:
+        result = list(self.iter_upload(list_of_files))
 
+        self.last_ingestion_report = sum(
+            (file.ingestion_report for file in result if file.ingestion_report),
+            IngestionReport(),
+        )
         return result
 
     @abstractmethod
@@ -103,6 +230,20 @@ class FilesUploaderBase:
     ) -> Union[S3FileLoader, UnstructuredFileLoader]:
         raise NotImplementedError()
 
+    def finish_store(self, file_loader: BaseLoader):
+        """Called once the file of the loader is parsed, or failed to be. Raises
+        when the file could not be stored."""
+
+    def _finish_store_after_error(self, stored: StoredFile):
+        # The parsing error is the one raised, a storing error is only logged
+        try:
+            self.finish_store(stored.file_loader)
+        except Exception as e:
+            logger.error("Failed to store %s: %s", stored.file_name, e)
+
+    def close(self):
+        """Releases what the uploader holds, once no upload runs any more."""
+
     def clear_context_db(self):
         self.embeddings_database.clear_table()
         self.clear_store()
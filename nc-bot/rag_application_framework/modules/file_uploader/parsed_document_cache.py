@@ -0,0 +1,141 @@
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from typing import Any, List, Optional
+
+from langchain.schema.document import Document
+from langchain_community.document_loaders.base import BaseLoader
+from rag_application_framework.logging.logging import Logging
+
+logger = Logging.get_logger(__name__)
+
+_SUFFIX = ".json.gz"
+
+
+class ParsedDocumentCache:
+    """Content addressed cache of the documents parsed from uploaded files.
+
+    Parsing, and the OCR of scanned PDFs, is by far the slowest step of ingestion,
+    so the documents of a file are kept on local disk as gzipped JSON, keyed by
+    the hash of the file content and a version of the parser configuration. A file
+    uploaded again, or re-ingested with other chunking parameters, is not parsed
+    again, while any change of loader, loader options or unstructured version
+    misses the cache. Least recently used entries are evicted once the cache
+    holds more than `max_bytes`.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = 1024 * 1024 * 1024) -> None:
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._size = sum(
+            entry.stat().st_size
+            for entry in os.scandir(cache_dir)
+            if entry.name.endswith(_SUFFIX)
+        )
+
+    @staticmethod
+    def version_key(loader: BaseLoader, **parser_options: Any) -> str:
+        """Version of the parser configuration producing the documents."""
+        try:
+            from unstructured import __version__ as unstructured_version
+        except ImportError:
+            unstructured_version = None
+        configuration = {
+            "loader": type(loader).__name__,
+            "mode": getattr(loader, "mode", None),
+            "unstructured_kwargs": getattr(loader, "unstructured_kwargs", None),
+            "unstructured": unstructured_version,
+            **parser_options,
+        }
+        return hashlib.sha256(
+            json.dumps(configuration, sort_keys=True, default=str).encode("utf-8")
+        ).hexdigest()[:16]
+
+    @staticmethod
+    def key(file_content: bytes, version: str) -> str:
+        return f"{hashlib.sha256(file_content).hexdigest()}-{version}"
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key + _SUFFIX)
+
+    def get(self, key: str, source: Optional[str]) -> Optional[List[Document]]:
+        """Cached documents of the file, with `source` as their source."""
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                entries = json.loads(gzip.decompress(f.read()))
+            # Marks the entry as recently used
+            os.utime(path)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except Exception as e:
+            logger.warning("Ignoring unreadable parsed document cache entry: %s", e)
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        documents = [
+            Document(page_content=content, metadata=metadata)
+            for content, metadata in entries
+        ]
+        if source is not None:
+            for doc in documents:
+                doc.metadata["source"] = source
+        return documents
+
+    def put(self, key: str, documents: List[Document]):
+        # The source is given back on reads, the same file may have another one
+        entries = [
+            (
+                doc.page_content,
+                {
+                    name: value
+                    for name, value in doc.metadata.items()
+                    if name != "source"
+                },
+            )
+            for doc in documents
+        ]
+        data = gzip.compress(
+            json.dumps(entries, default=str).encode("utf-8"), compresslevel=6
+        )
+        if len(data) > self.max_bytes:
+            return
+
+        path = self._path(key)
+        with tempfile.NamedTemporaryFile(dir=self.cache_dir, delete=False) as f:
+            f.write(data)
+        with self._lock:
+            previous_size = os.path.getsize(path) if os.path.exists(path) else 0
+            os.replace(f.name, path)
+            self._size += len(data) - previous_size
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        entries = sorted(
+            (
+                entry
+                for entry in os.scandir(self.cache_dir)
+                if entry.name.endswith(_SUFFIX)
+            ),
+            key=lambda entry: entry.stat().st_mtime,
+        )
+        for entry in entries:
+            if self._size <= self.max_bytes:
+                break
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+                self._size -= size
+            except OSError as e:
+                logger.warning("Failed to evict %s: %s", entry.path, e)
+        logger.info("Parsed document cache holds %s bytes", self._size)
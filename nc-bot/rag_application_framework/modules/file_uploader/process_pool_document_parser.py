@@ -0,0 +1,281 @@
+import multiprocessing
+import os
+import queue
+import signal
+import tempfile
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, List, Optional, Tuple
+
+from langchain.schema.document import Document
+from langchain_community.document_loaders.base import BaseLoader
+from langchain_community.document_loaders.unstructured import UnstructuredFileLoader
+from rag_application_framework.logging.logging import Logging
+
+logger = Logging.get_logger(__name__)
+
+ParsedDocuments = List[Tuple[str, dict]]
+_Task = Tuple[Future, Callable, tuple]
+
+
+def _record_pid(pid):
+    """Initializer of the worker processes, telling their lane the process id."""
+    pid.value = os.getpid()
+
+
+def _load(loader: BaseLoader) -> ParsedDocuments:
+    """Runs in a worker process. Documents are sent back as plain tuples."""
+    return [(doc.page_content, doc.metadata) for doc in loader.load()]
+
+
+def _load_pdf_pages(
+    file_path: str,
+    source: str,
+    start: int,
+    end: int,
+    mode: str,
+    unstructured_kwargs: dict,
+) -> ParsedDocuments:
+    """Runs in a worker process, parsing the pages [start, end) of a PDF."""
+    from pypdf import PdfReader, PdfWriter
+
+    writer = PdfWriter()
+    for page in PdfReader(file_path).pages[start:end]:
+        writer.add_page(page)
+    with tempfile.NamedTemporaryFile(suffix=".pdf") as pages_file:
+        writer.write(pages_file)
+        pages_file.flush()
+        loader = UnstructuredFileLoader(
+            file_path=pages_file.name, mode=mode, **unstructured_kwargs
+        )
+        documents = _load(loader)
+    for _, metadata in documents:
+        metadata["source"] = source
+        if mode == "elements" and "page_number" in metadata:
+            metadata["page_number"] += start
+    return documents
+
+
+class ParseJob:
+    """Documents of a file being parsed in the process pool."""
+
+    def __init__(
+        self,
+        file_name: str,
+        futures: List[Future],
+        merge_pages: bool,
+    ) -> None:
+        self.file_name = file_name
+        self.futures = futures
+        self.merge_pages = merge_pages
+
+    def result(self) -> List[Document]:
+        """Waits for every part of the file and merges them in page order.
+
+        Raises:
+            TimeoutError: When a part of the file is not parsed in time.
+        """
+        try:
+            parts: List[ParsedDocuments] = [future.result() for future in self.futures]
+        except BaseException:
+            # The other parts of the file are not needed anymore
+            for future in self.futures:
+                future.cancel()
+            raise
+
+        documents = [
+            Document(page_content=content, metadata=metadata)
+            for part in parts
+            for content, metadata in part
+        ]
+        if self.merge_pages and len(documents) > 1:
+            # In single mode a file is one document, whatever the page ranges
+            return [
+                Document(
+                    page_content="\n\n".join(doc.page_content for doc in documents),
+                    metadata=documents[0].metadata,
+                )
+            ]
+        return documents
+
+
+class _Lane:
+    """A single worker process, replaced on its own when its task is stuck."""
+
+    def __init__(self, mp_context) -> None:
+        self._mp_context = mp_context
+        self.executor, self._pid = self._new_executor()
+
+    def _new_executor(self):
+        # Set by the worker process once started, 0 until then
+        pid = self._mp_context.Value("i", 0)
+        executor = ProcessPoolExecutor(
+            max_workers=1,
+            mp_context=self._mp_context,
+            initializer=_record_pid,
+            initargs=(pid,),
+        )
+        return executor, pid
+
+    def replace(self):
+        executor, pid = self.executor, self._pid
+        self.executor, self._pid = self._new_executor()
+        # ProcessPoolExecutor cannot kill a running task, terminate its process
+        if pid.value:
+            try:
+                os.kill(pid.value, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        else:
+            logger.warning("Replacing a document parser worker that never started")
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+class ProcessPoolDocumentParser:
+    """Parses files with their loaders in a pool of worker processes.
+
+    Unstructured parsing, and the tesseract OCR of scanned PDFs, is CPU bound, so
+    the files of an upload are parsed in parallel processes, and local PDFs of more
+    than `pdf_pages_per_task` pages are split into page ranges parsed in parallel.
+    Each of the `max_workers` workers is a process of its own, fed one task at a
+    time, so a task must finish within `timeout` seconds of starting to run, not of
+    being submitted. The process of a stuck task is replaced without touching the
+    tasks of the other workers. Workers are started with forkserver, forking the
+    multi threaded application process is not safe.
+    """
+
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        timeout: float = 600.0,
+        pdf_pages_per_task: int = 20,
+    ) -> None:
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.timeout = timeout
+        self.pdf_pages_per_task = pdf_pages_per_task
+        self._tasks: "queue.Queue[Optional[_Task]]" = queue.Queue()
+        self._dispatchers: List[threading.Thread] = []
+        self._lanes: List[_Lane] = []
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def _start(self):
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("The document parser is closed")
+            if self._dispatchers:
+                return
+            mp_context = multiprocessing.get_context("forkserver")
+            for i in range(self.max_workers):
+                lane = _Lane(mp_context)
+                self._lanes.append(lane)
+                dispatcher = threading.Thread(
+                    target=self._dispatch,
+                    args=(lane,),
+                    name=f"document-parser-{i}",
+                    daemon=True,
+                )
+                dispatcher.start()
+                self._dispatchers.append(dispatcher)
+
+    def _dispatch(self, lane: _Lane):
+        """Runs the queued tasks on the lane, one at a time."""
+        while True:
+            task = self._tasks.get()
+            if task is None:
+                return
+            future, fn, args = task
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                lane_future = lane.executor.submit(fn, *args)
+                done, _ = wait([lane_future], timeout=self.timeout)
+                if not done:
+                    logger.warning(
+                        "Parsing task still running after %ss, replacing its worker",
+                        self.timeout,
+                    )
+                    lane.replace()
+                    future.set_exception(
+                        TimeoutError(f"Parsing did not finish within {self.timeout}s")
+                    )
+                    continue
+                future.set_result(lane_future.result())
+            except BrokenProcessPool as e:
+                # The worker died, e.g. killed for memory, start another one
+                lane.replace()
+                future.set_exception(e)
+            except Exception as e:
+                future.set_exception(e)
+
+    def _submit(self, fn: Callable, *args) -> Future:
+        future: Future = Future()
+        self._tasks.put((future, fn, args))
+        return future
+
+    def _pdf_page_ranges(self, file_path: str) -> List[Tuple[int, int]]:
+        from pypdf import PdfReader
+
+        page_count = len(PdfReader(file_path).pages)
+        return [
+            (start, min(start + self.pdf_pages_per_task, page_count))
+            for start in range(0, page_count, self.pdf_pages_per_task)
+        ]
+
+    def submit(self, file_name: str, loader: BaseLoader) -> ParseJob:
+        """Starts parsing the file of the loader and returns at once."""
+        self._start()
+        page_ranges: List[Tuple[int, int]] = []
+        if (
+            isinstance(loader, UnstructuredFileLoader)
+            and isinstance(loader.file_path, str)
+            and loader.file_path.lower().endswith(".pdf")
+            and self.pdf_pages_per_task > 0
+        ):
+            try:
+                page_ranges = self._pdf_page_ranges(loader.file_path)
+            except Exception as e:
+                # Unstructured may still read files pypdf cannot
+                logger.warning("Failed to count the pages of %s: %s", file_name, e)
+
+        if len(page_ranges) > 1:
+            futures = [
+                self._submit(
+                    _load_pdf_pages,
+                    loader.file_path,
+                    # The source of the file, which may not be its local path
+                    loader._get_metadata()["source"],
+                    start,
+                    end,
+                    loader.mode,
+                    loader.unstructured_kwargs,
+                )
+                for start, end in page_ranges
+            ]
+            merge_pages = loader.mode == "single"
+        else:
+            futures = [self._submit(_load, loader)]
+            merge_pages = False
+        return ParseJob(file_name=file_name, futures=futures, merge_pages=merge_pages)
+
+    def result(self, job: ParseJob) -> List[Document]:
+        return job.result()
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            dispatchers, self._dispatchers = self._dispatchers, []
+            lanes, self._lanes = self._lanes, []
+        # Fails the queued tasks, then stops every dispatcher
+        while True:
+            try:
+                task = self._tasks.get_nowait()
+            except queue.Empty:
+                break
+            if task is not None:
+                task[0].cancel()
+        for _ in dispatchers:
+            self._tasks.put(None)
+        for lane in lanes:
+            lane.executor.shutdown(wait=False, cancel_futures=True)
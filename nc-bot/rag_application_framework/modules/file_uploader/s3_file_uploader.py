@@ -1,5 +1,10 @@
+import os
+import tempfile
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
 from boto3.session import Session
-from langchain_community.document_loaders.s3_file import S3FileLoader
+from langchain_community.document_loaders.unstructured import UnstructuredFileLoader
 from langchain_community.embeddings.bedrock import BedrockEmbeddings
 from langchain_community.embeddings.huggingface import HuggingFaceEmbeddings
 from rag_application_framework.aws.aws_client_factory import AwsClientFactory
@@ -8,9 +13,43 @@ from rag_application_framework.db.embeddings_database import EmbeddingsDatabase
 from rag_application_framework.modules.file_uploader.file_uploader import (
     FilesUploaderBase,
 )
+from rag_application_framework.modules.file_uploader.parsed_document_cache import (
+    ParsedDocumentCache,
+)
+from rag_application_framework.modules.file_uploader.process_pool_document_parser import (
+    ProcessPoolDocumentParser,
+)
+
+
+from typing import Optional, Set, Union
+
+
+class SpooledS3FileLoader(UnstructuredFileLoader):
+    """Loads a local copy of a file being uploaded to S3.
+
+    The documents get the S3 url of the object as source, exactly as with
+    S3FileLoader, without downloading the object again.
+    """
 
+    def __init__(
+        self,
+        file_path: str,
+        bucket: str,
+        key: str,
+        upload: Optional[Future] = None,
+        **unstructured_kwargs,
+    ):
+        super().__init__(file_path=file_path, **unstructured_kwargs)
+        self.bucket = bucket
+        self.key = key
+        self.upload = upload
 
-from typing import Union
+    def _get_metadata(self) -> dict:
+        return {"source": f"s3://{self.bucket}/{self.key}"}
+
+    def __getstate__(self):
+        # Sent to the parsing processes, the upload future stays here
+        return {**self.__dict__, "upload": None}
 
 
 class S3FilesUploader(FilesUploaderBase):
@@ -20,36 +59,80 @@ class S3FilesUploader(FilesUploaderBase):
         embeddings_database: EmbeddingsDatabase,
         bucket_name: str,
         boto3_session: Session,
+        queue_size: int = 2,
+        document_parser: Optional[ProcessPoolDocumentParser] = None,
+        parsed_document_cache: Optional[ParsedDocumentCache] = None,
     ) -> None:
         super().__init__(
             embeddings=embeddings,
             embeddings_database=embeddings_database,
+            queue_size=queue_size,
+            document_parser=document_parser,
+            parsed_document_cache=parsed_document_cache,
         )
         self.bucket_name = bucket_name
         self.boto3_session = boto3_session
+        self._upload_executor = ThreadPoolExecutor(
+            max_workers=4, thread_name_prefix="s3-upload"
+        )
+        # Local copies not removed yet, a stopped ingestion may leave some behind
+        self._local_copies: Set[str] = set()
+        self._local_copies_lock = threading.Lock()
 
     def store_file_and_get_loader(
         self,
         file_content: bytes,
         file_name: str,
-    ) -> S3FileLoader:
+    ) -> SpooledS3FileLoader:
+        """Starts putting the file to S3 and returns a loader parsing a local copy
+        of it meanwhile, instead of downloading the object back."""
         s3_api = AwsClientFactory.build_from_boto_session(
             session=self.boto3_session, service_api_type=S3Api
         )
-
-        s3_api.put_object(
+        upload = self._upload_executor.submit(
+            s3_api.put_object,
             bucket_name=self.bucket_name,
             object_key=file_name,
             data=file_content,
         )
 
-        file_loader = S3FileLoader(
+        # The extension lets unstructured detect the file type
+        with tempfile.NamedTemporaryFile(
+            suffix=os.path.splitext(file_name)[1], delete=False
+        ) as local_copy:
+            with self._local_copies_lock:
+                self._local_copies.add(local_copy.name)
+            local_copy.write(file_content)
+
+        return SpooledS3FileLoader(
+            file_path=local_copy.name,
             bucket=self.bucket_name,
             key=file_name,
-            region_name=s3_api.client.meta.region_name,
+            upload=upload,
         )
 
-        return file_loader
+    def _remove_local_copy(self, file_path: str):
+        with self._local_copies_lock:
+            self._local_copies.discard(file_path)
+        try:
+            os.remove(file_path)
+        except OSError:
+            pass
+
+    def finish_store(self, file_loader: SpooledS3FileLoader):
+        """Removes the local copy and waits for the S3 put, raising its error."""
+        self._remove_local_copy(file_loader.file_path)
+        if file_loader.upload is not None:
+            file_loader.upload.result()
+
+    def close(self):
+        """Waits for the running S3 puts, cancels the others and removes the local
+        copies of the files an ingestion stopped before parsing."""
+        self._upload_executor.shutdown(wait=True, cancel_futures=True)
+        with self._local_copies_lock:
+            local_copies = list(self._local_copies)
+        for file_path in local_copies:
+            self._remove_local_copy(file_path)
 
     def clear_store(self):
         s3_api = AwsClientFactory.build_from_boto_session(
@@ -0,0 +1,122 @@
+import queue
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from rag_application_framework.logging.logging import Logging
+
+logger = Logging.get_logger(__name__)
+
+_END = object()
+
+
+@dataclass
+class StageItem:
+    """A file going through the pipeline. Once a stage fails, `error` is set and
+    the later stages pass the item on without running."""
+
+    file_name: str
+    payload: Any
+    error: Optional[Exception] = None
+
+
+class StagedIngestionPipeline:
+    """Runs files through a chain of stages, each in its own thread.
+
+    Stages are connected by queues of at most `queue_size` items (or the size
+    given for the stage in `queue_sizes`), so a stage blocks when the next one
+    falls behind. This backpressure keeps at most
+    queue_size + 1 files per stage in memory, whatever the number of files, while
+    the stages of different files overlap (one file is parsed while the previous
+    one is embedded). Items come out in the order they went in.
+    """
+
+    def __init__(
+        self,
+        stages: List[Tuple[str, Callable[[Any], Any]]],
+        queue_size: int = 2,
+        queue_sizes: Optional[Dict[str, int]] = None,
+    ) -> None:
+        self.stages = stages
+        self.queue_size = queue_size
+        self.queue_sizes = queue_sizes or {}
+
+    def run(self, items: Iterable[Tuple[str, Any]]) -> Iterator[StageItem]:
+        """Yields every (file_name, payload) item after the last stage."""
+        queues = [queue.Queue(maxsize=self.queue_size)]
+        for name, _ in self.stages:
+            # The output queue of a stage
+            queues.append(
+                queue.Queue(maxsize=self.queue_sizes.get(name, self.queue_size))
+            )
+        stopped = threading.Event()
+
+        def put(target: queue.Queue, item: Any) -> bool:
+            # Gives up when the consumer went away, instead of blocking forever
+            while not stopped.is_set():
+                try:
+                    target.put(item, timeout=0.5)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def get(source: queue.Queue) -> Any:
+            while not stopped.is_set():
+                try:
+                    return source.get(timeout=0.5)
+                except queue.Empty:
+                    continue
+            return _END
+
+        def feed():
+            try:
+                for file_name, payload in items:
+                    if not put(queues[0], StageItem(file_name, payload)):
+                        return
+            except Exception as e:
+                logger.error("Failed to read the files to ingest: %s", e)
+            put(queues[0], _END)
+
+        def run_stage(name: str, fn: Callable[[Any], Any], source, target):
+            while True:
+                item = get(source)
+                if item is _END:
+                    put(target, _END)
+                    return
+                if item.error is None:
+                    try:
+                        item.payload = fn(item.payload)
+                    except Exception as e:
+                        logger.error(
+                            "Ingestion stage %s failed for %s: %s",
+                            name,
+                            item.file_name,
+                            e,
+                        )
+                        item.payload = None
+                        item.error = e
+                if not put(target, item):
+                    return
+
+        threads = [threading.Thread(target=feed, daemon=True)]
+        for i, (name, fn) in enumerate(self.stages):
+            threads.append(
+                threading.Thread(
+                    target=run_stage,
+                    args=(name, fn, queues[i], queues[i + 1]),
+                    name=f"ingestion-{name}",
+                    daemon=True,
+                )
+            )
+        for thread in threads:
+            thread.start()
+
+        try:
+            while True:
+                item = queues[-1].get()
+                if item is _END:
+                    return
+                yield item
+        finally:
+            stopped.set()
@@ -0,0 +1,85 @@
+import threading
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+from langchain_core.callbacks import Callbacks
+from langchain_core.documents import Document
+from langchain_core.documents.compressor import BaseDocumentCompressor
+from rag_application_framework.logging.logging import Logging
+
+logger = Logging.get_logger(__name__)
+
+RERANK_SCORE_KEY = "rerank_score"
+
+
+class CrossEncoderModels:
+    """Cross encoder models loaded once per process and shared by all rerankers."""
+
+    _models: Dict[Tuple[str, bool, int], Any] = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def get(cls, model_name: str, quantize: bool, max_length: int) -> Any:
+        key = (model_name, quantize, max_length)
+        model = cls._models.get(key)
+        if model is None:
+            with cls._lock:
+                model = cls._models.get(key)
+                if model is None:
+                    model = cls._load(model_name, quantize, max_length)
+                    cls._models[key] = model
+        return model
+
+    @staticmethod
+    def _load(model_name: str, quantize: bool, max_length: int) -> Any:
+        # Imported here so torch is only loaded when reranking is enabled
+        import torch
+        from sentence_transformers import CrossEncoder
+
+        logger.info("Loading cross encoder %s (quantized: %s)", model_name, quantize)
+        model = CrossEncoder(model_name, max_length=max_length, device="cpu")
+        if quantize:
+            # int8 weights for the linear layers, about 2-3x faster on CPU
+            model.model = torch.quantization.quantize_dynamic(
+                model.model, {torch.nn.Linear}, dtype=torch.qint8
+            )
+        return model
+
+
+class CrossEncoderReranker(BaseDocumentCompressor):
+    """Reorders retrieved chunks by a cross encoder score and keeps the best `top_n`.
+
+    A cross encoder reads the question and the chunk together, which ranks chunks
+    better than the embedding similarity, so fewer chunks reach the prompt. The
+    score of every kept chunk is stored in its metadata under `rerank_score`.
+    """
+
+    model_name: str = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+    top_n: int = 3
+    batch_size: int = 16
+    max_length: int = 512
+    quantize: bool = True
+
+    def compress_documents(
+        self,
+        documents: Sequence[Document],
+        query: str,
+        callbacks: Optional[Callbacks] = None,
+    ) -> Sequence[Document]:
+        if not documents:
+            return []
+
+        model = CrossEncoderModels.get(self.model_name, self.quantize, self.max_length)
+        scores = model.predict(
+            [(query, document.page_content) for document in documents],
+            batch_size=self.batch_size,
+            show_progress_bar=False,
+        )
+
+        ranked = sorted(
+            zip(documents, scores), key=lambda pair: float(pair[1]), reverse=True
+        )
+        reranked = []
+        for document, score in ranked[: self.top_n]:
+            document.metadata[RERANK_SCORE_KEY] = float(score)
+            reranked.append(document)
+        return reranked
@@ -0,0 +1,134 @@
+import uuid
+from typing import Any, Dict, List, Tuple
+
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForRetrieverRun,
+    CallbackManagerForRetrieverRun,
+)
+from langchain_core.documents import Document
+from rag_application_framework.db.pgvector_bulk_writer import EMBEDDING_TABLE
+from rag_application_framework.db.vector_index_manager import (
+    collection_predicate,
+    embedding_expression,
+)
+from rag_application_framework.modules.retrieval.pgvector_sql_retriever import (
+    PgVectorSqlRetriever,
+    vector_literal,
+)
+from rag_application_framework.modules.retrieval.scored_mmr_retriever import (
+    SIMILARITY_SCORE_KEY,
+)
+
+RRF_SCORE_KEY = "rrf_score"
+
+
+class HybridRrfRetriever(PgVectorSqlRetriever):
+    """Retriever fusing a full text search with the vector search of a collection.
+
+    Exact terms like product codes and page titles are often missed by dense
+    embeddings, while the full text search finds them. Both searches run in a single
+    statement and their rankings are fused with reciprocal rank fusion,
+    score = sum(1 / (rrf_k + rank)). Chunks get the cosine similarity to the
+    question under `similarity_score` and the fused score under `rrf_score`. The
+    collection id is written into the statement as a literal, so the vector search
+    uses the partial index of the collection.
+    """
+
+    k: int = 5
+    vector_k: int = 20
+    lexical_k: int = 20
+    rrf_k: int = 60
+    text_search_config: str = "english"
+
+    def _build_query(
+        self, query: str, query_embedding: List[float], collection_id: uuid.UUID
+    ) -> Tuple[str, Dict[str, Any]]:
+        dimension = len(query_embedding)
+        collection_filter = collection_predicate(collection_id)
+        distance = (
+            f"{embedding_expression(dimension)} "
+            f"<=> %(embedding)s::text::vector({dimension})"
+        )
+        # Written as a literal, the expression must match the GIN index exactly
+        config = "".join(
+            c for c in self.text_search_config if c.isalnum() or c == "_"
+        )
+        tsvector = f"to_tsvector('{config}'::regconfig, document)"
+        tsquery = f"websearch_to_tsquery('{config}'::regconfig, %(query)s)"
+
+        sql = f"""
+        WITH vector_hits AS (
+            SELECT uuid, row_number() OVER (ORDER BY distance) AS rank
+            FROM (
+                SELECT uuid, {distance} AS distance
+                FROM {EMBEDDING_TABLE}
+                WHERE {collection_filter}
+                ORDER BY {distance}
+                LIMIT %(vector_k)s
+            ) nearest
+        ),
+        lexical_hits AS (
+            SELECT uuid, row_number() OVER (ORDER BY text_rank DESC) AS rank
+            FROM (
+                SELECT uuid, ts_rank_cd({tsvector}, {tsquery}) AS text_rank
+                FROM {EMBEDDING_TABLE}
+                WHERE {collection_filter} AND {tsvector} @@ {tsquery}
+                ORDER BY text_rank DESC
+                LIMIT %(lexical_k)s
+            ) matching
+        ),
+        fused AS (
+            SELECT COALESCE(v.uuid, l.uuid) AS uuid,
+                   COALESCE(1.0 / (%(rrf_k)s + v.rank), 0)
+                   + COALESCE(1.0 / (%(rrf_k)s + l.rank), 0) AS rrf_score
+            FROM vector_hits v
+            FULL OUTER JOIN lexical_hits l ON v.uuid = l.uuid
+            ORDER BY rrf_score DESC
+            LIMIT %(k)s
+        )
+        SELECT e.document, e.cmetadata, {distance} AS distance, fused.rrf_score
+        FROM fused
+        JOIN {EMBEDDING_TABLE} e ON e.uuid = fused.uuid
+        ORDER BY fused.rrf_score DESC
+        """
+        parameters = {
+            "embedding": vector_literal(query_embedding),
+            "query": query,
+            "vector_k": self.vector_k,
+            "lexical_k": self.lexical_k,
+            "rrf_k": self.rrf_k,
+            "k": self.k,
+        }
+        return sql, parameters
+
+    def _to_documents(self, rows: List[tuple]) -> List[Document]:
+        documents = []
+        for content, metadata, distance, rrf_score in rows:
+            metadata = self._metadata(metadata)
+            # Cosine relevance, as PGVector's _cosine_relevance_score_fn
+            metadata[SIMILARITY_SCORE_KEY] = 1.0 - float(distance)
+            metadata[RRF_SCORE_KEY] = float(rrf_score)
+            documents.append(Document(page_content=content, metadata=metadata))
+        return documents
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        query_embedding = self.embeddings.embed_query(query)
+        rows = self._query_collection(
+            lambda collection_id: self._build_query(
+                query, query_embedding, collection_id
+            )
+        )
+        return self._to_documents(rows)
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        query_embedding = await self.embeddings.aembed_query(query)
+        rows = await self._aquery_collection(
+            lambda collection_id: self._build_query(
+                query, query_embedding, collection_id
+            )
+        )
+        return self._to_documents(rows)
@@ -0,0 +1,115 @@
+import json
+import re
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from langchain.schema.embeddings import Embeddings
+from langchain_core.pydantic_v1 import PrivateAttr
+from langchain_core.retrievers import BaseRetriever
+from rag_application_framework.db.pgvector_bulk_writer import COLLECTION_TABLE
+from rag_application_framework.db.psycopg_connection_factory import (
+    PsycopgConnectionFactory,
+)
+
+_NAMED_PARAMETER = re.compile(r"%\((\w+)\)s")
+_COLLECTION_ID_SQL = f"SELECT uuid FROM {COLLECTION_TABLE} WHERE name = %(name)s"
+
+
+def to_positional(sql: str, parameters: Dict[str, Any]) -> Tuple[str, List[Any]]:
+    """Rewrites psycopg style %(name)s parameters into asyncpg's $1, $2 ..."""
+    names: List[str] = []
+
+    def replace(match: re.Match) -> str:
+        if match.group(1) not in names:
+            names.append(match.group(1))
+        return f"${names.index(match.group(1)) + 1}"
+
+    return _NAMED_PARAMETER.sub(replace, sql), [parameters[name] for name in names]
+
+
+def vector_literal(embedding: List[float]) -> str:
+    return "[" + ",".join(str(float(value)) for value in embedding) + "]"
+
+
+class PgVectorSqlRetriever(BaseRetriever):
+    """Base of the retrievers querying the langchain pgvector tables with SQL.
+
+    Statements are written with psycopg parameters and run either on the psycopg
+    pool or, from coroutines, on the asyncpg pool of the connection factory. The
+    collection id is looked up once and written into the statements as a literal,
+    so the planner can use the partial vector index of the collection. A statement
+    returning no rows looks the id up again, in case the collection was deleted and
+    created again under another id.
+    """
+
+    connection_factory: PsycopgConnectionFactory
+    embeddings: Embeddings
+    collection_name: str
+
+    _collection_id: Optional[uuid.UUID] = PrivateAttr(default=None)
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    def _fetch_all(self, sql: str, parameters: Dict[str, Any]) -> List[tuple]:
+        with self.connection_factory.connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(sql, parameters)
+                return cursor.fetchall()
+
+    async def _afetch_all(self, sql: str, parameters: Dict[str, Any]) -> List[tuple]:
+        pool = await self.connection_factory.async_pool.get_pool()
+        positional_sql, arguments = to_positional(sql, parameters)
+        async with pool.acquire() as conn:
+            rows = await conn.fetch(positional_sql, *arguments)
+        return [tuple(row) for row in rows]
+
+    def _get_collection_id(self) -> Optional[uuid.UUID]:
+        if self._collection_id is None:
+            rows = self._fetch_all(_COLLECTION_ID_SQL, {"name": self.collection_name})
+            self._collection_id = uuid.UUID(str(rows[0][0])) if rows else None
+        return self._collection_id
+
+    async def _aget_collection_id(self) -> Optional[uuid.UUID]:
+        if self._collection_id is None:
+            rows = await self._afetch_all(
+                _COLLECTION_ID_SQL, {"name": self.collection_name}
+            )
+            self._collection_id = uuid.UUID(str(rows[0][0])) if rows else None
+        return self._collection_id
+
+    def _query_collection(
+        self, build_query: Callable[[uuid.UUID], Tuple[str, Dict[str, Any]]]
+    ) -> List[tuple]:
+        """Runs the statement built for the collection id, none without collection."""
+        collection_id = self._get_collection_id()
+        if collection_id is None:
+            return []
+        rows = self._fetch_all(*build_query(collection_id))
+        if not rows:
+            self._collection_id = None
+            current_id = self._get_collection_id()
+            if current_id is not None and current_id != collection_id:
+                rows = self._fetch_all(*build_query(current_id))
+        return rows
+
+    async def _aquery_collection(
+        self, build_query: Callable[[uuid.UUID], Tuple[str, Dict[str, Any]]]
+    ) -> List[tuple]:
+        collection_id = await self._aget_collection_id()
+        if collection_id is None:
+            return []
+        rows = await self._afetch_all(*build_query(collection_id))
+        if not rows:
+            self._collection_id = None
+            current_id = await self._aget_collection_id()
+            if current_id is not None and current_id != collection_id:
+                rows = await self._afetch_all(*build_query(current_id))
+        return rows
+
+    @staticmethod
+    def _metadata(value: Any) -> dict:
+        # psycopg2 decodes json columns, asyncpg returns them as text
+        if isinstance(value, str):
+            return json.loads(value)
+        return dict(value or {})
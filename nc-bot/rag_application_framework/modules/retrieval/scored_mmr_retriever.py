@@ -0,0 +1,39 @@
+from typing import List
+
+from langchain_community.vectorstores.pgvector import PGVector
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+SIMILARITY_SCORE_KEY = "similarity_score"
+
+
+class ScoredMmrRetriever(BaseRetriever):
+    """MMR retriever over a PGVector store that keeps the relevance of every chunk.
+
+    The similarity of each returned chunk to the question (1 is identical) is stored
+    in its metadata under `similarity_score`, so later stages can reason about how
+    relevant the retrieved context is.
+    """
+
+    vector_store: PGVector
+    k: int = 5
+    fetch_k: int = 30
+    lambda_mult: float = 0.5
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        relevance_score_fn = self.vector_store._select_relevance_score_fn()
+        docs_and_distances = self.vector_store.max_marginal_relevance_search_with_score(
+            query, k=self.k, fetch_k=self.fetch_k, lambda_mult=self.lambda_mult
+        )
+
+        documents = []
+        for document, distance in docs_and_distances:
+            document.metadata[SIMILARITY_SCORE_KEY] = relevance_score_fn(distance)
+            documents.append(document)
+        return documents
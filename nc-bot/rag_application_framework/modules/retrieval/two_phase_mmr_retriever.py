@@ -0,0 +1,146 @@
+import uuid
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForRetrieverRun,
+    CallbackManagerForRetrieverRun,
+)
+from langchain_core.documents import Document
+from rag_application_framework.db.pgvector_bulk_writer import EMBEDDING_TABLE
+from rag_application_framework.db.vector_index_manager import (
+    collection_predicate,
+    embedding_expression,
+)
+from rag_application_framework.modules.retrieval.pgvector_sql_retriever import (
+    PgVectorSqlRetriever,
+    vector_literal,
+)
+from rag_application_framework.modules.retrieval.scored_mmr_retriever import (
+    SIMILARITY_SCORE_KEY,
+)
+
+_CONTENT_SQL = f"""
+SELECT uuid, document, cmetadata FROM {EMBEDDING_TABLE}
+WHERE uuid = ANY(%(ids)s::text[]::uuid[])
+"""
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+def maximal_marginal_relevance(
+    query_vector: np.ndarray, candidates: np.ndarray, k: int, lambda_mult: float
+) -> List[int]:
+    """Indexes of the candidates picked by MMR, in the order they were picked."""
+    if not len(candidates) or k <= 0:
+        return []
+    query_similarities = candidates @ query_vector
+    pairwise_similarities = candidates @ candidates.T
+
+    selected = [int(np.argmax(query_similarities))]
+    # Highest similarity of every candidate to any selected candidate so far
+    redundancy = pairwise_similarities[selected[0]].copy()
+    while len(selected) < min(k, len(candidates)):
+        scores = lambda_mult * query_similarities - (1 - lambda_mult) * redundancy
+        scores[selected] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        np.maximum(redundancy, pairwise_similarities[best], out=redundancy)
+    return selected
+
+
+class TwoPhaseMmrRetriever(PgVectorSqlRetriever):
+    """MMR retriever that only fetches the content of the chunks it returns.
+
+    The first query returns the ids and the binary float32 vectors of the
+    `fetch_k` nearest chunks, MMR runs on them in NumPy, and a second query fetches
+    the content and metadata of the `k` selected chunks. Chunks get their cosine
+    similarity to the question under `similarity_score`. The first query filters
+    on the literal collection id, so it uses the partial index of the collection.
+    """
+
+    k: int = 5
+    fetch_k: int = 30
+    lambda_mult: float = 0.5
+
+    def _candidates_query(
+        self, query_embedding: List[float], collection_id: uuid.UUID
+    ) -> Tuple[str, Dict[str, Any]]:
+        dimension = len(query_embedding)
+        sql = f"""
+        SELECT uuid, vector_send(embedding)
+        FROM {EMBEDDING_TABLE}
+        WHERE {collection_predicate(collection_id)}
+        ORDER BY {embedding_expression(dimension)}
+            <=> %(embedding)s::text::vector({dimension})
+        LIMIT %(fetch_k)s
+        """
+        return sql, {
+            "embedding": vector_literal(query_embedding),
+            "fetch_k": self.fetch_k,
+        }
+
+    def _select(
+        self, query_embedding: List[float], candidates: List[tuple]
+    ) -> Tuple[List[str], np.ndarray]:
+        """Runs MMR on the candidates, returning the selected ids and similarities."""
+        # pgvector's binary format: dimensions, unused, big endian float4
+        vectors = np.vstack(
+            [
+                np.frombuffer(bytes(data), dtype=">f4", offset=4)
+                for _, data in candidates
+            ]
+        ).astype(np.float32)
+        vectors = _normalize_rows(vectors)
+        query_vector = _normalize_rows(np.asarray(query_embedding, dtype=np.float32))
+        selected = maximal_marginal_relevance(
+            query_vector, vectors, self.k, self.lambda_mult
+        )
+        return (
+            [str(candidates[i][0]) for i in selected],
+            vectors[selected] @ query_vector,
+        )
+
+    def _to_documents(
+        self, selected_ids: List[str], similarities: np.ndarray, rows: List[tuple]
+    ) -> List[Document]:
+        contents = {str(row[0]): row[1:] for row in rows}
+        documents = []
+        for chunk_id, similarity in zip(selected_ids, similarities):
+            if chunk_id not in contents:
+                # Deleted between the two queries
+                continue
+            content, metadata = contents[chunk_id]
+            metadata = self._metadata(metadata)
+            metadata[SIMILARITY_SCORE_KEY] = float(similarity)
+            documents.append(Document(page_content=content, metadata=metadata))
+        return documents
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        query_embedding = self.embeddings.embed_query(query)
+        candidates = self._query_collection(
+            lambda collection_id: self._candidates_query(query_embedding, collection_id)
+        )
+        if not candidates:
+            return []
+        selected_ids, similarities = self._select(query_embedding, candidates)
+        rows = self._fetch_all(_CONTENT_SQL, {"ids": selected_ids})
+        return self._to_documents(selected_ids, similarities, rows)
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        query_embedding = await self.embeddings.aembed_query(query)
+        candidates = await self._aquery_collection(
+            lambda collection_id: self._candidates_query(query_embedding, collection_id)
+        )
+        if not candidates:
+            return []
+        selected_ids, similarities = self._select(query_embedding, candidates)
+        rows = await self._afetch_all(_CONTENT_SQL, {"ids": selected_ids})
+        return self._to_documents(selected_ids, similarities, rows)
@@ -0,0 +1,344 @@
+import asyncio
+import json
+from dataclasses import asdict, dataclass, field
+from typing import AsyncIterator, Optional
+
+from aiohttp import WSMsgType, web
+from rag_application_framework.config.app_config import ServingConfig
+from rag_application_framework.context.app_context import AppContext
+from rag_application_framework.logging.logging import Logging
+
+logger = Logging.get_logger(__name__)
+
+
+class QueueFullError(Exception):
+    pass
+
+
+@dataclass
+class _Job:
+    question: str
+    deadline: float
+    result: asyncio.Future
+    tokens: Optional[asyncio.Queue] = field(default=None)
+    # The task answering the question, once a worker took the job
+    task: Optional[asyncio.Task] = field(default=None)
+
+    def cancel(self):
+        """Gives up the job, freeing its worker when it is already running."""
+        self.result.cancel()
+        if self.task is not None:
+            self.task.cancel()
+
+
+class RagHttpServer:
+    """Serves BotRagPipeline over HTTP, independently of the Streamlit dashboard.
+
+    Questions are put on a bounded queue and answered by a fixed number of workers,
+    so at most `max_concurrency` questions run against the models at once and
+    requests are rejected with 503 once `max_queue_size` are waiting. Every request
+    has a deadline, answered with 504 when it passes, whether the question was
+    still waiting or already running. A question whose client went away is
+    cancelled, so it does not hold a worker until its deadline.
+
+    Endpoints:
+        POST /v1/infer   {"question": ...} -> JSON answer and sources
+        POST /v1/stream  {"question": ...} -> server sent events, token then result
+        GET  /v1/ws      WebSocket, one {"question": ...} message per question
+        GET  /health     liveness
+        GET  /ready      readiness: pipeline built, database reachable, queue not full,
+                         with the embedding cache and intent router counters
+    """
+
+    def __init__(
+        self, serving_config: ServingConfig, app_context: Optional[AppContext] = None
+    ) -> None:
+        self.serving_config = serving_config
+        self.app_context = app_context or AppContext.get_instance()
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers = []
+        self._ready = False
+
+    def build_app(self) -> web.Application:
+        app = web.Application()
+        app.add_routes(
+            [
+                web.post("/v1/infer", self.handle_infer),
+                web.post("/v1/stream", self.handle_stream),
+                web.get("/v1/ws", self.handle_websocket),
+                web.get("/health", self.handle_health),
+                web.get("/ready", self.handle_ready),
+            ]
+        )
+        app.on_startup.append(self._on_startup)
+        app.on_cleanup.append(self._on_cleanup)
+        return app
+
+    def run(self):
+        web.run_app(
+            self.build_app(),
+            host=self.serving_config.host,
+            port=self.serving_config.port,
+        )
+
+    async def _on_startup(self, app: web.Application):
+        self._queue = asyncio.Queue(maxsize=self.serving_config.max_queue_size)
+        self._workers = [
+            asyncio.create_task(self._worker())
+            for _ in range(self.serving_config.max_concurrency)
+        ]
+        # Build the pipeline before taking traffic, it loads models and clients
+        await asyncio.to_thread(
+            lambda: self.app_context.bot_rag_pipeline.get_components()
+        )
+        self._ready = True
+        logger.info(
+            "Serving with %s workers and a queue of %s",
+            self.serving_config.max_concurrency,
+            self.serving_config.max_queue_size,
+        )
+
+    async def _on_cleanup(self, app: web.Application):
+        self._ready = False
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        await asyncio.to_thread(self.app_context.close)
+
+    def _submit(self, question: str, timeout: float, stream: bool) -> _Job:
+        loop = asyncio.get_running_loop()
+        job = _Job(
+            question=question,
+            deadline=loop.time() + timeout,
+            result=loop.create_future(),
+            tokens=asyncio.Queue(maxsize=256) if stream else None,
+        )
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise QueueFullError()
+        return job
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await self._queue.get()
+            try:
+                if job.result.done():
+                    # The client went away or gave up while the job was queued
+                    continue
+                remaining = job.deadline - loop.time()
+                if remaining <= 0:
+                    raise asyncio.TimeoutError()
+                job.task = asyncio.ensure_future(self._run(job))
+                done, _ = await asyncio.wait({job.task}, timeout=remaining)
+                if not done:
+                    job.task.cancel()
+                    raise asyncio.TimeoutError()
+                if not job.task.cancelled() and job.task.exception() is not None:
+                    raise job.task.exception()
+            except asyncio.CancelledError:
+                job.cancel()
+                raise
+            except Exception as e:
+                if not job.result.done():
+                    job.result.set_exception(e)
+            finally:
+                if not job.result.done():
+                    # Cancelled by the client while running
+                    job.result.cancel()
+                self._queue.task_done()
+
+    async def _run(self, job: _Job):
+        pipeline = self.app_context.bot_rag_pipeline
+        if job.tokens is None:
+            result = await pipeline.ainfer(job.question)
+        else:
+            response = await pipeline.astream(job.question)
+            async for token in response:
+                await job.tokens.put(token)
+            result = response.result
+        if not job.result.done():
+            job.result.set_result(result)
+
+    @staticmethod
+    async def _iterate_tokens(job: _Job) -> AsyncIterator[str]:
+        """Yields the tokens of a streamed job until the job is done."""
+        while True:
+            next_token = asyncio.ensure_future(job.tokens.get())
+            await asyncio.wait(
+                {next_token, job.result}, return_when=asyncio.FIRST_COMPLETED
+            )
+            if next_token.done():
+                yield next_token.result()
+                continue
+            next_token.cancel()
+            # The result is only set once every token was put on the queue
+            while not job.tokens.empty():
+                yield job.tokens.get_nowait()
+            return
+
+    def _timeout(self, body: dict) -> float:
+        timeout = self.serving_config.request_timeout
+        if body.get("timeout_seconds"):
+            try:
+                timeout = min(timeout, float(body["timeout_seconds"]))
+            except (TypeError, ValueError):
+                raise web.HTTPBadRequest(text="timeout_seconds must be a number")
+        return timeout
+
+    @staticmethod
+    async def _read_question(request: web.Request) -> dict:
+        try:
+            body = await request.json()
+        except json.JSONDecodeError:
+            raise web.HTTPBadRequest(text="The request body must be JSON")
+        if not isinstance(body, dict) or not str(body.get("question", "")).strip():
+            raise web.HTTPBadRequest(text="A non empty question is required")
+        return body
+
+    @staticmethod
+    def _to_response(result: dict) -> dict:
+        return {
+            "question": result["question"],
+            "answer": result["result"],
+            "source_documents": [asdict(doc) for doc in result["source_documents"]],
+        }
+
+    @staticmethod
+    def _error(e: BaseException) -> web.Response:
+        if isinstance(e, web.HTTPClientError):
+            return web.json_response({"error": e.text}, status=e.status)
+        if isinstance(e, QueueFullError):
+            return web.json_response(
+                {"error": "Too many questions waiting, retry later"},
+                status=503,
+                headers={"Retry-After": "1"},
+            )
+        if isinstance(e, asyncio.TimeoutError):
+            return web.json_response({"error": "Deadline exceeded"}, status=504)
+        logger.error("Failed to answer the question: %s", e)
+        return web.json_response({"error": "Internal error"}, status=500)
+
+    @staticmethod
+    def _is_disconnected(request: web.Request) -> bool:
+        transport = request.transport
+        return transport is None or transport.is_closing()
+
+    async def _await_result(
+        self, job: _Job, timeout: float, request: Optional[web.Request] = None
+    ) -> dict:
+        """Waits for the result of the job, cancelling the job when the wait ends
+        early: on timeout, on cancellation or when the client of `request`
+        disconnects, which aiohttp does not tell the handler about."""
+        loop = asyncio.get_running_loop()
+        # A little longer than the deadline, the worker enforces it exactly
+        deadline = loop.time() + timeout + 1
+        try:
+            while not job.result.done():
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    raise asyncio.TimeoutError()
+                await asyncio.wait({job.result}, timeout=min(remaining, 0.5))
+                if request is not None and self._is_disconnected(request):
+                    raise ConnectionResetError("The client disconnected")
+            return job.result.result()
+        except BaseException:
+            job.cancel()
+            raise
+
+    async def handle_infer(self, request: web.Request) -> web.Response:
+        body = await self._read_question(request)
+        timeout = self._timeout(body)
+        try:
+            job = self._submit(body["question"], timeout, stream=False)
+            result = await self._await_result(job, timeout, request)
+        except ConnectionResetError:
+            raise
+        except Exception as e:
+            return self._error(e)
+        return web.json_response(self._to_response(result))
+
+    async def handle_stream(self, request: web.Request) -> web.StreamResponse:
+        body = await self._read_question(request)
+        timeout = self._timeout(body)
+        try:
+            job = self._submit(body["question"], timeout, stream=True)
+        except Exception as e:
+            return self._error(e)
+
+        response = web.StreamResponse(
+            headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"}
+        )
+        await response.prepare(request)
+        try:
+            async for token in self._iterate_tokens(job):
+                await response.write(
+                    f"event: token\ndata: {json.dumps(token)}\n\n".encode("utf-8")
+                )
+            result = await self._await_result(job, 0)
+            event, data = "result", self._to_response(result)
+        except (ConnectionResetError, asyncio.CancelledError):
+            job.cancel()
+            raise
+        except Exception as e:
+            event, data = "error", json.loads(self._error(e).text)
+        await response.write(
+            f"event: {event}\ndata: {json.dumps(data)}\n\n".encode("utf-8")
+        )
+        await response.write_eof()
+        return response
+
+    async def handle_websocket(self, request: web.Request) -> web.WebSocketResponse:
+        websocket = web.WebSocketResponse(heartbeat=30)
+        await websocket.prepare(request)
+        async for message in websocket:
+            if message.type != WSMsgType.TEXT:
+                continue
+            try:
+                body = json.loads(message.data)
+                question = str(body.get("question", "")).strip()
+            except (json.JSONDecodeError, AttributeError):
+                question = ""
+            if not question:
+                await websocket.send_json(
+                    {"type": "error", "error": "A non empty question is required"}
+                )
+                continue
+
+            try:
+                timeout = self._timeout(body)
+                job = self._submit(question, timeout, stream=True)
+                async for token in self._iterate_tokens(job):
+                    await websocket.send_json({"type": "token", "token": token})
+                result = await self._await_result(job, 0)
+                await websocket.send_json(
+                    {"type": "result", **self._to_response(result)}
+                )
+            except (ConnectionResetError, asyncio.CancelledError):
+                job.cancel()
+                raise
+            except Exception as e:
+                await websocket.send_json(
+                    {"type": "error", **json.loads(self._error(e).text)}
+                )
+        return websocket
+
+    async def handle_health(self, request: web.Request) -> web.Response:
+        return web.json_response({"status": "ok"})
+
+    async def handle_ready(self, request: web.Request) -> web.Response:
+        checks = {
+            "pipeline": self._ready,
+            "queue": self._queue is not None and not self._queue.full(),
+            "database": self._ready
+            and await asyncio.to_thread(self.app_context.health_check),
+        }
+        return web.json_response(
+            {
+                "ready": all(checks.values()),
+                "checks": checks,
+                "stats": self.app_context.stats() if self._ready else {},
+            },
+            status=200 if all(checks.values()) else 503,
+        )
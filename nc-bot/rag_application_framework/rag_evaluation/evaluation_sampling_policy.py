@@ -0,0 +1,142 @@
+import random
+import threading
+from abc import ABC, abstractmethod
+from collections import deque
+from time import monotonic
+from typing import Deque, Dict, List, Optional, Tuple
+
+from rag_application_framework.config.app_config import EvaluationConfig
+from rag_application_framework.logging.logging import Logging
+
+logger = Logging.get_logger(__name__)
+
+# The judge is called once per ragas metric and answer_relevancy generates
+# questions as well, so a run costs roughly five prompts of its own size.
+JUDGE_CALLS_PER_RUN = 5
+CHARS_PER_TOKEN = 4
+
+
+def estimate_judge_tokens(run_data: dict) -> int:
+    """Rough number of judge model tokens needed to evaluate a run."""
+    characters = (
+        len(run_data.get("question", ""))
+        + sum(len(context) for context in run_data.get("contexts", []))
+        + len(run_data.get("output_text", ""))
+    )
+    return JUDGE_CALLS_PER_RUN * (characters // CHARS_PER_TOKEN + 1)
+
+
+class EvaluationSamplingPolicy(ABC):
+    """Decides whether a RAG run is sent to the judge model for evaluation."""
+
+    @abstractmethod
+    def should_evaluate(self, run_data: dict) -> bool:
+        raise NotImplementedError()
+
+
+class FixedRateSamplingPolicy(EvaluationSamplingPolicy):
+    def __init__(self, rate: float) -> None:
+        self.rate = rate
+
+    def should_evaluate(self, run_data: dict) -> bool:
+        return random.random() < self.rate
+
+
+class PerModelRateSamplingPolicy(EvaluationSamplingPolicy):
+    """Samples with a rate per inference model id, falling back to a default rate."""
+
+    def __init__(self, model_rates: Dict[str, float], default_rate: float) -> None:
+        self.model_rates = model_rates
+        self.default_rate = default_rate
+
+    def should_evaluate(self, run_data: dict) -> bool:
+        model = run_data.get("model_id") or run_data.get("model_type")
+        rate = self.model_rates.get(str(model), self.default_rate)
+        return random.random() < rate
+
+
+class TokenBudgetSamplingPolicy(EvaluationSamplingPolicy):
+    """Allows evaluations while the estimated judge tokens of the last minute stay
+    within `tokens_per_minute`."""
+
+    def __init__(self, tokens_per_minute: int, window_seconds: float = 60.0) -> None:
+        self.tokens_per_minute = tokens_per_minute
+        self.window_seconds = window_seconds
+        self._spent: Deque[Tuple[float, int]] = deque()
+        self._spent_total = 0
+        self._lock = threading.Lock()
+
+    def should_evaluate(self, run_data: dict) -> bool:
+        tokens = estimate_judge_tokens(run_data)
+        now = monotonic()
+        with self._lock:
+            while self._spent and now - self._spent[0][0] > self.window_seconds:
+                self._spent_total -= self._spent.popleft()[1]
+            if self._spent_total + tokens > self.tokens_per_minute:
+                return False
+            self._spent.append((now, tokens))
+            self._spent_total += tokens
+            return True
+
+
+class AllOfSamplingPolicy(EvaluationSamplingPolicy):
+    """Evaluates a run only if every policy agrees, asking them in order."""
+
+    def __init__(self, policies: List[EvaluationSamplingPolicy]) -> None:
+        self.policies = policies
+
+    def should_evaluate(self, run_data: dict) -> bool:
+        return all(policy.should_evaluate(run_data) for policy in self.policies)
+
+
+class LowSimilarityOverridePolicy(EvaluationSamplingPolicy):
+    """Always evaluates runs whose best retrieved chunk is less similar to the
+    question than `similarity_threshold`, and asks `policy` for all others."""
+
+    def __init__(
+        self, policy: EvaluationSamplingPolicy, similarity_threshold: float
+    ) -> None:
+        self.policy = policy
+        self.similarity_threshold = similarity_threshold
+
+    def should_evaluate(self, run_data: dict) -> bool:
+        similarity = run_data.get("retrieval_similarity")
+        if similarity is not None and similarity < self.similarity_threshold:
+            return True
+        return self.policy.should_evaluate(run_data)
+
+
+class EvaluationSamplingPolicyFactory:
+    @staticmethod
+    def build_from_config(
+        evaluation_config: EvaluationConfig,
+    ) -> Optional[EvaluationSamplingPolicy]:
+        """Builds the policy described by the config, or None to evaluate every run."""
+        policies: List[EvaluationSamplingPolicy] = []
+
+        if evaluation_config.model_sample_rates:
+            policies.append(
+                PerModelRateSamplingPolicy(
+                    model_rates=evaluation_config.model_sample_rates,
+                    default_rate=evaluation_config.sample_rate,
+                )
+            )
+        elif evaluation_config.sample_rate < 1.0:
+            policies.append(FixedRateSamplingPolicy(evaluation_config.sample_rate))
+
+        if evaluation_config.token_budget_per_minute:
+            policies.append(
+                TokenBudgetSamplingPolicy(evaluation_config.token_budget_per_minute)
+            )
+
+        if not policies:
+            return None
+
+        policy: EvaluationSamplingPolicy = (
+            policies[0] if len(policies) == 1 else AllOfSamplingPolicy(policies)
+        )
+        if evaluation_config.low_similarity_threshold is not None:
+            policy = LowSimilarityOverridePolicy(
+                policy, evaluation_config.low_similarity_threshold
+            )
+        return policy
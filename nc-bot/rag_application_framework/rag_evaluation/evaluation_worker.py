@@ -0,0 +1,207 @@
+import queue
+import random
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+from enum import Enum
+from typing import Dict, List, Optional
+
+import sqlalchemy
+from rag_application_framework.db.models.models import RagEvaluationJob
+from rag_application_framework.logging.logging import Logging
+from rag_application_framework.rag_evaluation.rag_score_writer import RagScoreWriter
+from sqlalchemy import or_, select
+from sqlalchemy.orm import Session
+
+logger = Logging.get_logger(__name__)
+
+
+class OverflowPolicy(Enum):
+    DROP = "drop"
+    SAMPLE = "sample"
+    PERSIST = "persist"
+
+
+class EvaluationWorker:
+    """Evaluates RAG runs in background threads so answers are returned without
+    waiting for the judge model.
+
+    Runs are put on a bounded in-process queue. When it is full, `overflow_policy`
+    decides what happens: DROP discards the run, PERSIST writes it to the
+    rag_evaluation_job table, and SAMPLE persists only `overflow_sample_rate` of the
+    runs and drops the rest. Idle workers pick up persisted jobs, so they survive a
+    busy period or a restart of the process.
+    """
+
+    def __init__(
+        self,
+        score_writer: RagScoreWriter,
+        engine: sqlalchemy.engine.Engine,
+        num_workers: int = 2,
+        max_queue_size: int = 100,
+        overflow_policy: OverflowPolicy = OverflowPolicy.PERSIST,
+        overflow_sample_rate: float = 0.1,
+        submit_timeout: float = 0.0,
+        poll_interval: float = 5.0,
+        max_attempts: int = 3,
+        job_lease: timedelta = timedelta(minutes=10),
+    ) -> None:
+        self.score_writer = score_writer
+        self.engine = engine
+        self.num_workers = num_workers
+        self.overflow_policy = overflow_policy
+        self.overflow_sample_rate = overflow_sample_rate
+        self.submit_timeout = submit_timeout
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.job_lease = job_lease
+
+        self._queue: "queue.Queue[dict]" = queue.Queue(maxsize=max_queue_size)
+        self._stop_event = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._stats: Counter = Counter()
+        self._stats_lock = threading.Lock()
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        with self._stats_lock:
+            return {**self._stats, "queued": self._queue.qsize()}
+
+    def _count(self, name: str):
+        with self._stats_lock:
+            self._stats[name] += 1
+
+    def start(self):
+        if self._threads:
+            return
+        self._stop_event.clear()
+        for i in range(self.num_workers):
+            thread = threading.Thread(
+                target=self._run, name=f"evaluation-worker-{i}", daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+        logger.info("Started %s evaluation workers", self.num_workers)
+
+    def stop(self, timeout: Optional[float] = None):
+        self._stop_event.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def submit(self, run_data: dict) -> bool:
+        """Enqueues a run for evaluation. Returns False if the run was dropped."""
+        self._count("submitted")
+        try:
+            if self.submit_timeout > 0:
+                self._queue.put(run_data, timeout=self.submit_timeout)
+            else:
+                self._queue.put_nowait(run_data)
+            return True
+        except queue.Full:
+            pass
+
+        if self.overflow_policy == OverflowPolicy.PERSIST or (
+            self.overflow_policy == OverflowPolicy.SAMPLE
+            and random.random() < self.overflow_sample_rate
+        ):
+            try:
+                self._persist(run_data)
+                self._count("persisted")
+                return True
+            except Exception as e:
+                logger.error("Could not persist evaluation job: %s", e)
+
+        self._count("dropped")
+        logger.warning("Evaluation queue is full, dropping evaluation of the run")
+        return False
+
+    def _persist(self, run_data: dict):
+        now = datetime.utcnow()
+        with Session(self.engine) as session:
+            session.add(
+                RagEvaluationJob(
+                    run_data=run_data,
+                    status="pending",
+                    attempts=0,
+                    created_at=now,
+                    updated_at=now,
+                )
+            )
+            session.commit()
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                run_data = self._queue.get(timeout=self.poll_interval)
+            except queue.Empty:
+                self._process_persisted_job()
+                continue
+
+            try:
+                self.score_writer.write_score(run_data)
+                self._count("processed")
+            except Exception as e:
+                self._count("failed")
+                logger.error("Evaluation of the run failed: %s", e)
+            finally:
+                self._queue.task_done()
+
+    def _claim_persisted_job(self) -> Optional[RagEvaluationJob]:
+        now = datetime.utcnow()
+        with Session(self.engine, expire_on_commit=False) as session:
+            job = session.scalars(
+                select(RagEvaluationJob)
+                .where(
+                    or_(
+                        RagEvaluationJob.status == "pending",
+                        (RagEvaluationJob.status == "running")
+                        & (RagEvaluationJob.updated_at < now - self.job_lease),
+                    ),
+                    RagEvaluationJob.attempts < self.max_attempts,
+                )
+                .order_by(RagEvaluationJob.job_id)
+                .limit(1)
+                .with_for_update(skip_locked=True)
+            ).first()
+            if job is None:
+                return None
+            job.status = "running"
+            job.attempts += 1
+            job.updated_at = now
+            session.commit()
+            return job
+
+    def _process_persisted_job(self):
+        try:
+            job = self._claim_persisted_job()
+        except Exception as e:
+            logger.error("Could not claim a persisted evaluation job: %s", e)
+            return
+        if job is None:
+            return
+
+        try:
+            self.score_writer.write_score(job.run_data)
+            self._count("processed")
+            with Session(self.engine) as session:
+                session.query(RagEvaluationJob).filter(
+                    RagEvaluationJob.job_id == job.job_id
+                ).delete()
+                session.commit()
+        except Exception as e:
+            self._count("failed")
+            logger.error("Persisted evaluation job %s failed: %s", job.job_id, e)
+            with Session(self.engine) as session:
+                session.query(RagEvaluationJob).filter(
+                    RagEvaluationJob.job_id == job.job_id
+                ).update(
+                    {
+                        "status": "pending"
+                        if job.attempts < self.max_attempts
+                        else "failed",
+                        "last_error": str(e),
+                        "updated_at": datetime.utcnow(),
+                    }
+                )
+                session.commit()
@@ -0,0 +1,61 @@
+from datetime import datetime
+
+import numpy as np
+import sqlalchemy
+from langchain.schema.embeddings import Embeddings
+from rag_application_framework.config.app_config import EvaluationConfig
+from rag_application_framework.db.models.models import RagScore
+from rag_application_framework.logging.logging import Logging
+from rag_application_framework.rag_evaluation.ragas_evaluator import RagasEvaluator
+from sqlalchemy.orm import Session
+
+logger = Logging.get_logger(__name__)
+
+
+class RagScoreWriter:
+    """Evaluates a RAG run with the ragas judge and stores the scores as a RagScore row."""
+
+    def __init__(
+        self,
+        evaluation_config: EvaluationConfig,
+        embeddings: Embeddings,
+        engine: sqlalchemy.engine.Engine,
+    ) -> None:
+        self.evaluation_config = evaluation_config
+        self.embeddings = embeddings
+        self.engine = engine
+
+    def evaluate(self, response_data: dict) -> dict:
+        evaluation_helper = RagasEvaluator(
+            evaluation_config=self.evaluation_config,
+            embeddings=self.embeddings,
+        )
+        logger.info("Evaluation Started.")
+        result = evaluation_helper.evaluate(run_data=response_data)
+        logger.info("Evaluation Complete. Result of the evaluation: \n %s", result)
+        return result
+
+    def write_score(self, response_data: dict):
+        result = self.evaluate(response_data)
+        if len(result) == 0:
+            logger.error("The evaluation of the result was not successful")
+        with Session(self.engine) as session:
+            rag_score = RagScore(
+                chain_info={
+                    "question": response_data["question"],
+                    "contexts": response_data["contexts"],
+                    "answer": response_data["output_text"],
+                    "prompt_tokens": response_data.get("prompt_tokens"),
+                },
+                model_type=response_data["model_type"],
+                qa_status=response_data["qa_status"],
+                total_duration=response_data["total_duration"],
+                faithfulness=result["faithfulness"] if not np.isnan(result["faithfulness"]) else 0,
+                context_precision=result["context_utilization"] if not np.isnan(result["context_utilization"]) else 0,
+                answer_relevancy=result["answer_relevancy"] if not np.isnan(result["answer_relevancy"]) else 0,
+                correctness=result["correctness"] if not np.isnan(result["correctness"]) else 0,
+                time_stamp=datetime.utcnow(),
+            )
+            session.add(rag_score)
+            session.commit()
+            logger.info("Score written to the database: %s", rag_score)
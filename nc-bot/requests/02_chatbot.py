@@ -1,84 +1,20 @@
-import os
 from typing import List
-from rag_application_framework.config.app_enums import InferenceEngine
-from rag_application_framework.aws.sagemaker_runtime_api import SagemakerRuntimeApi
 
-import sqlalchemy
 import streamlit as st
-from rag_application_framework.aws.aws_client_factory import AwsClientFactory
-from rag_application_framework.aws.aws_session_factory import AwsSessionFactory
-from rag_application_framework.aws.s3_api import S3Api
-from rag_application_framework.config.app_config_factory import AppConfigFactory
-from rag_application_framework.db.embeddings_database import EmbeddingsDatabase
-from rag_application_framework.db.models import inititalize
-from rag_application_framework.db.psycopg_connection_factory import (
-    PsycopgConnectionFactory,
-)
-from rag_application_framework.modules.chat.bot_rag_pipeline import (
-    BotRagPipeline,
-    SourceDocument,
-)
+from rag_application_framework.context.app_context import AppContext
+from rag_application_framework.modules.chat.bot_rag_pipeline import SourceDocument
 
 from dotenv import load_dotenv
 load_dotenv()
 
 
 def page():
-    app_config = AppConfigFactory.build_from_env()
-    db_connection_factory = PsycopgConnectionFactory(
-        host=app_config.db_config.host,
-        port=app_config.db_config.port,
-        username=app_config.db_config.user,
-        password=app_config.db_config.password,
-        database_name=app_config.db_config.database,
-    )
+    app_context = AppContext.get_instance()
+    if not app_context.health_check():
+        st.error("The database is currently not reachable. Please try again later.", icon="🚨")
+        return
 
-    embeddings_db = EmbeddingsDatabase(
-        vector_db=db_connection_factory,
-        collection_name=app_config.embedding_config.collection_name,
-        embeddings=app_config.embedding_config.embeddings,
-    )
-
-    boto3_session = None
-    sagemaker_runtime_api = None
-    bedrock_runtime_client = None
-    s3_api = None
-
-    if app_config.inference_config.inference_engine.name.lower() == "sagemaker":
-        boto3_session = AwsSessionFactory.create_session_from_config(
-            app_config.aws_config
-        )
-        sagemaker_runtime_api = AwsClientFactory.build_from_boto_session(
-            boto3_session,
-            SagemakerRuntimeApi,
-        )
-
-    if app_config.file_store_config.is_s3:
-        boto3_session = AwsSessionFactory.create_session_from_config(
-            app_config.aws_config
-        )
-        s3_api = AwsClientFactory.build_from_boto_session(
-            boto3_session,
-            S3Api,
-        )
-
-    engine = sqlalchemy.create_engine(
-        db_connection_factory.get_connection_str(), pool_pre_ping=True
-    )
-
-    inititalize(engine)
-
-    bot_rag_pipeline = BotRagPipeline(
-        #openai_config=app_config.openai_config,
-        evaluation_config = app_config.evaluation_config,
-        embeddings_config=app_config.embedding_config,
-        engine=engine,
-        file_store_config=app_config.file_store_config,
-        inference_config=app_config.inference_config,
-        db_factory=db_connection_factory,
-        sagemaker_runtime_api=sagemaker_runtime_api,
-        s3_api=s3_api,
-    )
+    bot_rag_pipeline = app_context.bot_rag_pipeline
 
     st.sidebar.markdown("# Chatbot 💬")
     st.title("Chatbot 💬")
@@ -117,11 +53,12 @@ def page():
         with st.chat_message("assistant"):
             with st.spinner("Thinking..."):
                 # A collection name is fixed for the application and can be extended
-                response = bot_rag_pipeline.infer(prompt)
+                stream_response = bot_rag_pipeline.stream(prompt)
 
-                st.write(response["result"], unsafe_allow_html=True)
-                source_docs = prepare_source_docs(response["source_documents"])
-                st.write(source_docs, unsafe_allow_html=True)
+            st.write_stream(stream_response)
+            response = stream_response.result
+            source_docs = prepare_source_docs(response["source_documents"])
+            st.write(source_docs, unsafe_allow_html=True)
         message = {
             "role": "assistant",
             "content": response["result"] + "<br>" + source_docs,
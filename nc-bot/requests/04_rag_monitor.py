@@ -1,32 +1,19 @@
 import plotly.express as px
 import streamlit as st
-from rag_application_framework.config.app_config_factory import AppConfigFactory
-from rag_application_framework.db.models import inititalize
-from rag_application_framework.db.psycopg_connection_factory import (
-    PsycopgConnectionFactory,
-)
+from rag_application_framework.context.app_context import AppContext
 from rag_application_framework.modules.rag_monitor_query.rag_monitor_query import (
     RagMonitorQuery,
 )
-from sqlalchemy import create_engine
 from sqlalchemy.orm import Session
-import os
 
 
 def page():
-    app_config = AppConfigFactory.build_from_env()
-    db_config = app_config.db_config
-
-    factory = PsycopgConnectionFactory(
-        host=db_config.host,
-        port=db_config.port,
-        username=db_config.user,
-        password=db_config.password,
-        database_name=db_config.database,
-    )
+    app_context = AppContext.get_instance()
+    if not app_context.health_check():
+        st.error("The database is currently not reachable. Please try again later.", icon="🚨")
+        return
 
-    engine = create_engine(factory.get_connection_str())
-    inititalize(engine)
+    engine = app_context.engine
 
     col1, col2 = st.columns(2)
     st.sidebar.header("Choose your filter: ")
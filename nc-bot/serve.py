@@ -0,0 +1,5 @@
+from rag_application_framework.config.app_config_factory import AppConfigFactory
+from rag_application_framework.modules.serving.rag_http_server import RagHttpServer
+
+if __name__ == "__main__":
+    RagHttpServer(serving_config=AppConfigFactory.get_serving_config()).run()